@@ -0,0 +1,327 @@
+"""Export et import de l'archive en NDJSON compressé (gzip).
+
+    python archive_io.py export data/exports/archive.ndjson.gz [--guild ID]
+    python archive_io.py import data/exports/archive.ndjson.gz [--guild ID] [--source ID]
+
+Un export contient, une ligne JSON chacune : un en-tête (format, identifiant
+de l'export), les lignes de archived_messages, poll_scores, scan_progress et
+archived_reactions (détail des réactions par emoji), puis une ligne de fin qui permet de repérer un fichier tronqué. Il est lu sur
+un instantané de la base (connexion en lecture seule et transaction ouverte le
+temps de l'export) : le bot peut continuer à écrire pendant ce temps.
+
+L'import est fait par lots (executemany, une transaction par lot) et reprend
+après la dernière ligne validée si on le relance avec le même fichier. Il
+n'écrase rien : messages et plages de scan déjà présents sont gardés et un
+score n'est jamais abaissé.
+
+Importées dans un autre serveur que celui d'origine, les lignes y sont
+rattachées (colonne du serveur réécrite) ; les plages scannées, propres aux
+salons d'origine, sont alors ignorées. Le serveur d'origine est celui de
+l'en-tête pour un export d'un seul serveur, sinon --source. Lancé en ligne de commande pendant que le bot
+tourne, les index en mémoire du bot ne voient les lignes importées qu'à son
+redémarrage ; /import n'a pas cette limite.
+
+Export et import tiennent en mémoire constante : les lignes passent par des
+générateurs, CHUNK_ROWS à la fois.
+"""
+import argparse
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import pathlib
+import sqlite3
+import time
+import uuid
+
+import db
+
+FORMAT = "splepbot-archive"
+FORMAT_VERSION = 2         # 2 : détail des réactions (archived_reactions)
+CHUNK_ROWS = 5000          # lignes lues ou écrites à la fois (un lot = une transaction)
+COMPRESS_LEVEL = 6
+EXPORT_DIR = "data/exports"
+
+
+class TransferReport:
+    """Lignes traitées par table et débit d'un export ou d'un import."""
+
+    def __init__(self):
+        self.rows = {table: 0 for table in db.EXPORT_TABLES}
+        self.imported = 0     # lignes réellement ajoutées ou modifiées (import)
+        self.skipped = 0      # lignes d'un autre serveur, ou déjà importées avant une reprise
+        self.foreign = 0      # dont lignes d'un autre serveur que celui importé
+        self.bytes = 0        # taille du fichier compressé
+        self.seconds = 0.0
+        self.already_imported = False
+
+    @property
+    def total(self):
+        return sum(self.rows.values())
+
+    def summary(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        return (f"{self.total} lignes en {self.seconds:.1f} s "
+                f"({self.total / seconds:,.0f} lignes/s, {self.bytes / 1024 / 1024 / seconds:.1f} Mo/s compressés)")
+
+    def details(self) -> str:
+        return " · ".join(f"{table} : {count}" for table, count in self.rows.items())
+
+
+# ============================
+# EXPORT
+# ============================
+
+def _snapshot_connection(db_path):
+    """Connexion en lecture seule, séparée de celle du bot (mode WAL : pas de blocage)."""
+    uri = pathlib.Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def iter_export_lines(conn, guild_id=None, report=None):
+    """Générateur des lignes NDJSON d'un export, lues par paquets de CHUNK_ROWS."""
+    schema_version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+    yield json.dumps({
+        "format": FORMAT, "version": FORMAT_VERSION, "export_id": uuid.uuid4().hex,
+        "schema_version": schema_version, "guild_id": guild_id,
+        "exported_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    })
+
+    counts = {}
+    for table, (columns, guild_column) in db.EXPORT_TABLES.items():
+        query = f"SELECT {', '.join(columns)} FROM {db.EXPORT_SOURCES.get(table, table)}"
+        params = ()
+        if guild_id is not None:
+            query += f" WHERE {guild_column} = ?"
+            params = (guild_id,)
+        cursor = conn.execute(query, params)
+        counts[table] = 0
+        while True:
+            rows = cursor.fetchmany(CHUNK_ROWS)
+            if not rows:
+                break
+            counts[table] += len(rows)
+            if report is not None:
+                report.rows[table] += len(rows)
+            for row in rows:
+                yield json.dumps({"table": table, "data": dict(zip(columns, row))}, ensure_ascii=False)
+    yield json.dumps({"end": True, "rows": counts})
+
+
+def export_to_file(path, guild_id=None, db_path=None) -> TransferReport:
+    """Écrit l'export dans `path` (fichier remplacé d'un coup à la fin). Bloquant."""
+    report = TransferReport()
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    conn = _snapshot_connection(db_path or db.DB_PATH)
+    try:
+        conn.execute("BEGIN")  # même instantané pour toutes les tables
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL) as f:
+            chunk = []
+            for line in iter_export_lines(conn, guild_id, report):
+                chunk.append(line)
+                if len(chunk) >= CHUNK_ROWS:
+                    f.write("\n".join(chunk) + "\n")
+                    chunk.clear()
+            if chunk:
+                f.write("\n".join(chunk) + "\n")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    report.bytes = os.path.getsize(path)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+async def export_archive(path, guild_id=None) -> TransferReport:
+    """Export sans bloquer la boucle ni le thread DB (l'écriture se fait dans un thread)."""
+    return await asyncio.get_running_loop().run_in_executor(None, export_to_file, path, guild_id)
+
+
+def export_path(guild_id=None) -> str:
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(EXPORT_DIR, f"archive-{guild_id or 'all'}-{stamp}.ndjson.gz")
+
+
+# ============================
+# IMPORT
+# ============================
+
+def read_header(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+    if header.get("format") != FORMAT:
+        raise ValueError("ce fichier n'est pas un export de l'archive")
+    if header.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(f"export en version {header['version']}, non pris en charge")
+    return header
+
+
+def _checked_lines(f):
+    """Lignes de `f` ; une fin de fichier coupée en plein milieu devient une ValueError."""
+    previous = None
+    try:
+        for line in f:
+            if previous is not None:
+                yield previous
+            previous = line
+    except EOFError as e:
+        raise ValueError("export incomplet (fichier compressé tronqué)") from e
+    # Une dernière ligne sans fin de ligne a été coupée
+    if previous is not None:
+        if not previous.endswith("\n"):
+            raise ValueError("export incomplet (dernière ligne tronquée)")
+        yield previous
+
+
+def iter_import_batches(path, skip_lines=0, guild_id=None, report=None, source_guild_id=None):
+    """Générateur de (lignes lues, {table: [tuples]}) par paquets de CHUNK_ROWS.
+
+    Les `skip_lines` premières lignes de données (déjà importées) sont sautées,
+    comme celles d'un autre serveur que `source_guild_id`. Si `guild_id` en
+    diffère, les lignes gardées sont réécrites pour ce serveur. Lève ValueError
+    si la ligne de fin manque (fichier tronqué) après avoir rendu tout ce qui
+    précède.
+    """
+    if source_guild_id is None:
+        source_guild_id = guild_id
+    rewrite = guild_id is not None and guild_id != source_guild_id
+    lines = 0
+    batch = {table: [] for table in db.EXPORT_TABLES}
+    pending = 0
+    ended = False
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        f.readline()  # en-tête
+        for line in _checked_lines(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("end"):
+                ended = True
+                break
+            lines += 1
+            if lines <= skip_lines:
+                if report is not None:
+                    report.skipped += 1
+                continue
+
+            table = record["table"]
+            columns, guild_column = db.EXPORT_TABLES[table]
+            data = record["data"]
+            if source_guild_id is not None and data.get(guild_column) != source_guild_id:
+                if report is not None:
+                    report.skipped += 1
+                    report.foreign += 1
+            elif rewrite and table == "scan_progress":
+                # Plages des salons du serveur d'origine : sans objet ailleurs
+                if report is not None:
+                    report.skipped += 1
+            else:
+                if rewrite:
+                    data[guild_column] = guild_id
+                batch[table].append(tuple(data.get(column) for column in columns))
+                if report is not None:
+                    report.rows[table] += 1
+            pending += 1
+            if pending >= CHUNK_ROWS:
+                yield lines, batch
+                batch = {table: [] for table in db.EXPORT_TABLES}
+                pending = 0
+    if pending:
+        yield lines, batch
+    if not ended:
+        raise ValueError("export incomplet (ligne de fin absente) : les lignes lues ont été importées")
+
+
+async def import_archive(path, guild_id=None, source_guild_id=None) -> TransferReport:
+    """Importe un export ; relancé sur le même fichier, reprend là où il s'était arrêté.
+
+    Seules les lignes du serveur `source_guild_id` sont importées (par défaut
+    celui d'un export d'un seul serveur, sinon `guild_id`), et rattachées à
+    `guild_id` s'il est donné (/import). Lève ValueError si aucune ligne ne
+    correspond : l'import n'est alors pas marqué comme terminé.
+    """
+    loop = asyncio.get_running_loop()
+    report = TransferReport()
+    started = time.perf_counter()
+    header = await loop.run_in_executor(None, read_header, path)
+    if source_guild_id is None:
+        source_guild_id = header.get("guild_id") or guild_id
+    # Un même export importé dans deux serveurs (ou depuis deux serveurs) est suivi séparément
+    export_id = header["export_id"]
+    if guild_id is not None:
+        export_id += f":{guild_id}"
+        if source_guild_id != guild_id:
+            export_id += f":{source_guild_id}"
+    elif source_guild_id is not None:
+        export_id += f":{source_guild_id}"
+
+    progress = await db.get_import_progress(export_id)
+    if progress and progress[2]:
+        report.already_imported = True
+        report.skipped = progress[0]
+        report.seconds = time.perf_counter() - started
+        return report
+
+    batches = iter_import_batches(path, progress[0] if progress else 0, guild_id, report, source_guild_id)
+    # Lecture et décompression dans un thread, écritures sur le thread DB
+    while True:
+        item = await loop.run_in_executor(None, next, batches, None)
+        if item is None:
+            break
+        lines, batch = item
+        report.imported += await db.import_batch(export_id, batch, lines)
+
+    if report.total == 0 and report.foreign and not (progress and progress[1]):
+        raise ValueError(f"0 lignes importées, {report.foreign} ignorées (autre serveur que {source_guild_id}) : "
+                         f"préciser le serveur d'origine")
+    await db.finish_import(export_id)
+    report.bytes = os.path.getsize(path)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+# ============================
+# LIGNE DE COMMANDE
+# ============================
+
+async def _main(args):
+    if args.command == "export":
+        report = await export_archive(args.path, args.guild)
+        print(f"📤 Export écrit dans {args.path} : {report.summary()}")
+        print(f"   {report.details()}")
+        return
+
+    await db.init_db()
+    try:
+        report = await import_archive(args.path, args.guild, args.source)
+    finally:
+        await db.close()
+    if report.already_imported:
+        print(f"📥 {args.path} a déjà été importé.")
+        return
+    print(f"📥 Import de {args.path} : {report.summary()}")
+    print(f"   {report.details()} · {report.imported} lignes écrites, {report.skipped} ignorées")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / import de l'archive en NDJSON compressé.")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("path", help="fichier .ndjson.gz")
+    parser.add_argument("--guild", type=int, help="export : limiter à un serveur ; import : serveur de destination")
+    parser.add_argument("--source", type=int, help="import : serveur d'origine à prendre dans un export complet")
+    parser.add_argument("--db", default=db.DB_PATH, help=f"base SQLite (défaut : {db.DB_PATH})")
+    args = parser.parse_args()
+    db.DB_PATH = args.db
+    try:
+        asyncio.run(_main(args))
+    except ValueError as e:
+        parser.error(str(e))
@@ -0,0 +1,247 @@
+"""Sauvegardes à chaud de la base, par l'API de sauvegarde de SQLite.
+
+    python backups.py list
+    python backups.py create
+    python backups.py restore messages-20250101-120000.db   (bot arrêté)
+
+Copier data/messages.db pendant que le bot écrit peut donner une copie
+incohérente. Une sauvegarde est faite ici sur une connexion à part, dans un
+thread : les pages sont copiées par paquets de BACKUP_STEP_PAGES avec une
+courte pause entre deux paquets, pour laisser passer les écritures du bot. La
+connexion source garde une transaction de lecture ouverte : la copie est un
+instantané cohérent (mode WAL), jamais recommencée à cause d'une écriture.
+
+Les sauvegardes (data/backups/messages-AAAAMMJJ-HHMMSS.db) sont des bases
+SQLite complètes, vérifiées par PRAGMA quick_check. Seules les BACKUP_KEEP plus
+récentes sont gardées, et aucune de plus de BACKUP_MAX_AGE_DAYS jours (hormis
+la dernière). Les images locales (data/images) ne sont pas sauvegardées.
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import pathlib
+import sqlite3
+import time
+
+import db
+
+BACKUP_DIR = os.getenv("BOT_BACKUP_DIR", "data/backups")
+BACKUP_INTERVAL = float(os.getenv("BOT_BACKUP_INTERVAL_HOURS", "6")) * 3600   # 0 = pas de sauvegarde planifiée
+BACKUP_KEEP = int(os.getenv("BOT_BACKUP_KEEP", "7"))
+BACKUP_MAX_AGE_DAYS = int(os.getenv("BOT_BACKUP_MAX_AGE_DAYS", "30"))          # 0 = pas de limite d'âge
+BACKUP_STEP_PAGES = 256     # pages copiées d'un coup (1 Mo avec des pages de 4 Kio)
+BACKUP_STEP_SLEEP = 0.005   # pause entre deux paquets, en secondes
+BACKUP_PREFIX = "messages-"
+BACKUP_SUFFIX = ".db"
+
+
+class BackupResult:
+    def __init__(self, name):
+        self.name = name
+        self.pages = 0
+        self.steps = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def summary(self) -> str:
+        return (f"{self.name} : {self.pages} pages ({self.bytes / 1024 / 1024:.1f} Mo) "
+                f"en {self.seconds:.2f} s, {self.steps} étapes")
+
+
+def backup_name(now=None) -> str:
+    now = now or datetime.datetime.now()
+    return f"{BACKUP_PREFIX}{now.strftime('%Y%m%d-%H%M%S')}{BACKUP_SUFFIX}"
+
+
+def list_backups(backup_dir=None):
+    """Sauvegardes présentes, de la plus récente à la plus ancienne : [(nom, taille, mtime)]."""
+    backup_dir = backup_dir or BACKUP_DIR
+    try:
+        names = os.listdir(backup_dir)
+    except FileNotFoundError:
+        return []
+    backups = []
+    for name in names:
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX):
+            stat = os.stat(os.path.join(backup_dir, name))
+            backups.append((name, stat.st_size, stat.st_mtime))
+    return sorted(backups, key=lambda backup: _backup_order(backup[0]), reverse=True)
+
+
+def _backup_order(name):
+    """Clé chronologique d'un nom de sauvegarde : (date, numéro dans la seconde)."""
+    parts = name[len(BACKUP_PREFIX):-len(BACKUP_SUFFIX)].split("-")
+    counter = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 1
+    return "-".join(parts[:2]), counter
+
+
+def backup_path(name, backup_dir=None) -> str:
+    """Chemin d'une sauvegarde existante ; ValueError pour un nom inconnu."""
+    backup_dir = backup_dir or BACKUP_DIR
+    if name not in {backup[0] for backup in list_backups(backup_dir)}:
+        raise ValueError(f"sauvegarde inconnue : {name}")
+    return os.path.join(backup_dir, name)
+
+
+def run_backup(db_path=None, backup_dir=None, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP) -> BackupResult:
+    """Copie la base dans une nouvelle sauvegarde. Bloquant : à lancer dans un thread."""
+    backup_dir = backup_dir or BACKUP_DIR
+    os.makedirs(backup_dir, exist_ok=True)
+    result = BackupResult(backup_name())
+    path = os.path.join(backup_dir, result.name)
+    # Deux sauvegardes dans la même seconde (restauration juste après une sauvegarde)
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        result.name = backup_name().removesuffix(BACKUP_SUFFIX) + f"-{suffix}{BACKUP_SUFFIX}"
+        path = os.path.join(backup_dir, result.name)
+    tmp_path = path + ".tmp"
+    started = time.perf_counter()
+
+    def progress(status, remaining, total):
+        result.pages = total
+        result.steps += 1
+
+    uri = pathlib.Path(db_path or db.DB_PATH).resolve().as_uri() + "?mode=ro"
+    source = sqlite3.connect(uri, uri=True)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.execute("PRAGMA busy_timeout = 5000")
+        # Transaction de lecture tenue pendant toute la copie : un instantané stable
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages, progress=progress, sleep=sleep)
+        source.rollback()
+
+        # Fichier autonome (sans -wal à côté), vérifié avant d'être publié
+        target.execute("PRAGMA journal_mode = DELETE")
+        check = target.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"sauvegarde corrompue : {check}")
+    except BaseException:
+        target.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    os.replace(tmp_path, path)
+
+    result.bytes = os.path.getsize(path)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def rotate_backups(backup_dir=None, keep=BACKUP_KEEP, max_age_days=BACKUP_MAX_AGE_DAYS):
+    """Supprime les sauvegardes en trop ou trop vieilles (la plus récente est toujours gardée)."""
+    backup_dir = backup_dir or BACKUP_DIR
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    removed = []
+    for i, (name, _, mtime) in enumerate(list_backups(backup_dir)):
+        if i == 0:
+            continue
+        if i >= keep or (cutoff is not None and mtime < cutoff):
+            os.remove(os.path.join(backup_dir, name))
+            removed.append(name)
+    return removed
+
+
+class BackupManager:
+    """Sauvegarde planifiée toutes les BACKUP_INTERVAL secondes, et restauration.
+
+    Avec plusieurs processus, un seul (celui du shard 0, voir bot.py) planifie
+    les sauvegardes. L'intervalle court depuis la dernière sauvegarde présente :
+    un redémarrage ne déclenche pas de sauvegarde inutile.
+    """
+
+    def __init__(self, interval=BACKUP_INTERVAL):
+        self.interval = interval
+        self.last_result = None
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def backup_now(self) -> BackupResult:
+        async with self._lock:
+            result = await asyncio.get_running_loop().run_in_executor(None, run_backup)
+            self.last_result = result
+            print(f"💾 Sauvegarde {result.summary()}")
+            removed = rotate_backups()
+            if removed:
+                print(f"🗑️ {len(removed)} ancienne(s) sauvegarde(s) supprimée(s) : {', '.join(removed)}")
+            return result
+
+    async def restore(self, name) -> BackupResult:
+        """Restaure une sauvegarde, après avoir sauvegardé l'état actuel.
+
+        Retourne la sauvegarde de l'état d'avant la restauration.
+        """
+        path = backup_path(name)
+        safety = await self.backup_now()
+        async with self._lock:
+            started = time.perf_counter()
+            await db.restore_backup(path)
+            print(f"♻️ Base restaurée depuis {name} en {time.perf_counter() - started:.2f} s "
+                  f"(état précédent : {safety.name})")
+        return safety
+
+    async def _run(self):
+        while True:
+            backups = list_backups()
+            since_last = time.time() - backups[0][2] if backups else self.interval
+            await asyncio.sleep(max(0.0, self.interval - since_last))
+            try:
+                await self.backup_now()
+            except (sqlite3.Error, OSError) as e:
+                print(f"⚠️ Sauvegarde impossible : {e}")
+                await asyncio.sleep(min(self.interval, 600))
+
+
+# ============================
+# LIGNE DE COMMANDE
+# ============================
+
+async def _restore(name):
+    await db.init_db()
+    try:
+        await db.restore_backup(backup_path(name))
+    finally:
+        await db.close()
+    print(f"♻️ Base restaurée depuis {name}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sauvegardes de la base du bot.")
+    parser.add_argument("command", choices=("list", "create", "restore"))
+    parser.add_argument("name", nargs="?", help="sauvegarde à restaurer")
+    parser.add_argument("--db", default=db.DB_PATH, help=f"base SQLite (défaut : {db.DB_PATH})")
+    args = parser.parse_args()
+    db.DB_PATH = args.db
+
+    if args.command == "list":
+        for name, size, _ in list_backups():
+            print(f"{name}  {size / 1024 / 1024:.1f} Mo")
+    elif args.command == "create":
+        print(f"💾 Sauvegarde {run_backup().summary()}")
+        rotate_backups()
+    else:
+        if not args.name:
+            parser.error("restore attend le nom d'une sauvegarde (voir list)")
+        try:
+            asyncio.run(_restore(args.name))
+        except ValueError as e:
+            parser.error(str(e))
@@ -0,0 +1,128 @@
+"""Faux objets Discord pour les benchmarks : juste ce que lisent les cogs.
+
+Les messages d'un FakeChannel sont servis par history() par pages de 100,
+comme l'API (un appel compté par page, avec une latence optionnelle).
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import db
+
+PAGE_SIZE = 100          # messages par appel à /channels/{id}/messages
+FIRST_ID = db.snowflake_at(1_600_000_000)
+ID_STEP = 1 << 30        # ~0,26 s entre deux messages
+
+
+class FakeUser:
+    def __init__(self, user_id, name=None, bot=False):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeReaction:
+    def __init__(self, emoji, count):
+        self.emoji = emoji
+        self.count = count
+
+
+class FakeAttachment:
+    def __init__(self, url, content_type="image/png"):
+        self.url = url
+        self.content_type = content_type
+
+
+class FakeMessage:
+    def __init__(self, message_id, channel, author, content="", reactions=(), attachments=()):
+        self.id = message_id
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.reactions = list(reactions)
+        self.attachments = list(attachments)
+
+
+class FakeChannel:
+    """Salon texte dont l'historique est paginé comme celui de discord.py.
+
+    `page_latency` simule la durée d'un appel API ; `api_calls` compte les
+    pages servies et `sent` les messages envoyés par le bot.
+    """
+
+    def __init__(self, channel_id, guild, page_latency=0.0):
+        self.id = channel_id
+        self.guild = guild
+        self.name = f"salon-{channel_id}"
+        self.mention = f"<#{channel_id}>"
+        self.page_latency = page_latency
+        self.messages = []       # triés par id croissant (ajoutés avec add)
+        self._by_id = {}
+        self.api_calls = 0
+        self.sent = []
+        self.yielded_at = []     # instant de chaque message servi par history()
+
+    def __str__(self):
+        return self.name
+
+    def add(self, message):
+        self.messages.append(message)
+        self._by_id[message.id] = message
+
+    @property
+    def last_message_id(self):
+        return self.messages[-1].id if self.messages else None
+
+    async def history(self, limit=100, before=None, after=None, oldest_first=None):
+        if oldest_first is None:
+            oldest_first = after is not None
+        selected = [m for m in self.messages
+                    if (before is None or m.id < before.id) and (after is None or m.id > after.id)]
+        if not oldest_first:
+            selected.reverse()
+        if limit is not None:
+            selected = selected[:limit]
+
+        for start in range(0, len(selected), PAGE_SIZE):
+            self.api_calls += 1
+            if self.page_latency:
+                await asyncio.sleep(self.page_latency)
+            for message in selected[start:start + PAGE_SIZE]:
+                self.yielded_at.append(time.perf_counter())
+                yield message
+
+    async def fetch_message(self, message_id):
+        self.api_calls += 1
+        if self.page_latency:
+            await asyncio.sleep(self.page_latency)
+        return self._by_id[message_id]
+
+    async def send(self, content=None, **kwargs):
+        self.api_calls += 1
+        self.sent.append((time.perf_counter(), content))
+
+
+def make_channel(channel_id, guild, count, rng, first_id=FIRST_ID, authors=200, react_rate=0.1,
+                 emojis=("🔥", "😂", "👍"), page_latency=0.0):
+    """Salon de `count` messages ; une fraction `react_rate` porte des réactions."""
+    channel = FakeChannel(channel_id, guild, page_latency)
+    users = [FakeUser(10**6 + i) for i in range(authors)]
+    for i in range(count):
+        reactions = ()
+        if rng.random() < react_rate:
+            reactions = [FakeReaction(rng.choice(emojis), rng.randint(1, 12))]
+        channel.add(FakeMessage(
+            first_id + i * ID_STEP, channel, rng.choice(users),
+            content=f"message {i} du salon {channel_id}", reactions=reactions
+        ))
+    return channel
+
+
+def make_guild(guild_id):
+    """Serveur sans salon : make_channel(...) puis guild.text_channels.append(...)."""
+    return SimpleNamespace(id=guild_id, text_channels=[])
@@ -0,0 +1,80 @@
+"""Coût des commandes d'un petit serveur hébergé à côté d'un très gros.
+
+Un serveur de `gros` messages et un de `petit` messages partagent la base ;
+on mesure pour chacun le premier sondage (chargement du tirage en mémoire),
+les suivants, /stats, /random_archived et /leaderboard.
+
+    python -m benchmarks.guild_isolation [gros] [petit]
+"""
+import asyncio
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import db
+
+BIG_GUILD = 1
+SMALL_GUILD = 2
+
+
+def rows(guild_id, start, total):
+    for i in range(total):
+        message_id = start + i
+        yield (message_id, f"message {i}", 5, guild_id * 100, guild_id, f"user{i % 300}",
+               f"https://discord.com/channels/{guild_id}/{guild_id * 100}/{message_id}", None, "🔥")
+
+
+@db._threaded
+def fill(guild_id, start, total, batch=10000):
+    conn = db._get_conn()
+    source = rows(guild_id, start, total)
+    while chunk := list(itertools.islice(source, batch)):
+        conn.executemany(db._INSERT_ARCHIVED, chunk)
+        conn.commit()
+    conn.executemany("INSERT INTO poll_scores (server_id, user_id, points) VALUES (?, ?, ?)",
+                     [(guild_id, user_id, user_id % 97) for user_id in range(total // 10)])
+    conn.commit()
+
+
+async def timed(call, repeats=50):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+async def measure(guild_id):
+    started = time.perf_counter()
+    await db.get_poll_candidate(guild_id)
+    first_poll = (time.perf_counter() - started) * 1000
+    return {
+        "1er sondage": first_poll,
+        "sondage": await timed(lambda: db.get_poll_candidate(guild_id)),
+        "/stats": await timed(lambda: db.get_archive_stats(guild_id)),
+        "/random": await timed(lambda: db.get_random_archived_message(guild_id)),
+        "/leaderboard p.5": await timed(lambda: db.get_leaderboard(guild_id, 10, 40)),
+    }
+
+
+async def main(big, small):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        await db.init_db()
+        await fill(BIG_GUILD, 10**12, big)
+        await fill(SMALL_GUILD, 2 * 10**12, small)
+
+        results = {"petit": await measure(SMALL_GUILD), "gros": await measure(BIG_GUILD)}
+        print(f"{'(ms, médiane)':<18}" + "".join(f"{name:>12}" for name in results))
+        for key in results["petit"]:
+            print(f"{key:<18}" + "".join(f"{values[key]:12.3f}" for values in results.values()))
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 1_000))
@@ -0,0 +1,104 @@
+"""Mesure le retard de la boucle d'événements pendant une rafale d'écritures.
+
+Compare l'ancienne couche d'accès (un sqlite3.connect par appel, exécuté
+directement sur la boucle) à la couche asynchrone de db.py.
+
+    python -m benchmarks.loop_lag [nb_messages]
+"""
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import db
+
+TICK = 0.005  # période du "heartbeat" simulé
+
+
+# --- Ancienne implémentation (avant la couche asynchrone) ---
+def legacy_is_message_archived(message_id):
+    conn = sqlite3.connect(db.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT 1 FROM archived_messages WHERE message_id = ?', (message_id,))
+    result = cursor.fetchone()
+    conn.close()
+    return result is not None
+
+
+def legacy_archive_message(message_id, content, reactions, channel_id, server_id, author_name, message_url):
+    conn = sqlite3.connect(db.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''INSERT OR IGNORE INTO archived_messages
+                      (message_id, content, reactions, channel_id, server_id, author_name, message_url)
+                      VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                   (message_id, content, reactions, channel_id, server_id, author_name, message_url))
+    conn.commit()
+    conn.close()
+
+
+async def legacy_worker(start, count):
+    for message_id in range(start, start + count):
+        if not legacy_is_message_archived(message_id):
+            legacy_archive_message(message_id, "x" * 80, 5, 1, 1, f"user{message_id % 50}", "url")
+        await asyncio.sleep(0)
+
+
+async def async_worker(start, count):
+    for message_id in range(start, start + count):
+        if not await db.is_message_archived(message_id):
+            await db.archive_message(message_id, "x" * 80, 5, 1, 1, f"user{message_id % 50}", "url")
+
+
+# --- Mesure du retard de la boucle ---
+async def measure(worker, total, concurrency=4):
+    lags = []
+    running = True
+
+    async def ticker():
+        while running:
+            expected = time.perf_counter() + TICK
+            await asyncio.sleep(TICK)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    tick_task = asyncio.create_task(ticker())
+    per_worker = total // concurrency
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i * per_worker, per_worker) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    running = False
+    await tick_task
+
+    lags.sort()
+    return {
+        "ops/s": total / elapsed,
+        "lag p50 (ms)": statistics.median(lags) * 1000 if lags else 0.0,
+        "lag p99 (ms)": lags[int(len(lags) * 0.99) - 1] * 1000 if lags else 0.0,
+        "lag max (ms)": lags[-1] * 1000 if lags else 0.0,
+    }
+
+
+def report(name, result):
+    print(f"{name:<8} " + "  ".join(f"{key}={value:9.1f}" for key, value in result.items()))
+
+
+async def main(total):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        await db.init_db()
+
+        report("avant", await measure(legacy_worker, total))
+
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute("DELETE FROM archived_messages")
+        conn.commit()
+        conn.close()
+
+        report("après", await measure(async_worker, total))
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,93 @@
+"""Compare la mémoire des profils "full" et "minimal" de bot.py.
+
+Les mêmes événements de gateway synthétiques (un GUILD_CREATE avec membres et
+présences, puis des MESSAGE_CREATE) sont injectés dans l'état interne de
+discord.py pour chaque profil, sans connexion à Discord. On mesure aussi le
+ReactionTracker rempli à sa capacité.
+
+    python -m benchmarks.reaction_memory [membres] [messages]
+"""
+import gc
+import sys
+import tracemalloc
+
+from discord.ext import commands
+
+from bot import client_options
+from reactions import ReactionTracker, REACTION_TRACKER_SIZE
+
+GUILD_ID = 1
+CHANNELS = 20
+JOINED_AT = "2024-01-01T00:00:00+00:00"
+
+
+def guild_payload(members):
+    return {
+        "id": str(GUILD_ID), "name": "bench", "owner_id": "2", "features": [], "emojis": [],
+        "stickers": [], "threads": [], "voice_states": [], "stage_instances": [],
+        "guild_scheduled_events": [], "large": True, "unavailable": False, "member_count": members,
+        "roles": [{"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                   "hoist": False, "managed": False, "mentionable": False, "flags": 0}],
+        "channels": [{"id": str(100 + i), "type": 0, "name": f"salon-{i}", "position": i,
+                      "permission_overwrites": [], "guild_id": str(GUILD_ID)} for i in range(CHANNELS)],
+        "members": [{"user": {"id": str(10**6 + i), "username": f"user{i}", "discriminator": "0",
+                              "avatar": None, "global_name": f"User {i}"},
+                     "roles": [], "joined_at": JOINED_AT, "deaf": False, "mute": False, "flags": 0}
+                    for i in range(members)],
+        "presences": [{"user": {"id": str(10**6 + i)}, "status": "online",
+                       "activities": [{"name": "un jeu", "type": 0}], "client_status": {"desktop": "online"}}
+                      for i in range(0, members, 2)],
+    }
+
+
+def message_payload(i, members):
+    return {
+        "id": str(10**9 + i), "channel_id": str(100 + i % CHANNELS), "guild_id": str(GUILD_ID),
+        "author": {"id": str(10**6 + i % members), "username": "user", "discriminator": "0", "avatar": None},
+        "member": {"roles": [], "joined_at": JOINED_AT, "deaf": False, "mute": False, "flags": 0},
+        "content": "un message d'exemple assez banal " * 3, "timestamp": JOINED_AT, "edited_timestamp": None,
+        "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+        "embeds": [], "pinned": False, "type": 0,
+    }
+
+
+def measure_profile(profile, members, messages):
+    bot = commands.Bot(command_prefix="!", **client_options(profile))
+    state = bot._connection
+    state.dispatch = lambda *args, **kwargs: None  # pas de boucle d'événements ici
+
+    gc.collect()
+    tracemalloc.start()
+    state._add_guild_from_data(guild_payload(members))
+    for i in range(messages):
+        state.parse_message_create(message_payload(i, members))
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used
+
+
+def measure_tracker(size):
+    gc.collect()
+    tracemalloc.start()
+    tracker = ReactionTracker(size)
+    for i in range(size):
+        for emoji in ("🔥", "😂", "👍"):
+            tracker.add(10**9 + i, emoji)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used
+
+
+def main(members, messages):
+    print(f"{members} membres, {messages} messages reçus")
+    for profile in ("full", "minimal"):
+        print(f"  profil {profile:<8} : {measure_profile(profile, members, messages) / 1e6:7.2f} Mo")
+    print(f"  ReactionTracker ({REACTION_TRACKER_SIZE} messages, 3 emojis) : "
+          f"{measure_tracker(REACTION_TRACKER_SIZE) / 1e6:.2f} Mo")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
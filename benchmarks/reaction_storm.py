@@ -0,0 +1,292 @@
+"""Simulateur de tempête de réactions à travers les vrais cogs.
+
+Des événements MESSAGE_REACTION_ADD / REMOVE synthétiques sont injectés dans
+le parseur de gateway de discord.py, qui les distribue comme en production aux
+listeners des cogs Archive et SelfReactAlert. La couche HTTP est remplacée par
+un faux Discord (latence configurable) qui sert les messages avec leurs vrais
+compteurs de réactions et compte les appels sortants par route. La base est
+une vraie base SQLite temporaire.
+
+Popularité des messages en loi de Zipf, utilisateurs tirés uniformément,
+une part d'auto-réactions, de réactions de bots et de retraits. On mesure le
+débit absorbé, le retard de la boucle et les appels API, dont les envois qui
+dépasseraient la limite de Discord par salon (5 messages / 5 s).
+
+    python -m benchmarks.reaction_storm [--events 50000] [--rate 0] [--messages 2000] [--users 500]
+                                        [--zipf 1.1] [--self-react 0.02] [--bots 0.01] [--removes 0.05]
+                                        [--threshold 4] [--http-latency 0.05]
+"""
+import argparse
+import asyncio
+import bisect
+import contextlib
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+
+from discord.ext import commands
+
+import db
+import metrics
+from benchmarks.reaction_memory import CHANNELS, GUILD_ID, JOINED_AT, guild_payload
+from bot import client_options
+from cogs.archive import Archive
+from cogs.self_react_alert import SelfReactAlert
+
+SEED = 42
+TICK = 0.005                 # période du "heartbeat" qui mesure le retard de la boucle
+BOT_USER_ID = 999
+FIRST_MESSAGE_ID = 10**15
+SEND_BUCKET = (5, 5.0)       # limite d'envoi de Discord par salon : 5 messages / 5 s
+EMOJIS = ["🔥", "😂", "👍", "💀", "❤️"]
+
+
+def user_payload(user_id, bot=False):
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "bot": bot}
+
+
+# ============================
+# FAUX DISCORD (COUCHE HTTP)
+# ============================
+
+class FakeDiscord:
+    """Remplace HTTPClient.request : sert les messages et compte les appels."""
+
+    def __init__(self, messages, latency):
+        self.messages = messages          # message_id -> (channel_id, author_id, content)
+        self.reactions = defaultdict(Counter)  # message_id -> {emoji: compteur réel}
+        self.latency = latency
+        self.calls = Counter()            # (méthode, route) -> nombre d'appels
+        self.sends = defaultdict(list)    # channel_id -> instants des envois
+        self._next_id = itertools.count(FIRST_MESSAGE_ID * 10)
+
+    def message_payload(self, message_id, channel_id, author, content):
+        return {
+            "id": str(message_id), "channel_id": str(channel_id), "guild_id": str(GUILD_ID),
+            "author": author, "content": content, "timestamp": JOINED_AT, "edited_timestamp": None,
+            "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": [], "embeds": [], "pinned": False, "type": 0,
+            "reactions": [{"emoji": {"id": None, "name": emoji}, "count": count, "me": False,
+                           "count_details": {"burst": 0, "normal": count}, "burst_colors": []}
+                          for emoji, count in self.reactions[message_id].items() if count > 0],
+        }
+
+    async def request(self, route, **kwargs):
+        self.calls[(route.method, route.path)] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if route.method == "GET" and route.path == "/channels/{channel_id}/messages/{message_id}":
+            message_id = int(route.url.rsplit("/", 1)[1])   # seuls les ids majeurs sont gardés sur Route
+            channel_id, author_id, content = self.messages[message_id]
+            return self.message_payload(message_id, channel_id, user_payload(author_id), content)
+
+        if route.method == "POST" and route.path == "/channels/{channel_id}/messages":
+            channel_id = int(route.channel_id)
+            self.sends[channel_id].append(time.perf_counter())
+            content = (kwargs.get("json") or {}).get("content", "")
+            return self.message_payload(next(self._next_id), channel_id, user_payload(BOT_USER_ID, bot=True), content)
+
+        raise NotImplementedError(f"route non simulée : {route.method} {route.path}")
+
+    def throttled_sends(self):
+        """Envois qui auraient attendu le bucket de leur salon chez Discord."""
+        limit, window = SEND_BUCKET
+        throttled = 0
+        for stamps in self.sends.values():
+            recent = deque()
+            for stamp in stamps:
+                while recent and stamp - recent[0] >= window:
+                    recent.popleft()
+                if len(recent) >= limit:
+                    throttled += 1
+                recent.append(stamp)
+        return throttled
+
+
+# ============================
+# GÉNÉRATION DE LA TEMPÊTE
+# ============================
+
+def make_messages(count, users, rng):
+    return {
+        FIRST_MESSAGE_ID + i: (100 + i % CHANNELS, 10**6 + rng.randrange(users), f"message populaire n°{i} " * 2)
+        for i in range(count)
+    }
+
+
+def make_events(args, messages, rng):
+    """Liste de (type, données gateway) ; les compteurs réels suivent les ajouts et retraits."""
+    message_ids = list(messages)
+    cum_weights = list(itertools.accumulate(1 / (rank ** args.zipf) for rank in range(1, len(message_ids) + 1)))
+    given = []        # réactions posées, candidates au retrait
+    events = []
+    for _ in range(args.events):
+        if given and rng.random() < args.removes:
+            data = given.pop(rng.randrange(len(given)))
+            events.append(("remove", {k: v for k, v in data.items() if k not in ("member", "message_author_id")}))
+            continue
+
+        message_id = message_ids[bisect.bisect_left(cum_weights, rng.random() * cum_weights[-1])]
+        channel_id, author_id, _ = messages[message_id]
+        is_bot = rng.random() < args.bots
+        if is_bot:
+            user_id = BOT_USER_ID + 1 + rng.randrange(5)
+        elif rng.random() < args.self_react:
+            user_id = author_id
+        else:
+            user_id = 10**6 + rng.randrange(args.users)
+        data = {
+            "user_id": str(user_id), "channel_id": str(channel_id), "message_id": str(message_id),
+            "guild_id": str(GUILD_ID), "emoji": {"id": None, "name": rng.choice(EMOJIS)},
+            "message_author_id": str(author_id), "burst": False, "type": 0,
+            "member": {"user": user_payload(user_id, bot=is_bot), "roles": [], "joined_at": JOINED_AT,
+                       "deaf": False, "mute": False, "flags": 0},
+        }
+        given.append(data)
+        events.append(("add", data))
+    return events
+
+
+# ============================
+# MESURE
+# ============================
+
+def make_bot(fake, threshold):
+    bot = commands.Bot(command_prefix="!", **client_options("minimal"))
+    bot.reaction_threshold = threshold
+    bot.http.request = fake.request
+    bot._connection._add_guild_from_data(guild_payload(0))
+
+    # Une exception dans un listener est comptée (et affichée) au lieu d'être journalisée
+    bot.listener_errors = Counter()
+
+    async def on_error(event, *args, **kwargs):
+        bot.listener_errors[f"{event} : {sys.exc_info()[1]!r}"] += 1
+    bot.on_error = on_error
+    return bot
+
+
+async def drain(idle_tasks):
+    """Attend la fin de tous les listeners lancés par les événements."""
+    while True:
+        pending = [task for task in asyncio.all_tasks() if task not in idle_tasks and not task.done()]
+        if not pending:
+            return
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def run(args):
+    rng = random.Random(SEED)
+    random.seed(SEED)   # messages tirés par SelfReactAlert
+    messages = make_messages(args.messages, args.users, rng)
+    events = make_events(args, messages, rng)
+
+    fake = FakeDiscord(messages, args.http_latency)
+    bot = make_bot(fake, args.threshold)
+    # Prépare la boucle de discord.py (dispatch des événements) sans se connecter
+    async with bot:
+        await bot.add_cog(Archive(bot))
+        await bot.add_cog(SelfReactAlert(bot))
+        state = bot._connection
+
+        lags = []
+        running = True
+
+        async def ticker():
+            while running:
+                expected = time.perf_counter() + TICK
+                await asyncio.sleep(TICK)
+                lags.append(max(0.0, time.perf_counter() - expected))
+
+        tick_task = asyncio.create_task(ticker())
+        # La boucle d'écriture des réactions des messages archivés ne se termine jamais
+        archive_cog = bot.get_cog("Archive")
+        idle_tasks = {asyncio.current_task(), tick_task, archive_cog._flusher}
+
+        started = time.perf_counter()
+        # Par lots d'un tick : --rate événements/s, ou au plus vite (--rate 0) en
+        # rendant la main à la boucle entre deux lots comme le ferait la gateway
+        batch = max(1, int(args.rate * TICK)) if args.rate else 100
+        for i in range(0, len(events), batch):
+            for kind, data in events[i:i + batch]:
+                if kind == "add":
+                    fake.reactions[int(data["message_id"])][data["emoji"]["name"]] += 1
+                    state.parse_message_reaction_add(data)
+                else:
+                    fake.reactions[int(data["message_id"])][data["emoji"]["name"]] -= 1
+                    state.parse_message_reaction_remove(data)
+            if args.rate:
+                next_batch = started + (i + batch) / args.rate
+                await asyncio.sleep(max(0.0, next_batch - time.perf_counter()))
+            else:
+                await asyncio.sleep(0)
+        injected = time.perf_counter() - started
+        await drain(idle_tasks)
+        await archive_cog.flush_reactions()
+        elapsed = time.perf_counter() - started
+
+        running = False
+        await tick_task
+    archived, _, _ = await db.get_archive_stats(GUILD_ID)
+    # Compteurs suivis en base comparés aux vrais compteurs du faux Discord
+    exact = 0
+    for message_id in messages:
+        if await db.is_message_archived(message_id):
+            stored = dict(await db.get_archived_reactions(message_id))
+            real = {emoji: count for emoji, count in fake.reactions[message_id].items() if count > 0}
+            exact += stored == real
+    flushes = sum(count for labels, count, _, _ in metrics.DB_SECONDS.items() if labels == ("apply_reaction_deltas",))
+    return events, fake, bot.listener_errors, (archived, exact, flushes), injected, elapsed, sorted(lags)
+
+
+def report(args, events, fake, errors, archived, injected, elapsed, lags):
+    kinds = Counter(kind for kind, _ in events)
+    fetched = fake.calls[("GET", "/channels/{channel_id}/messages/{message_id}")]
+    print(f"{len(events)} événements ({kinds['add']} ajouts, {kinds['remove']} retraits) "
+          f"sur {args.messages} messages, {args.users} utilisateurs, seuil {args.threshold}")
+    print(f"  injectés en {injected:.2f} s, traités en {elapsed:.2f} s : {len(events) / elapsed:,.0f} événements/s")
+    if lags:
+        print(f"  retard de la boucle : p50 {statistics.median(lags) * 1000:.2f} ms · "
+              f"p99 {lags[max(0, int(len(lags) * 0.99) - 1)] * 1000:.2f} ms · max {lags[-1] * 1000:.2f} ms")
+    print(f"  appels API (latence simulée {args.http_latency * 1000:.0f} ms) :")
+    for (method, path), count in sorted(fake.calls.items()):
+        print(f"    {method:<5}{path:<45}{count:>8}")
+    sends = sum(len(stamps) for stamps in fake.sends.values())
+    archived, exact, flushes = archived
+    print(f"  {fetched} messages récupérés, {archived} archivés, {sends} messages envoyés dont {fake.throttled_sends()} "
+          f"au-delà de {SEND_BUCKET[0]} envois / {SEND_BUCKET[1]:.0f} s par salon")
+    print(f"  réactions des messages archivés : {flushes} écritures groupées, "
+          f"compteurs exacts pour {exact}/{archived} messages")
+    for error, count in errors.most_common():
+        print(f"  ⚠️ {count} × {error}")
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            await db.init_db()
+            result = await run(args)
+            await db.close()
+    report(args, *result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tempête de réactions à travers les cogs Archive et SelfReactAlert.")
+    parser.add_argument("--events", type=int, default=50000, help="nombre d'événements de réaction")
+    parser.add_argument("--rate", type=float, default=0, help="événements/s injectés (0 = au plus vite)")
+    parser.add_argument("--messages", type=int, default=2000, help="messages qui reçoivent des réactions")
+    parser.add_argument("--users", type=int, default=500, help="utilisateurs qui réagissent")
+    parser.add_argument("--zipf", type=float, default=1.1, help="exposant de popularité des messages")
+    parser.add_argument("--self-react", type=float, default=0.02, help="part d'auto-réactions")
+    parser.add_argument("--bots", type=float, default=0.01, help="part de réactions de bots")
+    parser.add_argument("--removes", type=float, default=0.05, help="part de retraits de réaction")
+    parser.add_argument("--threshold", type=int, default=4, help="seuil d'archivage (/set_threshold)")
+    parser.add_argument("--http-latency", type=float, default=0.05, help="latence d'un appel API, en secondes")
+    asyncio.run(main(parser.parse_args()))
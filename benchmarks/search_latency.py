@@ -0,0 +1,104 @@
+"""Latence de /search (FTS5) sur une archive synthétique, comparée à un LIKE.
+
+Les messages sont tirés d'un vocabulaire suivant une loi de Zipf, pour avoir à
+la fois des mots très fréquents et des mots rares. La base est remplie par les
+mêmes insertions (et donc les mêmes triggers) que le bot.
+
+    python -m benchmarks.search_latency [nb_messages] [répétitions]
+"""
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import db
+
+VOCABULARY = 20000
+GUILD_ID = 1
+AUTHORS = 200
+EMOJIS = ["🔥", "😂", "👍", "💀", "❤️"]
+FIRST_ID = db.snowflake_at(1_600_000_000)   # septembre 2020
+ID_STEP = 1 << 30                           # ~0,26 s entre deux messages
+
+
+def word(rank):
+    return f"mot{rank}"
+
+
+def synthetic_rows(total, rng):
+    weights = [1 / rank for rank in range(1, VOCABULARY + 1)]
+    cum_weights = list(itertools.accumulate(weights))
+    ranks = range(1, VOCABULARY + 1)
+    for i in range(total):
+        message_id = FIRST_ID + i * ID_STEP
+        content = " ".join(word(r) for r in rng.choices(ranks, cum_weights=cum_weights, k=rng.randint(4, 20)))
+        yield (message_id, content, rng.randint(4, 12), 1, GUILD_ID, f"user{rng.randrange(AUTHORS)}",
+               f"https://discord.com/channels/1/1/{message_id}", None, rng.choice(EMOJIS))
+
+
+@db._threaded
+def fill(total, batch=10000):
+    conn = db._get_conn()
+    rows = synthetic_rows(total, random.Random(42))
+    started = time.perf_counter()
+    while chunk := list(itertools.islice(rows, batch)):
+        conn.executemany(db._INSERT_ARCHIVED, chunk)
+        conn.commit()
+    return time.perf_counter() - started
+
+
+# Sans index, toutes les correspondances doivent être lues avant de pouvoir
+# les classer : c'est ce que coûterait un /search fondé sur LIKE
+@db._threaded
+def like_search(text):
+    cursor = db._get_conn().cursor()
+    cursor.execute("SELECT message_id, content FROM archived_messages WHERE content LIKE ?", (f"%{text}%",))
+    return cursor.fetchall()
+
+
+async def timed(call, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[max(0, int(len(timings) * 0.99) - 1)] * 1000
+
+
+async def main(total, repeats):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        await db.init_db()
+        elapsed = await fill(total)
+        print(f"{total} messages insérés en {elapsed:.1f} s ({total / elapsed:.0f} messages/s, index FTS compris)")
+
+        middle = FIRST_ID + total // 2 * ID_STEP
+        cases = [
+            ("mot fréquent", lambda: db.search_archived_messages(GUILD_ID, word(1))),
+            ("mot moyen", lambda: db.search_archived_messages(GUILD_ID, word(200))),
+            ("mot rare", lambda: db.search_archived_messages(GUILD_ID, word(15000))),
+            ("deux mots", lambda: db.search_archived_messages(GUILD_ID, f"{word(3)} {word(50)}")),
+            ("préfixe", lambda: db.search_archived_messages(GUILD_ID, "mot123*")),
+            ("+ auteur", lambda: db.search_archived_messages(GUILD_ID, word(200), author="user7")),
+            ("+ emoji et date", lambda: db.search_archived_messages(GUILD_ID, word(200), emoji="🔥", after_id=middle)),
+            ("page 20", lambda: db.search_archived_messages(GUILD_ID, word(200), offset=95)),
+            ("fréquent, page 20", lambda: db.search_archived_messages(GUILD_ID, word(1), offset=95)),
+            ("fréquent + auteur", lambda: db.search_archived_messages(GUILD_ID, word(1), author="user7")),
+            ("LIKE mot rare", lambda: like_search(word(15000))),
+            ("LIKE mot moyen", lambda: like_search(word(200))),
+        ]
+        print(f"{'requête':<20} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        for name, call in cases:
+            p50, p99 = await timed(call, repeats)
+            print(f"{name:<20} {p50:9.2f} {p99:9.2f}")
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 20))
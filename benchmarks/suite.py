@@ -0,0 +1,319 @@
+"""Suite de benchmarks hors ligne : base synthétique et faux objets Discord.
+
+Pour chaque taille, une base neuve est remplie de `archived_messages` (par les
+mêmes insertions et triggers que le bot) et de `poll_scores`, puis chaque cas
+est mesuré : fonctions de db.py, try_archive_message, boucles de scan de
+cogs/scan.py sur des salons paginés factices et tirage des sondages. Les
+graines sont fixes : deux exécutions sur la même machine sont comparables.
+
+    python -m benchmarks.suite [--sizes 10k,100k,1m] [--repeats 500] [--only scan]
+                               [--save base.json] [--compare base.json] [--tolerance 0.4]
+
+Avec --compare, le code de sortie vaut 1 si un cas a perdu plus de
+`tolerance` de son débit (ops/s) par rapport au fichier de référence.
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import cache
+import db
+from benchmarks.fakes import FIRST_ID, ID_STEP, make_channel, make_guild
+from benchmarks.search_latency import GUILD_ID, synthetic_rows
+from cogs.archive import try_archive_message
+from cogs.scan import Scan
+
+SEED = 42
+DEFAULT_SIZES = "10k,100k,1m"
+SCAN_MESSAGES = 5000      # messages par salon scanné (indépendant de la taille de l'archive)
+SCAN_ALL_CHANNELS = 8
+
+
+def parse_size(value):
+    value = value.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(value[-1], 1)
+    return int(float(value.rstrip("km")) * factor)
+
+
+# ============================
+# DONNÉES SYNTHÉTIQUES
+# ============================
+
+@db._threaded
+def fill(total, players, batch=10000):
+    conn = db._get_conn()
+    rng = random.Random(SEED)
+    rows = synthetic_rows(total, rng)
+    while chunk := list(itertools.islice(rows, batch)):
+        conn.executemany(db._INSERT_ARCHIVED, chunk)
+        conn.commit()
+    conn.executemany("INSERT INTO poll_scores (server_id, user_id, points) VALUES (?, ?, ?)",
+                     ((GUILD_ID, user_id, rng.randint(0, 500)) for user_id in range(players)))
+    conn.commit()
+
+
+# ============================
+# CAS MESURÉS
+# ============================
+# Chaque cas retourne (nombre d'opérations, durée totale, [durée de chaque opération])
+
+async def timed_calls(make_call, repeats, before_each=None):
+    # Un premier appel hors mesure : le chargement des index en mémoire (tirage,
+    # classement) est mesuré par benchmarks.guild_isolation
+    await make_call(0)
+    timings = []
+    started = time.perf_counter()
+    for i in range(repeats):
+        if before_each is not None:
+            before_each()
+        call_started = time.perf_counter()
+        await make_call(i)
+        timings.append(time.perf_counter() - call_started)
+    return repeats, time.perf_counter() - started, timings
+
+
+def archived_id(rng, total):
+    return FIRST_ID + rng.randrange(total) * ID_STEP
+
+
+async def case_is_message_archived(ctx):
+    rng = random.Random(SEED)
+    # Une moitié d'ids archivés, une moitié d'ids inconnus (filtre de Bloom)
+    ids = [archived_id(rng, ctx.total) + (i % 2) for i in range(ctx.repeats)]
+    return await timed_calls(lambda i: db.is_message_archived(ids[i]), ctx.repeats)
+
+
+async def case_get_archived_message_cold(ctx):
+    rng = random.Random(SEED)
+    ids = [archived_id(rng, ctx.total) for _ in range(ctx.repeats)]
+    return await timed_calls(lambda i: db.get_archived_message(GUILD_ID, ids[i]), ctx.repeats,
+                             before_each=cache.archived_rows.clear)
+
+
+async def case_get_archived_message_cached(ctx):
+    rng = random.Random(SEED)
+    popular = [archived_id(rng, ctx.total) for _ in range(20)]
+    return await timed_calls(lambda i: db.get_archived_message(GUILD_ID, popular[i % 20]), ctx.repeats)
+
+
+async def case_random_archived(ctx):
+    return await timed_calls(lambda i: db.get_random_archived_message(GUILD_ID), ctx.repeats)
+
+
+async def case_poll_selection(ctx):
+    async def select(i):
+        # Les trois appels du /poll
+        candidate = await db.get_poll_candidate(GUILD_ID)
+        await db.get_other_authors(GUILD_ID, candidate[2])
+        await db.increment_times_polled(GUILD_ID, candidate[0])
+    return await timed_calls(select, ctx.repeats)
+
+
+async def case_stats(ctx):
+    return await timed_calls(lambda i: db.get_archive_stats(GUILD_ID), ctx.repeats)
+
+
+async def case_search(ctx):
+    # Un mot fréquent, un mot moyen et un mot rare du vocabulaire de Zipf
+    words = ["mot1", "mot50", "mot5000"]
+    return await timed_calls(lambda i: db.search_archived_messages(GUILD_ID, words[i % 3]), ctx.repeats)
+
+
+async def case_leaderboard(ctx):
+    return await timed_calls(lambda i: db.get_leaderboard(GUILD_ID, 10, (i % 50) * 10), ctx.repeats)
+
+
+async def case_user_rank(ctx):
+    rng = random.Random(SEED)
+    users = [rng.randrange(ctx.players) for _ in range(ctx.repeats)]
+    return await timed_calls(lambda i: db.get_user_rank(GUILD_ID, users[i]), ctx.repeats)
+
+
+async def case_add_points(ctx):
+    rng = random.Random(SEED)
+    users = [rng.randrange(ctx.players) for _ in range(ctx.repeats)]
+    return await timed_calls(lambda i: db.add_points(GUILD_ID, users[i]), ctx.repeats)
+
+
+async def case_try_archive_message(ctx):
+    guild = make_guild(GUILD_ID)
+    channel = make_channel(ctx.next_channel_id(), guild, ctx.repeats + 1, random.Random(SEED),
+                           first_id=ctx.next_first_id(ctx.repeats + 1))
+    # messages[0] sert à l'appel de chauffe : chaque appel mesuré archive un nouveau message
+    calls = iter(channel.messages)
+    return await timed_calls(lambda i: try_archive_message(ctx.bot, next(calls)), ctx.repeats)
+
+
+def scan_timings(channels, started):
+    """Durée de traitement de chaque message : écart entre deux messages servis."""
+    timings = []
+    for channel in channels:
+        previous = started
+        for stamp in channel.yielded_at:
+            timings.append(stamp - previous)
+            previous = stamp
+    return timings
+
+
+async def case_scan_recent(ctx):
+    guild = make_guild(GUILD_ID)
+    channel = make_channel(ctx.next_channel_id(), guild, SCAN_MESSAGES, random.Random(SEED),
+                           first_id=ctx.next_first_id(SCAN_MESSAGES), page_latency=ctx.page_latency)
+    started = time.perf_counter()
+    scanned, _ = await Scan(ctx.bot)._scan_recent(channel, None, None)
+    return scanned, time.perf_counter() - started, scan_timings([channel], started)
+
+
+async def case_scan_all(ctx):
+    guild = make_guild(GUILD_ID)
+    rng = random.Random(SEED)
+    per_channel = SCAN_MESSAGES // SCAN_ALL_CHANNELS
+    for _ in range(SCAN_ALL_CHANNELS):
+        guild.text_channels.append(make_channel(ctx.next_channel_id(), guild, per_channel, rng,
+                                                first_id=ctx.next_first_id(per_channel),
+                                                page_latency=ctx.page_latency))
+    notify = make_channel(ctx.next_channel_id(), guild, 0, rng)
+    response = SimpleNamespace(send_message=notify.send)
+    interaction = SimpleNamespace(guild=guild, channel=notify, response=response)
+
+    started = time.perf_counter()
+    await Scan.scan_all.callback(Scan(ctx.bot), interaction, per_channel)
+    elapsed = time.perf_counter() - started
+    return per_channel * SCAN_ALL_CHANNELS, elapsed, scan_timings(guild.text_channels, started)
+
+
+CASES = [
+    ("is_message_archived", case_is_message_archived),
+    ("get_archived_message (froid)", case_get_archived_message_cold),
+    ("get_archived_message (cache)", case_get_archived_message_cached),
+    ("random_archived", case_random_archived),
+    ("sondage : tirage + auteurs", case_poll_selection),
+    ("stats", case_stats),
+    ("search", case_search),
+    ("leaderboard", case_leaderboard),
+    ("get_user_rank", case_user_rank),
+    ("add_points", case_add_points),
+    ("try_archive_message", case_try_archive_message),
+    ("scan : _scan_recent", case_scan_recent),
+    ("scan : scan_all", case_scan_all),
+]
+
+
+# ============================
+# EXÉCUTION ET RAPPORT
+# ============================
+
+class Context:
+    def __init__(self, total, repeats, page_latency):
+        self.total = total
+        self.players = max(total // 10, 1)
+        self.repeats = repeats
+        self.page_latency = page_latency
+        self.bot = SimpleNamespace()
+        self._channel_id = 10_000
+        self._next_index = total   # les faux messages suivent ceux de l'archive
+
+    def next_channel_id(self):
+        self._channel_id += 1
+        return self._channel_id
+
+    def next_first_id(self, count):
+        first_id = FIRST_ID + self._next_index * ID_STEP
+        self._next_index += count
+        return first_id
+
+
+def summarize(ops, elapsed, timings):
+    timings = sorted(timings)
+    return {
+        "ops_s": ops / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(timings) * 1000 if timings else 0.0,
+        "p99_ms": timings[max(0, int(len(timings) * 0.99) - 1)] * 1000 if timings else 0.0,
+    }
+
+
+async def run_size(total, repeats, only, page_latency):
+    random.seed(SEED)   # tirages de db.py (sondages, messages aléatoires)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        cache.archived_rows.clear()
+        cache.archived_embeds.clear()
+        ctx = Context(total, repeats, page_latency)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            await db.init_db()
+            started = time.perf_counter()
+            await fill(total, ctx.players)
+            fill_time = time.perf_counter() - started
+
+            for name, case in CASES:
+                if only and not any(word in name for word in only):
+                    continue
+                results[name] = summarize(*await case(ctx))
+            await db.close()
+
+    print(f"\n== {total} messages, {ctx.players} joueurs (remplissage {fill_time:.1f} s) ==")
+    print(f"{'cas':<32}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<32}{result['ops_s']:12.0f}{result['p50_ms']:10.3f}{result['p99_ms']:10.3f}")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Affiche les écarts de débit avec la référence ; retourne le nombre de régressions."""
+    regressions = 0
+    print(f"\n== Comparaison (tolérance {tolerance:.0%}) ==")
+    for size, cases in results.items():
+        for name, result in cases.items():
+            reference = baseline.get(size, {}).get(name)
+            if not reference or not reference["ops_s"]:
+                continue
+            ratio = result["ops_s"] / reference["ops_s"]
+            flag = ""
+            if ratio < 1 - tolerance:
+                regressions += 1
+                flag = "  ⚠️ régression"
+            print(f"{size:>8} {name:<32}{reference['ops_s']:12.0f} -> {result['ops_s']:10.0f} ops/s "
+                  f"({ratio - 1:+.0%}){flag}")
+    return regressions
+
+
+async def main(args):
+    results = {}
+    for size in args.sizes.split(","):
+        total = parse_size(size)
+        results[str(total)] = await run_size(total, args.repeats, args.only, args.page_latency)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Résultats enregistrés dans {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne du bot.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="tailles de l'archive (ex. 10k,100k,1m)")
+    parser.add_argument("--repeats", type=int, default=500, help="opérations par cas")
+    parser.add_argument("--only", nargs="*", help="ne mesurer que les cas dont le nom contient ces mots")
+    parser.add_argument("--page-latency", type=float, default=0.0,
+                        help="latence simulée d'une page d'historique, en secondes")
+    parser.add_argument("--save", help="fichier JSON où enregistrer les résultats")
+    parser.add_argument("--compare", help="fichier JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.4, help="perte de débit tolérée")
+    sys.exit(asyncio.run(main(parser.parse_args())))
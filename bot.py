@@ -3,7 +3,15 @@ from discord.ext import commands
 import os
 from dotenv import load_dotenv
 import asyncio
+import signal
+import time
 import db
+import shards
+from jobs import ScanJobManager
+from images import ImageArchiver
+from backups import BackupManager
+from command_sync import sync_commands
+from cogs.metrics import MetricsTree
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -12,8 +20,49 @@ TOKEN = os.getenv("DISCORD_TOKEN")
 # CONFIGURATION DU BOT
 # ============================
 
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Profil d'intents et de cache :
+#  - "minimal" (défaut) : serveurs, messages, contenu et réactions ; pas de cache
+#    des membres ni des présences, cache de messages réduit (BOT_MAX_MESSAGES).
+#  - "full" : Intents.all() et caches par défaut de discord.py (ancien comportement).
+INTENTS_PROFILE = os.getenv("BOT_INTENTS_PROFILE", "minimal")
+MAX_MESSAGES = int(os.getenv("BOT_MAX_MESSAGES", "100"))          # 0 = aucun cache
+REACTION_TRACKER_SIZE = int(os.getenv("BOT_REACTION_TRACKER_SIZE", "10000"))
+
+
+def client_options(profile):
+    """Arguments de commands.Bot pour un profil donné."""
+    if profile == "full":
+        return {"intents": discord.Intents.all()}
+
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True     # commandes préfixées (!archive, ...)
+    intents.message_content = True    # contenu des messages archivés
+    intents.guild_reactions = True    # on_raw_reaction_add / remove
+    return {
+        "intents": intents,
+        "max_messages": MAX_MESSAGES or None,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+    }
+
+
+# Sharding : voir shards.py (un processus, ou plusieurs lancés par launcher.py)
+# MetricsTree chronomètre les slash commands (voir cogs/metrics.py)
+if shards.sharded():
+    bot = commands.AutoShardedBot(command_prefix="!", tree_cls=MetricsTree,
+                                  **shards.shard_options(), **client_options(INTENTS_PROFILE))
+else:
+    bot = commands.Bot(command_prefix="!", tree_cls=MetricsTree, **client_options(INTENTS_PROFILE))
+bot.worker_id = shards.WORKER_ID
+bot.reaction_tracker_size = REACTION_TRACKER_SIZE
+bot.started_at = None  # posé par main(), remis à None au premier on_ready
+# Tâches de scan de fond (/scan_full), reprises automatiquement au démarrage
+bot.scan_jobs = ScanJobManager(bot)
+# Copies locales des images archivées (les URL du CDN de Discord expirent)
+bot.image_archiver = ImageArchiver(bot)
+# Sauvegardes de la base (planifiées par un seul processus, voir main())
+bot.backups = BackupManager()
 
 # Extensions / cogs à charger
 initial_extensions = [
@@ -24,6 +73,11 @@ initial_extensions = [
     "cogs.config", 
     "cogs.stats",
     "cogs.leaderboard",
+    "cogs.search",
+    "cogs.shards",
+    "cogs.metrics",
+    "cogs.transfer",
+    "cogs.backups",
     "cogs.self_react_alert"
 ]
 
@@ -33,31 +87,63 @@ initial_extensions = [
 
 @bot.event
 async def on_ready():
-    print(f"✅ Bot connecté en tant que {bot.user}")
-    # Synchronisation des slash commands
-    await bot.tree.sync()
-    print("🌐 Slash commands synchronisées.")
+    # on_ready est rappelé après chaque reconnexion : le démarrage n'est traité qu'une fois
+    if bot.started_at is None:
+        return
+    print(f"✅ Bot connecté en tant que {bot.user} (prêt en {time.perf_counter() - bot.started_at:.1f}s)")
+    bot.started_at = None
+
+    # Synchronisation des slash commands si l'arbre a changé (une seule fois pour
+    # tous les processus : c'est celui qui possède le shard 0 qui s'en charge)
+    if shards.SHARD_IDS is None or 0 in shards.SHARD_IDS:
+        try:
+            await sync_commands(bot)
+        except discord.HTTPException as e:
+            print(f"⚠️ Synchronisation des slash commands impossible : {e}")
 
 # ============================
 # LANCEMENT DU BOT
 # ============================
 
 async def main():
+    bot.started_at = time.perf_counter()
+
     #Initialisation de la base de données
-    db.init_db()
-    print(f"🗄️ Base de données initialisée.")
+    await db.init_db()
+    print(f"🗄️ Base de données initialisée ({(time.perf_counter() - bot.started_at) * 1000:.0f} ms).")
 
     # Charger les cogs avant de démarrer le bot
+    loading_started = time.perf_counter()
     for ext in initial_extensions:
+        started = time.perf_counter()
         try:
             await bot.load_extension(ext)
-            print(f"📦 Extension chargée : {ext}")
+            print(f"📦 Extension chargée : {ext} ({(time.perf_counter() - started) * 1000:.0f} ms)")
         except Exception as e:
             print(f"⚠️ Impossible de charger {ext}: {e}")
+    print(f"📦 {len(bot.extensions)}/{len(initial_extensions)} extensions chargées "
+          f"en {(time.perf_counter() - loading_started) * 1000:.0f} ms")
+
+    # Arrêt propre sur SIGTERM (docker stop, launcher.py) : les écritures en
+    # attente sont vidées avant de quitter
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    except NotImplementedError:
+        pass  # Windows
 
     # Lancer le bot
-    async with bot:
-        await bot.start(TOKEN)
+    try:
+        async with bot:
+            bot.scan_jobs.start()
+            bot.image_archiver.start()
+            if shards.SHARD_IDS is None or 0 in shards.SHARD_IDS:
+                bot.backups.start()
+            await bot.start(TOKEN)
+    finally:
+        await bot.scan_jobs.stop()
+        await bot.image_archiver.stop()
+        await bot.backups.stop()
+        await db.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
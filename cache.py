@@ -0,0 +1,80 @@
+import os
+import time
+from collections import OrderedDict
+
+# ============================
+# CACHES DES MESSAGES ARCHIVÉS
+# ============================
+
+ARCHIVE_CACHE_SIZE = int(os.getenv("BOT_ARCHIVE_CACHE_SIZE", "2048"))   # entrées par cache
+ARCHIVE_CACHE_TTL = float(os.getenv("BOT_ARCHIVE_CACHE_TTL", "600"))    # secondes
+
+
+class TTLCache:
+    """Cache LRU borné dont les entrées expirent après `ttl` secondes.
+
+    Utilisé uniquement depuis la boucle d'événements (pas de verrou). Les
+    compteurs hits / misses servent à dimensionner le cache.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # clé -> (expire_à, valeur)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Lignes de archived_messages : message_id -> (server_id, ligne)
+archived_rows = TTLCache(ARCHIVE_CACHE_SIZE, ARCHIVE_CACHE_TTL)
+# Embeds déjà construits : (message_id, variante) -> discord.Embed
+archived_embeds = TTLCache(ARCHIVE_CACHE_SIZE, ARCHIVE_CACHE_TTL)
+EMBED_VARIANTS = ("random", "show")
+
+
+def invalidate_archived(message_id):
+    """À appeler dès qu'un message archivé est ajouté, modifié ou supprimé."""
+    archived_rows.discard(message_id)
+    for variant in EMBED_VARIANTS:
+        archived_embeds.discard((message_id, variant))
@@ -1,18 +1,28 @@
 from discord.ext import commands
 import discord
 from discord import app_commands
-import sqlite3
-from db import archive_message, is_message_archived, get_archived_message, DB_PATH
+import asyncio
+from db import archive_message, is_message_archived, unarchive_message, may_be_archived, apply_reaction_deltas
+from reactions import ReactionTracker, ReactionDeltas, REACTION_TRACKER_SIZE
+
+REACTION_FLUSH_INTERVAL = 10    # secondes maximum avant l'écriture des réactions reçues
+REACTION_FLUSH_MESSAGES = 500   # messages en attente déclenchant une écriture immédiate
 
 # ============================
 # FONCTION UTILITAIRE
 # ============================
-async def try_archive_message(bot, target_message: discord.Message) -> bool:
-    """Tente d’archiver un message. Retourne True si succès, False sinon."""
+async def try_archive_message(bot, target_message: discord.Message, writer=None) -> bool:
+    """Tente d’archiver un message. Retourne True si succès, False sinon.
+
+    Si `writer` (un db.ScanWriter) est fourni, l'insertion est différée et
+    groupée avec les autres écritures du scan.
+    """
 
     if target_message.author.bot:
         return False
-    if is_message_archived(target_message.id):
+    if writer is not None and writer.is_pending(target_message.id):
+        return False
+    if await is_message_archived(target_message.id):
         return False
     if not target_message.content and not target_message.attachments:
         # ni texte ni image
@@ -27,10 +37,13 @@ async def try_archive_message(bot, target_message: discord.Message) -> bool:
                 break
 
     url = f"https://discord.com/channels/{target_message.guild.id}/{target_message.channel.id}/{target_message.id}"
-    max_reactions = max([r.count for r in target_message.reactions], default=0)
-    reaction_emoji = str(target_message.reactions[0].emoji) if target_message.reactions else None
+    # Détail des réactions ; l'emoji retenu est le plus utilisé (comme après une mise à jour)
+    reaction_counts = {str(r.emoji): r.count for r in target_message.reactions}
+    max_reactions = max(reaction_counts.values(), default=0)
+    reaction_emoji = max(reaction_counts, key=reaction_counts.get) if reaction_counts else None
 
-    archive_message(
+    save = writer.archive if writer is not None else archive_message
+    await save(
         target_message.id,
         target_message.content or "",
         max_reactions,
@@ -39,9 +52,16 @@ async def try_archive_message(bot, target_message: discord.Message) -> bool:
         target_message.author.name,
         url,
         image_url,
-        reaction_emoji
+        reaction_emoji,
+        reaction_counts
     )
 
+    # Copie locale de l'image (voir images.py) ; pendant un scan, la ligne n'est
+    # en base qu'au prochain flush et l'image sera prise au passage suivant
+    archiver = getattr(bot, "image_archiver", None)
+    if image_url and archiver is not None:
+        archiver.wake()
+
     print(f"[ARCHIVE] ✅ Message {target_message.id} archivé "
           f"(auteur={target_message.author}, réactions={max_reactions}, canal={target_message.channel})")
 
@@ -54,6 +74,54 @@ async def try_archive_message(bot, target_message: discord.Message) -> bool:
 class Archive(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.reactions = ReactionTracker(getattr(bot, "reaction_tracker_size", REACTION_TRACKER_SIZE))
+        self.live_reactions = ReactionDeltas()  # réactions reçues par des messages déjà archivés
+        self._flush_now = asyncio.Event()   # tampon plein : le flusher écrit sans attendre
+        self._flush_lock = asyncio.Lock()
+        self._flusher = None
+
+    async def cog_load(self):
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def cog_unload(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        await self.flush_reactions()
+
+    # --- Réactions des messages archivés ---
+    def _track_live(self, message_id, emoji, delta):
+        # Le filtre répond sans requête ; ses faux positifs sont ignorés à l'écriture
+        if not may_be_archived(message_id):
+            return
+        self.live_reactions.add(message_id, emoji, delta)
+        if len(self.live_reactions) >= REACTION_FLUSH_MESSAGES:
+            self._flush_now.set()
+
+    def forget_reactions(self):
+        """Oublie les compteurs suivis (la base a été remplacée, voir /backup_restore)."""
+        self.reactions = ReactionTracker(self.reactions.max_messages)
+
+    async def flush_reactions(self):
+        # Une écriture à la fois : au retour, plus rien d'antérieur n'est en vol
+        async with self._flush_lock:
+            deltas = self.live_reactions.drain()
+            if not deltas:
+                return
+            try:
+                await apply_reaction_deltas(deltas)
+            except Exception as e:
+                print(f"[ARCHIVE] ⚠️ Impossible d'écrire {len(deltas)} variation(s) de réactions : {e}")
+                self.live_reactions.merge(deltas)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=REACTION_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush_reactions()
 
     # --- SLASH COMMAND ---
     @app_commands.command(
@@ -103,44 +171,87 @@ class Archive(commands.Cog):
         description="Désarchive un message (le supprime de la base)."
     )
     @app_commands.describe(message_id="L’ID du message à désarchiver")
+    @app_commands.guild_only()
     async def unarchive(self, interaction: discord.Interaction, message_id: str):
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT 1 FROM archived_messages WHERE message_id = ?", (message_id,))
-        result = cursor.fetchone()
+        try:
+            message_id_int = int(message_id)
+        except ValueError:
+            await interaction.response.send_message("⚠️ ID invalide, merci de fournir un nombre.", ephemeral=True)
+            return
 
-        if not result:
-            conn.close()
+        if not await unarchive_message(interaction.guild_id, message_id_int):
             await interaction.response.send_message("⚠️ Ce message n’est pas archivé.", ephemeral=True)
             return
 
-        cursor.execute("DELETE FROM archived_messages WHERE message_id = ?", (message_id,))
-        conn.commit()
-        conn.close()
-
         await interaction.response.send_message(f"🗑️ Message {message_id} désarchivé avec succès.", ephemeral=True)
 
-    # --- LISTENER ---
+    # --- LISTENERS ---
+    # Événements bruts : ils arrivent même pour les messages absents du cache de
+    # discord.py. On compte localement et on ne récupère le message (un appel
+    # API) qu'au moment où un emoji franchit le seuil.
     @commands.Cog.listener()
-    async def on_reaction_add(self, reaction, user):
-        if user.bot:
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        if payload.guild_id is None:
+            return
+        # Compteurs des messages archivés : toutes les réactions, comme ceux de Discord
+        self._track_live(payload.message_id, str(payload.emoji), 1)
+        if payload.member is not None and payload.member.bot:
+            return
+
+        threshold = getattr(self.bot, "reaction_threshold", 4)
+        if self._count_reaction(payload) < threshold:
+            return
+        if await is_message_archived(payload.message_id):
+            self.reactions.mark_done(payload.message_id)
+            return
+
+        # Marqué avant le fetch pour ne pas récupérer deux fois le même message
+        self.reactions.mark_done(payload.message_id)
+        channel = self.bot.get_partial_messageable(payload.channel_id, guild_id=payload.guild_id)
+        try:
+            message = await channel.fetch_message(payload.message_id)
+        except (discord.NotFound, discord.Forbidden):
             return
 
-        message = reaction.message
         if message.author.bot:
             return
         if not message.content or message.content.strip() == "":
             return
-        
-        # Si le message atteint le seuil défini
-        if reaction.count >= getattr(self.bot, "reaction_threshold", 4):
-            archived = await try_archive_message(self.bot, message)
-            if archived:
-                await message.channel.send(
-                    f"💾 Message archivé (seuil atteint) : {message.content[:50]}..."
+
+        # Si le message atteint vraiment le seuil défini
+        if not any(r.count >= threshold for r in message.reactions):
+            self.reactions.reset(message.id, {str(r.emoji): r.count for r in message.reactions})
+            return
+
+        archived = await try_archive_message(self.bot, message)
+        if archived:
+            await message.channel.send(
+                f"💾 Message archivé (seuil atteint) : {message.content[:50]}..."
             )
 
+    def _count_reaction(self, payload) -> int:
+        """Compte la réaction et retourne le compteur suivi de son emoji.
+
+        Un message non suivi part de ses vrais compteurs s'il est dans le cache
+        de discord.py, de zéro sinon (aucun appel API : le fetch n'a lieu qu'au
+        seuil, et corrige alors les compteurs).
+        """
+        emoji = str(payload.emoji)
+        if payload.message_id not in self.reactions:
+            message = discord.utils.get(self.bot.cached_messages, id=payload.message_id)
+            if message is not None:
+                # Les compteurs du cache incluent déjà cette réaction
+                counts = {str(r.emoji): r.count for r in message.reactions}
+                self.reactions.reset(payload.message_id, counts)
+                return counts.get(emoji, 0)
+        return self.reactions.add(payload.message_id, emoji)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        if payload.guild_id is not None:
+            self._track_live(payload.message_id, str(payload.emoji), -1)
+        self.reactions.remove(payload.message_id, str(payload.emoji))
+
 
 async def setup(bot):
     await bot.add_cog(Archive(bot))
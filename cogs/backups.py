@@ -0,0 +1,129 @@
+import datetime
+import sqlite3
+
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+import shards
+from backups import list_backups
+
+
+async def is_bot_owner(interaction: discord.Interaction) -> bool:
+    """Les sauvegardes concernent tous les serveurs : réservées au propriétaire du bot."""
+    if await interaction.client.is_owner(interaction.user):
+        return True
+    raise app_commands.CheckFailure("réservé au propriétaire du bot")
+
+
+class Backups(commands.Cog):
+    """Sauvegardes de la base (voir backups.py)."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    # ----------- /backups ------------
+    @app_commands.command(
+        name="backups",
+        description="Liste les sauvegardes de la base (propriétaire du bot uniquement)."
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.check(is_bot_owner)
+    async def backups(self, interaction: discord.Interaction):
+        backups = list_backups()
+        embed = discord.Embed(title="💾 Sauvegardes de la base", color=discord.Color.blue())
+        if backups:
+            embed.description = "\n".join(
+                f"`{name}` — {size / 1024 / 1024:.1f} Mo · "
+                f"{discord.utils.format_dt(datetime.datetime.fromtimestamp(mtime), 'R')}"
+                for name, size, mtime in backups
+            )[:4096]
+        else:
+            embed.description = "Aucune sauvegarde."
+        last = self.bot.backups.last_result
+        if last is not None:
+            embed.set_footer(text=f"Dernière sauvegarde de ce processus : {last.summary()}")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    # ----------- /backup_now ------------
+    @app_commands.command(
+        name="backup_now",
+        description="Sauvegarde la base maintenant (propriétaire du bot uniquement)."
+    )
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.check(is_bot_owner)
+    async def backup_now(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        try:
+            result = await self.bot.backups.backup_now()
+        except (sqlite3.Error, OSError) as e:
+            await interaction.followup.send(f"⚠️ Sauvegarde impossible : {e}", ephemeral=True)
+            return
+        await interaction.followup.send(f"💾 Sauvegarde {result.summary()}", ephemeral=True)
+
+    # ----------- /backup_restore ------------
+    @app_commands.command(
+        name="backup_restore",
+        description="Remplace toute la base par une sauvegarde (propriétaire du bot uniquement)."
+    )
+    @app_commands.describe(name="Sauvegarde à restaurer (voir /backups)")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.check(is_bot_owner)
+    async def backup_restore(self, interaction: discord.Interaction, name: str):
+        # Les autres processus garderaient leurs index en mémoire de l'ancienne base
+        if shards.SHARD_IDS is not None:
+            await interaction.response.send_message(
+                "⚠️ Impossible avec plusieurs processus : arrêter le bot puis lancer "
+                f"`python backups.py restore {name}`.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        resume = await self._suspend_live_state()
+        try:
+            safety = await self.bot.backups.restore(name)
+        except ValueError as e:
+            await interaction.followup.send(f"⚠️ {e}", ephemeral=True)
+            return
+        finally:
+            await resume()
+        await interaction.followup.send(
+            f"♻️ Base restaurée depuis `{name}`. L'état précédent a été sauvegardé dans `{safety.name}`.",
+            ephemeral=True
+        )
+
+    async def _suspend_live_state(self):
+        """Écrit puis arrête ce qui vit en mémoire au-dessus de la base (votes, scans,
+        réactions, images), pour que rien ne soit réécrit dans la base restaurée.
+
+        Retourne la coroutine qui relance le tout, à partir de la base en place.
+        """
+        jobs = self.bot.scan_jobs
+        images = self.bot.image_archiver
+        polls = self.bot.get_cog("Polls")
+        archive = self.bot.get_cog("Archive")
+        jobs_running = jobs.running
+        await jobs.stop()   # les tâches gardent leur curseur validé en base
+        await images.stop()
+        if polls is not None:
+            await polls.suspend()
+        if archive is not None:
+            await archive.flush_reactions()
+
+        async def resume():
+            if archive is not None:
+                archive.forget_reactions()
+            if polls is not None:
+                await polls.reattach_open_polls()
+            images.start()
+            if jobs_running:
+                jobs.start()
+        return resume
+
+    @backup_restore.autocomplete("name")
+    async def backup_name_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=name, value=name)
+                for name, _, _ in list_backups() if current in name][:25]
+
+
+async def setup(bot):
+    await bot.add_cog(Backups(bot))
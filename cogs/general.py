@@ -2,6 +2,39 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from db import get_random_archived_message, get_archived_message
+from cache import archived_embeds
+from images import local_image, attachment_url, image_file_kwargs
+
+def archived_message_embed(row, variant):
+    """Embed d'un message archivé, construit une seule fois par (message, variante)."""
+    embed = archived_embeds.get((row[0], variant))
+    if embed is not None:
+        return embed
+
+    message_id, content, author_name, message_url, image_url, reaction_emoji, image_file = row
+    embed = discord.Embed(
+        title=f"🗂️ Message archivé (ID {message_id})",
+        description=(content[:1000] + "..." if content and len(content) > 1000 else content) or "*[Sans contenu]*",
+        color=discord.Color.blue() if variant == "random" else discord.Color.green()
+    )
+    embed.add_field(name="Auteur", value=author_name, inline=True)
+    embed.add_field(name="Lien", value=f"[Aller au message original]({message_url})", inline=True)
+    # Copie locale si elle existe (voir images.py), sinon l'URL d'origine du CDN
+    local_path = local_image(image_file)
+    if local_path:
+        embed.set_image(url=attachment_url(local_path))
+    elif image_url:
+        embed.set_image(url=image_url)
+    if reaction_emoji:
+        embed.add_field(name="Réaction", value=reaction_emoji, inline=True)
+
+    archived_embeds.put((message_id, variant), embed)
+    return embed
+
+def archived_message_kwargs(row, variant):
+    """Arguments de send_message : l'embed, et le fichier de l'image locale s'il y en a une."""
+    embed = archived_message_embed(row, variant)
+    return {"embed": embed, **image_file_kwargs(embed, row[6])}
 
 class General(commands.Cog):
     def __init__(self, bot):
@@ -17,27 +50,14 @@ class General(commands.Cog):
         name="random_archived",
         description="Affiche un message archivé aléatoire."
     )
+    @app_commands.guild_only()
     async def random_archived(self, interaction: discord.Interaction):
-        row = get_random_archived_message()
+        row = await get_random_archived_message(interaction.guild_id)
         if not row:
             await interaction.response.send_message("⚠️ Aucun message archivé disponible.", ephemeral=True)
             return
-        
-        message_id, content, author_name, message_url, image_url, reaction_emoji = row
-
-        embed = discord.Embed(
-            title=f"🗂️ Message archivé (ID {message_id})",
-            description=(content[:1000] + "..." if content and len(content) > 1000 else content) or "*[Sans contenu]*",
-            color=discord.Color.blue()
-        )
-        embed.add_field(name="Auteur", value=author_name, inline=True)
-        embed.add_field(name="Lien", value=f"[Aller au message original]({message_url})", inline=True)
-        if image_url:
-            embed.set_image(url=image_url)
-        if reaction_emoji:
-            embed.add_field(name="Réaction", value=reaction_emoji, inline=True)
 
-        await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(**archived_message_kwargs(row, "random"))
 
 
     # ----------- /show_message_by_id ------------
@@ -45,6 +65,7 @@ class General(commands.Cog):
         name="show_message_by_id",
         description="Affiche un message archivé à partir de son ID."
     )
+    @app_commands.guild_only()
     async def show_message_by_id(self, interaction: discord.Interaction, message_id: str):
 
         try:
@@ -53,26 +74,12 @@ class General(commands.Cog):
             await interaction.response.send_message("⚠️ ID invalide, merci de fournir un nombre.", ephemeral=True)
             return
         
-        row = get_archived_message(message_id_int)
+        row = await get_archived_message(interaction.guild_id, message_id_int)
         if not row:
             await interaction.response.send_message("⚠️ Aucun message archivé avec cet ID.", ephemeral=True)
             return
-        
-        message_id, content, author_name, message_url, image_url, reaction_emoji = row
-
-        embed = discord.Embed(
-            title=f"🗂️ Message archivé (ID {message_id})",
-            description=(content[:1000] + "..." if content and len(content) > 1000 else content) or "*[Sans contenu]*",
-            color=discord.Color.green()
-        )
-        embed.add_field(name="Auteur", value=author_name, inline=True)
-        embed.add_field(name="Lien", value=f"[Aller au message original]({message_url})", inline=True)
-        if image_url:
-            embed.set_image(url=image_url)
-        if reaction_emoji:
-            embed.add_field(name="Réaction", value=reaction_emoji, inline=True)
 
-        await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(**archived_message_kwargs(row, "show"))
 
 
 # Cette fonction est nécessaire pour que load_extension fonctionne
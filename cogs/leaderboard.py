@@ -1,7 +1,17 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from db import get_leaderboard, get_user_points, reset_leaderboard
+from db import (get_leaderboard, get_leaderboard_around, count_ranked_players,
+                get_user_points, get_user_rank, reset_leaderboard)
+
+PAGE_SIZE = 10
+
+def format_rows(rows, highlight=None):
+    lines = []
+    for rank, user_id, points in rows:
+        line = f"**{rank}. <@{user_id}>** — {points} point(s)"
+        lines.append(f"➡️ {line}" if user_id == highlight else line)
+    return "\n".join(lines)
 
 class Leaderboard(commands.Cog):
     def __init__(self, bot):
@@ -12,31 +22,61 @@ class Leaderboard(commands.Cog):
         name="leaderboard",
         description="Affiche le classement des utilisateurs aux polls."
     )
-    async def leaderboard(self, interaction: discord.Interaction):
-        rows = get_leaderboard(limit=10)
-        if not rows:
+    @app_commands.describe(page="Numéro de la page (10 joueurs par page)")
+    @app_commands.guild_only()
+    async def leaderboard(self, interaction: discord.Interaction, page: app_commands.Range[int, 1] = 1):
+        players = await count_ranked_players(interaction.guild_id)
+        if not players:
             await interaction.response.send_message("⚠️ Aucun score enregistré pour le moment.")
             return
 
+        pages = (players + PAGE_SIZE - 1) // PAGE_SIZE
+        if page > pages:
+            await interaction.response.send_message(
+                f"⚠️ Il n'y a que {pages} page(s) de classement.", ephemeral=True
+            )
+            return
+
+        rows = await get_leaderboard(interaction.guild_id, limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE)
         embed = discord.Embed(
             title="🏅 Classement des polls",
+            description=format_rows(rows, highlight=interaction.user.id),
             color=discord.Color.gold()
         )
+        embed.set_footer(text=f"Page {page}/{pages} · {players} joueur(s)")
+        await interaction.response.send_message(embed=embed)
 
-        lines = []
-        for i, (user_id, points) in enumerate(rows, start=1):
-            lines.append(f"**{i}. <@{user_id}>** — {points} point(s)")
+    # ----------- /myrank ------------
+    @app_commands.command(
+        name="myrank",
+        description="Affiche ton rang au classement des polls et tes voisins."
+    )
+    @app_commands.guild_only()
+    async def myrank(self, interaction: discord.Interaction):
+        result = await get_user_rank(interaction.guild_id, interaction.user.id)
+        if result is None:
+            await interaction.response.send_message(
+                "⚠️ Tu n'as encore aucun point : participe à un sondage !", ephemeral=True
+            )
+            return
 
-        embed.description = "\n".join(lines)
-        await interaction.response.send_message(embed=embed)
+        rank, points, players = result
+        rows = await get_leaderboard_around(interaction.guild_id, interaction.user.id, radius=2)
+        embed = discord.Embed(
+            title=f"🏅 Tu es {rank}{'ᵉʳ' if rank == 1 else 'ᵉ'} sur {players} avec {points} point(s)",
+            description=format_rows(rows, highlight=interaction.user.id),
+            color=discord.Color.gold()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
     # ----------- /mypoints ------------
     @app_commands.command(
         name="mypoints",
         description="Affiche ton nombre de points obtenus dans les sondages."
     )
+    @app_commands.guild_only()
     async def mypoints(self, interaction: discord.Interaction):
-        points = get_user_points(interaction.user.id)
+        points = await get_user_points(interaction.guild_id, interaction.user.id)
         await interaction.response.send_message(
             f"🏅 Tu as actuellement **{points}** points, {interaction.user.mention} !",
             ephemeral=True
@@ -47,10 +87,11 @@ class Leaderboard(commands.Cog):
         name="reset_leaderboard",
         description="Réinitialise tous les scores (admin uniquement)."
     )
+    @app_commands.guild_only()
     @app_commands.checks.has_permissions(administrator=True)
     async def reset_leaderboard_cmd(self, interaction: discord.Interaction):
-        reset_leaderboard()
-        await interaction.response.send_message("♻️ Le leaderboard a été réinitialisé avec succès !")
+        await reset_leaderboard(interaction.guild_id)
+        await interaction.response.send_message("♻️ Le leaderboard de ce serveur a été réinitialisé avec succès !")
 
 async def setup(bot):
     await bot.add_cog(Leaderboard(bot))
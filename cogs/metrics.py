@@ -0,0 +1,170 @@
+import asyncio
+import math
+import time
+
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+import metrics
+from cache import archived_rows, archived_embeds
+
+LOOP_LAG_INTERVAL = 0.5  # secondes entre deux mesures du retard de la boucle
+
+
+def _command_name(command):
+    return getattr(command, "qualified_name", None) or getattr(command, "name", "?")
+
+
+class MetricsTree(app_commands.CommandTree):
+    """Arbre de commandes qui chronomètre chaque slash command (passé via tree_cls)."""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["metrics_started"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        name = _command_name(interaction.command) if interaction.command else "?"
+        metrics.COMMAND_ERRORS.inc(1, "slash", name)
+        started = interaction.extras.get("metrics_started")
+        if started is not None:
+            metrics.COMMAND_SECONDS.observe(time.perf_counter() - started, "slash", name)
+        await super().on_error(interaction, error)
+
+
+class Metrics(commands.Cog):
+    """Latence des commandes, temps passé en base, santé de la gateway et de la boucle.
+
+    Les métriques sont exposées au format Prometheus sur un port local et
+    résumées par /botmetrics.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._runner = None
+        self._lag_task = None
+        # Commandes préfixées : les hooks du bot sont attendus en ligne, contrairement
+        # aux événements on_command (et un listener on_command_error masquerait les
+        # erreurs que discord.py journalise par défaut)
+        bot.before_invoke(self._before_prefix_command)
+        bot.after_invoke(self._after_prefix_command)
+
+    async def cog_load(self):
+        metrics.GATEWAY_LATENCY.callback = self._gateway_latencies
+        metrics.CACHE_LOOKUPS.callback = self._cache_lookups
+        self._lag_task = asyncio.create_task(self._measure_loop_lag())
+
+        if metrics.METRICS_PORT:
+            port = metrics.METRICS_PORT + getattr(self.bot, "worker_id", 0)
+            try:
+                self._runner = await metrics.start_server(port)
+                print(f"📈 Métriques exposées sur http://{metrics.METRICS_HOST}:{port}/metrics")
+            except OSError as e:
+                print(f"⚠️ Impossible d'exposer les métriques sur le port {port} : {e}")
+
+    async def cog_unload(self):
+        metrics.GATEWAY_LATENCY.callback = None
+        metrics.CACHE_LOOKUPS.callback = None
+        # discord.py n'a pas d'API pour retirer ces hooks ; après un rechargement ils
+        # pointeraient sinon vers l'ancienne instance du cog
+        if self.bot._before_invoke == self._before_prefix_command:
+            self.bot._before_invoke = None
+        if self.bot._after_invoke == self._after_prefix_command:
+            self.bot._after_invoke = None
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        if self._runner is not None:
+            await metrics.stop_server(self._runner)
+
+    # --- Sources lues à chaque export ---
+    def _gateway_latencies(self):
+        if isinstance(self.bot, commands.AutoShardedBot):
+            latencies = self.bot.latencies
+        else:
+            latencies = [(self.bot.shard_id or 0, self.bot.latency)]
+        return {(str(shard_id),): latency for shard_id, latency in latencies if math.isfinite(latency)}
+
+    @staticmethod
+    def _cache_lookups():
+        values = {}
+        for name, cache in (("rows", archived_rows), ("embeds", archived_embeds)):
+            values[(name, "hit")] = cache.hits
+            values[(name, "miss")] = cache.misses
+        return values
+
+    async def _measure_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            metrics.LOOP_LAG.observe(max(loop.time() - start - LOOP_LAG_INTERVAL, 0.0))
+
+    # --- Commandes ---
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction, command):
+        started = interaction.extras.get("metrics_started")
+        if started is not None:
+            metrics.COMMAND_SECONDS.observe(time.perf_counter() - started, "slash", _command_name(command))
+
+    async def _before_prefix_command(self, ctx):
+        ctx.metrics_started = time.perf_counter()
+
+    async def _after_prefix_command(self, ctx):
+        name = _command_name(ctx.command)
+        metrics.COMMAND_SECONDS.observe(time.perf_counter() - ctx.metrics_started, "prefix", name)
+        if ctx.command_failed:
+            metrics.COMMAND_ERRORS.inc(1, "prefix", name)
+
+    # ----------- /botmetrics ------------
+    @app_commands.command(
+        name="botmetrics",
+        description="Affiche les métriques de ce processus du bot (admin uniquement)."
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def botmetrics(self, interaction: discord.Interaction):
+        embed = discord.Embed(title="📈 Métriques du bot", color=discord.Color.blue())
+        embed.add_field(name="Commandes (p50 / p99)", value=self._top(metrics.COMMAND_SECONDS, 8), inline=False)
+        embed.add_field(name="Base de données (temps total)", value=self._top(metrics.DB_SECONDS, 8), inline=False)
+
+        lag = metrics.LOOP_LAG.items()
+        if lag:
+            counts = lag[0][3]
+            lag_text = (f"p50 {metrics.LOOP_LAG.quantile(0.5, counts) * 1000:.1f} ms · "
+                        f"p99 {metrics.LOOP_LAG.quantile(0.99, counts) * 1000:.1f} ms")
+        else:
+            lag_text = "Aucune mesure."
+        embed.add_field(name="Retard de la boucle", value=lag_text, inline=True)
+
+        latencies = self._gateway_latencies()
+        gateway_text = " · ".join(f"shard {shard} : {latency * 1000:.0f} ms"
+                                  for (shard,), latency in sorted(latencies.items())) or "Non connecté."
+        embed.add_field(name="Gateway", value=gateway_text[:1024], inline=True)
+        embed.add_field(
+            name="Scans",
+            value=(f"{metrics.SCAN_MESSAGES.value():.0f} messages parcourus · "
+                   f"{metrics.SCAN_ARCHIVED.value():.0f} archivés"),
+            inline=False
+        )
+        embed.set_footer(text=f"Processus {getattr(self.bot, 'worker_id', 0)} · détail complet sur /metrics")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @staticmethod
+    def _top(histogram, limit):
+        """Les séries les plus coûteuses (temps cumulé) d'un histogramme, une par ligne."""
+        series = sorted(histogram.items(), key=lambda item: item[2], reverse=True)[:limit]
+        if not series:
+            return "Aucune mesure."
+        errors = metrics.COMMAND_ERRORS if histogram is metrics.COMMAND_SECONDS else metrics.DB_ERRORS
+        lines = []
+        for labels, count, total, counts in series:
+            failed = errors.value(*labels)
+            lines.append(
+                f"`{labels[-1]}` — {count}× · {histogram.quantile(0.5, counts) * 1000:.1f} / "
+                f"{histogram.quantile(0.99, counts) * 1000:.1f} ms · {total:.2f}s"
+                + (f" · {failed} erreur(s)" if failed else "")
+            )
+        return "\n".join(lines)[:1024]
+
+
+async def setup(bot):
+    await bot.add_cog(Metrics(bot))
@@ -1,65 +1,74 @@
+import asyncio
+import time
+
 import discord
 from discord.ext import commands
 from discord.ui import Button, View
 from discord import app_commands
 import random
-import sqlite3
-from db import DB_PATH, add_points
+from db import (get_poll_candidate, get_other_authors, increment_times_polled,
+                create_poll, set_poll_message, get_open_polls, write_poll_votes, close_poll)
+from shards import owns_guild
+from images import local_image, attachment_url, image_file_kwargs
+
+POLL_FLUSH_INTERVAL = 5   # secondes maximum avant l'écriture des votes reçus
+POLL_FLUSH_VOTES = 200    # votes en attente déclenchant une écriture immédiate
 
 # ============================
 # VIEW POUR LE VOTE
 # ============================
 
 class VotingView(View):
-    def __init__(self, choices, true_author, message_url, content, image_url=None, reaction_emoji=None, timeout=30):
-        super().__init__(timeout=timeout)  # timeout personnalisable, défaut 30s
-        self.timeout_value = timeout
-        self.votes = {choice: 0 for choice in choices}
-        self.voted_users = {}  # user_id -> choix
+    """Boutons d'un sondage enregistré en base.
+
+    La vue est persistante (pas de timeout, custom_id `poll:<id>:<choix>`) : elle
+    est réattachée au message après un redémarrage, et c'est le cog qui clôt le
+    sondage à sa date de fin.
+    """
+
+    def __init__(self, cog, poll_id, server_id, channel_id, choices, true_author, message_url, content, ends_at, votes=None):
+        super().__init__(timeout=None)
+        self.cog = cog
+        self.poll_id = poll_id
+        self.server_id = server_id
+        self.channel_id = channel_id
+        self.choices = choices
+        self.voted_users = dict(votes or {})  # user_id -> index du choix
         self.true_author = true_author
         self.message_url = message_url
-        self.image_url = image_url
-        self.reaction_emoji = reaction_emoji
-        self.message: discord.Message | None = None
+        self.ends_at = ends_at
+        self.message_id: int | None = None
         self.content_preview = content[:1000] + ("..." if len(content) > 1000 else "")
 
-        for choice in choices:
-            button = Button(label=choice, style=discord.ButtonStyle.primary)
-            button.callback = self.make_callback(choice)
+        for index, choice in enumerate(choices):
+            button = Button(label=choice, style=discord.ButtonStyle.primary, custom_id=f"poll:{poll_id}:{index}")
+            button.callback = self.make_callback(index)
             self.add_item(button)
 
-    def make_callback(self, choice):
+    def make_callback(self, index):
         async def callback(interaction: discord.Interaction):
+            if time.time() >= self.ends_at:
+                await interaction.response.send_message("⌛ Ce sondage est terminé.", ephemeral=True)
+                return
             if interaction.user.id in self.voted_users:
                 await interaction.response.send_message("❌ Tu as déjà voté.", ephemeral=True)
                 return
-            self.votes[choice] += 1
-            self.voted_users[interaction.user.id] = choice
-            await interaction.response.send_message(f"✅ Vote reçu pour **{choice}**.", ephemeral=True)
+            self.voted_users[interaction.user.id] = index
+            self.cog.queue_vote(self.poll_id, interaction.user.id, index)
+            await interaction.response.send_message(f"✅ Vote reçu pour **{self.choices[index]}**.", ephemeral=True)
         return callback
 
-    async def on_timeout(self):
-        if self.message is None:
-            return  # sécurité
-
-        # Résultats des votes
-        results_text = "\n".join(f"**{choice}** : {count} vote(s)" for choice, count in self.votes.items())
-        winners_ids = [uid for uid, vote in self.voted_users.items() if vote == self.true_author]
-
-        total_votes = len(self.voted_users)
-
-        # Attribution des points
-        if total_votes >= 2 and winners_ids:
-            for uid in winners_ids:
-                try:
-                    add_points(uid, 1)
-                except Exception as e:
-																					 
-                    print(f"[polls] Impossible d'ajouter des points pour {uid}: {e}")
-			 
-																								  
-
-
+    def results(self):
+        """Retourne (texte des résultats, gagnants, nombre de votes)."""
+        counts = [0] * len(self.choices)
+        for index in self.voted_users.values():
+            counts[index] += 1
+        results_text = "\n".join(f"**{choice}** : {count} vote(s)" for choice, count in zip(self.choices, counts))
+        true_index = self.choices.index(self.true_author)
+        winners_ids = [uid for uid, index in self.voted_users.items() if index == true_index]
+        return results_text, winners_ids, len(self.voted_users)
+
+    def final_message(self, results_text, winners_ids):
         # Félicitations
         winners_message = (
             "🎉 Félicitations aux bons devineurs : " + " ".join(f"<@{uid}>" for uid in winners_ids)
@@ -71,7 +80,7 @@ class VotingView(View):
             item.disabled = True
 
         # Message final
-        final_msg = (
+        return (
             "📊 **Résultats du sondage**\n\n"
             f"💬 **Message à deviner :**\n> {self.content_preview}\n\n"
             f"{results_text}\n\n"
@@ -80,8 +89,6 @@ class VotingView(View):
             f"{winners_message}"
         )
 
-        await self.message.edit(content=final_msg, embed=None, view=self)
-
 # ============================
 # COMMANDE POUR LES POLLS
 # ============================
@@ -89,47 +96,152 @@ class VotingView(View):
 class Polls(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.views = {}           # poll_id -> VotingView des sondages ouverts
+        self.pending_votes = []   # [(poll_id, user_id, choix)] pas encore écrits
+        self._closers = {}        # poll_id -> tâche qui clôt le sondage à sa fin
+        self._flush_now = asyncio.Event()   # trop de votes en attente : le flusher écrit sans attendre
+        self._flush_lock = asyncio.Lock()
+        self._flusher = None
+        self._restored = False
+
+    async def cog_load(self):
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def cog_unload(self):
+        # Arrêt du bot : les sondages restent ouverts en base et reprendront
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        for task in self._closers.values():
+            task.cancel()
+        await self.flush_votes()
+
+    async def suspend(self):
+        """Détache les sondages ouverts et écrit leurs votes, avant une restauration de la base.
+
+        Les sondages de la base restaurée sont repris par reattach_open_polls().
+        """
+        for view in self.views.values():
+            view.stop()
+        for task in self._closers.values():
+            task.cancel()
+        self.views.clear()
+        self._closers.clear()
+        await self.flush_votes()
+
+    # --- Votes ---
+    def queue_vote(self, poll_id, user_id, index):
+        self.pending_votes.append((poll_id, user_id, index))
+        if len(self.pending_votes) >= POLL_FLUSH_VOTES:
+            self._flush_now.set()
+
+    async def flush_votes(self):
+        # Une écriture à la fois : au retour, aucun vote antérieur n'est en vol
+        # (suspend() s'y fie avant une restauration)
+        async with self._flush_lock:
+            votes, self.pending_votes = self.pending_votes, []
+            if not votes:
+                return
+            try:
+                await write_poll_votes(votes)
+            except Exception as e:
+                print(f"[polls] ⚠️ Impossible d'écrire {len(votes)} vote(s): {e}")
+                self.pending_votes = votes + self.pending_votes
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=POLL_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush_votes()
+
+    # --- Cycle de vie des sondages ---
+    def _track(self, view):
+        self.views[view.poll_id] = view
+        self._closers[view.poll_id] = asyncio.create_task(self._close_at_end(view))
+
+    async def _close_at_end(self, view):
+        await asyncio.sleep(max(0.0, view.ends_at - time.time()))
+        try:
+            await self.close(view)
+        except Exception as e:
+            print(f"[polls] ⚠️ Erreur à la clôture du sondage #{view.poll_id}: {e}")
+
+    async def close(self, view):
+        """Clôt un sondage : votes, statut et points en une transaction, puis message final."""
+        self.views.pop(view.poll_id, None)
+        self._closers.pop(view.poll_id, None)
+        view.stop()
+
+        votes = [vote for vote in self.pending_votes if vote[0] == view.poll_id]
+        self.pending_votes = [vote for vote in self.pending_votes if vote[0] != view.poll_id]
+
+        results_text, winners_ids, total_votes = view.results()
+        # Attribution des points (au moins deux votants)
+        scored = winners_ids if total_votes >= 2 else []
+        if not await close_poll(view.poll_id, view.server_id, votes, scored, 1):
+            return  # déjà clos ailleurs
+
+        if view.message_id is None:
+            return
+        final_msg = view.final_message(results_text, winners_ids)
+        message = self.bot.get_partial_messageable(view.channel_id, guild_id=view.server_id).get_partial_message(view.message_id)
+        try:
+            # attachments=[] retire aussi l'image locale jointe à l'embed
+            await message.edit(content=final_msg, embed=None, attachments=[], view=view)
+        except discord.HTTPException as e:
+            print(f"[polls] Impossible d'afficher les résultats du sondage #{view.poll_id}: {e}")
+
+    # Les vues sont réattachées une fois connecté : les sondages dont la fin est
+    # passée pendant l'arrêt sont clos tout de suite
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self._restored:
+            return
+        self._restored = True
+        restored = await self.reattach_open_polls()
+        if restored:
+            print(f"[polls] ♻️ {restored} sondage(s) ouvert(s) repris.")
+
+    async def reattach_open_polls(self) -> int:
+        """Réattache les sondages ouverts en base (démarrage, restauration). Retourne leur nombre."""
+        restored = 0
+        for row, votes in await get_open_polls():
+            poll_id, server_id, channel_id, message_id, true_author, choices, message_url, content, ends_at = row
+            if not owns_guild(self.bot, server_id):
+                continue
+            view = VotingView(self, poll_id, server_id, channel_id, choices, true_author,
+                              message_url, content, ends_at, votes)
+            view.message_id = message_id
+            if message_id is not None:
+                self.bot.add_view(view, message_id=message_id)
+            self._track(view)
+            restored += 1
+        return restored
 
     @app_commands.command(
         name="random_message_poll",
         description="Affiche un message archivé anonymisé avec vote pour l’auteur."
     )
+    @app_commands.guild_only()
     async def random_message_poll(self, interaction: discord.Interaction, timeout: int = 30):
-														  
-																		  
-
         if timeout < 15 or timeout > 1800:
             await interaction.response.send_message("⚠️ Le temps doit être entre 15 et 1800 secondes.", ephemeral=True)
             return
 
-        # Connexion à la base
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            'SELECT message_id, content, author_name, message_url, image_url, reaction_emoji '
-            'FROM archived_messages '
-            'ORDER BY times_polled ASC, RANDOM() LIMIT 1'
-        )
-        row = cursor.fetchone()
+        row = await get_poll_candidate(interaction.guild_id)
         if not row:
             await interaction.response.send_message("⚠️ Aucun message archivé pour le moment.")
-            conn.close()
             return
 
-        message_id, content, true_author, message_url, image_url, reaction_emoji = row
+        message_id, content, true_author, message_url, image_url, reaction_emoji, image_file = row
 
-        cursor.execute(
-            'SELECT DISTINCT author_name FROM archived_messages WHERE author_name != ? ORDER BY RANDOM() LIMIT 3',
-            (true_author,)
-        )
-        other_authors = [r[0] for r in cursor.fetchall()]
+        other_authors = await get_other_authors(interaction.guild_id, true_author, limit=3)
 
         # Incrémenter le compteur
-        cursor.execute("UPDATE archived_messages SET times_polled = times_polled + 1 WHERE message_id = ?", (message_id,))
-        conn.commit()
-
-        conn.close()
+        await increment_times_polled(interaction.guild_id, message_id)
 
         choices = [true_author] + other_authors
         random.shuffle(choices)
@@ -140,7 +252,6 @@ class Polls(commands.Cog):
 
         # Si c’est un tweet → on affiche le lien avant le sondage
         if content and ("twitter.com" in content or "x.com" in content):
-														 
             await interaction.response.send_message(content)
         else:
             await interaction.response.defer(ephemeral=True)
@@ -151,21 +262,30 @@ class Polls(commands.Cog):
             description=content_anonymized + timeout_text,
             color=discord.Color.orange()
         )
-        if image_url:
+        local_path = local_image(image_file)
+        if local_path:
+            embed.set_image(url=attachment_url(local_path))
+        elif image_url:
             embed.set_image(url=image_url)
         if reaction_emoji:
             embed.add_field(name="Réaction", value=reaction_emoji, inline=True)
 
+        # Sondage enregistré avant l'envoi : les boutons portent son id
+        ends_at = time.time() + timeout
+        poll_id = await create_poll(
+            interaction.guild_id, interaction.channel_id, message_id, true_author, choices,
+            message_url, content, ends_at
+        )
         voting_view = VotingView(
-            choices, true_author, message_url, content,
-            image_url=image_url, reaction_emoji=reaction_emoji, timeout=timeout
+            self, poll_id, interaction.guild_id, interaction.channel_id, choices, true_author,
+            message_url, content, ends_at
         )
+        self._track(voting_view)
 
-																				
-														
-
-        poll_message = await interaction.channel.send(embed=embed, view=voting_view)
-        voting_view.message = poll_message
+        poll_message = await interaction.channel.send(embed=embed, view=voting_view,
+                                                    **image_file_kwargs(embed, image_file))
+        voting_view.message_id = poll_message.id
+        await set_poll_message(poll_id, poll_message.id)
 
         # Supprimer le "Splepbot is thinking..."
         try:
@@ -2,13 +2,53 @@ from discord.ext import commands
 import discord
 from discord import app_commands
 import asyncio
-from db import update_last_scanned_id, get_last_scanned_id, is_message_archived
+import time
+from collections import deque
+from db import get_scan_range, get_active_scan_jobs, ScanWriter
+from jobs import format_duration
 from cogs.archive import try_archive_message  # On réutilise la fonction commune
 
+# Nombre de salons scannés en parallèle par /scan_all. Chaque salon a son propre
+# bucket de rate limit côté Discord (route /channels/{id}/messages) et le client
+# HTTP de discord.py attend de lui-même quand un bucket ou la limite globale est
+# épuisé : il suffit donc de borner le nombre de scans simultanés.
+SCAN_ALL_CONCURRENCY = 4
+
+
+def estimated_backlog(channel, high_id):
+    """Estime le retard d'un salon à partir de l'écart entre snowflakes (≈ durée)."""
+    newest = channel.last_message_id
+    if newest is None:
+        return 0
+    return max(0, newest - (high_id or channel.id))
+
+
 class Scan(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def _scan_recent(self, channel, limit, scan_range):
+        """Archive les messages jamais vus les plus récents d'un salon. Retourne (scannés, archivés).
+
+        Si le salon a déjà été scanné, on repart du haut de sa plage (du plus
+        ancien au plus récent) ; sinon on prend les `limit` derniers messages.
+        """
+        if scan_range:
+            history = channel.history(limit=limit, after=discord.Object(id=scan_range[1]), oldest_first=True)
+        else:
+            history = channel.history(limit=limit)
+
+        scanned = archived = 0
+        async with ScanWriter(channel.id, guild_id=channel.guild.id) as writer:
+            async for message in history:
+                if await try_archive_message(self.bot, message, writer=writer):
+                    archived += 1
+                await writer.checkpoint(message.id)
+                scanned += 1
+            if not scan_range and (limit is None or scanned < limit):
+                await writer.mark_start_reached()
+        return scanned, archived
+
     # ----------- /scan ------------
     @app_commands.command(
         name="scan",
@@ -17,21 +57,8 @@ class Scan(commands.Cog):
     async def scan(self, interaction: discord.Interaction, channel: discord.TextChannel, limit_per_channel: int = 1000):
         await interaction.response.send_message(f"🔍 Scan du canal {channel.mention} en cours...", ephemeral=True)
 
-        total_archived = 0
-        last_id = get_last_scanned_id(channel.id)
-        history_args = {'limit': limit_per_channel}
-        if last_id:
-            history_args['after'] = discord.Object(id=last_id)
-
-        counter = 0
-        async for message in channel.history(**history_args):
-            if await try_archive_message(self.bot, message):
-                total_archived += 1
-            update_last_scanned_id(channel.id, message.id)
-
-            counter += 1
-            if counter % 500 == 0:
-                await asyncio.sleep(2)
+        scan_range = await get_scan_range(channel.id)
+        _, total_archived = await self._scan_recent(channel, limit_per_channel, scan_range)
 
         await interaction.followup.send(f"✅ Scan terminé sur {channel.mention}, {total_archived} messages archivés.")
 
@@ -43,96 +70,120 @@ class Scan(commands.Cog):
     async def scan_all(self, interaction: discord.Interaction, limit_per_channel: int = 1000):
         await interaction.response.send_message("🔍 Scan de tous les salons texte en cours...", ephemeral=True)
 
-        total_archived = 0
+        # Les salons les plus en retard passent en premier
+        queue = []
         for channel in interaction.guild.text_channels:
-            try:
-                last_id = get_last_scanned_id(channel.id)
-                history_args = {'limit': limit_per_channel}
-                if last_id:
-                    history_args['after'] = discord.Object(id=last_id)
-
-                async for message in channel.history(**history_args):
-                    if await try_archive_message(self.bot, message):
-                        total_archived += 1
-                    update_last_scanned_id(channel.id, message.id)
-
-                await interaction.channel.send(f"✅ Fin du scan de {channel.mention}.")
-
-            except discord.Forbidden:
-                await interaction.channel.send(f"⚠️ Pas d’accès à {channel.mention}, ignoré.")
-
-        await interaction.channel.send(f"🎉 Scan terminé. {total_archived} messages archivés au total.")
+            scan_range = await get_scan_range(channel.id)
+            high_id = scan_range[1] if scan_range else None
+            if high_id and channel.last_message_id and channel.last_message_id <= high_id:
+                continue  # rien de nouveau depuis le dernier scan
+            queue.append((estimated_backlog(channel, high_id), channel, scan_range))
+        queue.sort(key=lambda item: item[0], reverse=True)
+        queue = deque(queue)
+
+        total_scanned = 0
+        total_archived = 0
+        failed = []
+
+        async def worker():
+            nonlocal total_scanned, total_archived
+            while queue:
+                _, channel, scan_range = queue.popleft()
+                # Une erreur sur un salon ne doit ni arrêter les autres ni perdre le bilan
+                try:
+                    scanned, archived = await self._scan_recent(channel, limit_per_channel, scan_range)
+                    total_scanned += scanned
+                    total_archived += archived
+                    message = f"✅ Fin du scan de {channel.mention}."
+                except discord.Forbidden:
+                    failed.append(channel)
+                    message = f"⚠️ Pas d’accès à {channel.mention}, ignoré."
+                except Exception as e:
+                    print(f"[ERROR] Exception during scan of {channel}: {e}")
+                    failed.append(channel)
+                    message = f"⚠️ Erreur pendant le scan de {channel.mention} : {e}"
+                try:
+                    await interaction.channel.send(message)
+                except discord.HTTPException:
+                    pass
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(SCAN_ALL_CONCURRENCY)))
+        elapsed = time.monotonic() - started
+
+        report = (
+            f"🎉 Scan terminé. {total_archived} messages archivés au total "
+            f"({total_scanned} messages scannés en {elapsed:.0f}s, "
+            f"{total_scanned / elapsed if elapsed else 0:.1f} messages/s)."
+        )
+        if failed:
+            report += f"\n⚠️ {len(failed)} salon(s) en échec : {', '.join(c.mention for c in failed)}"
+        await interaction.channel.send(report[:2000])
 
     # ----------- /scan_full ------------
     @app_commands.command(
         name="scan_full",
-        description="Scanne un canal en entier (tous les messages)."
+        description="Scanne un canal en entier (tous les messages), en tâche de fond."
     )
     async def scan_full(self, interaction: discord.Interaction, channel: discord.TextChannel):
-        await interaction.response.send_message(f"📜 Début du scan complet de {channel.mention}...", ephemeral=True)
-
-        total_archived = 0
-        scanned = 0
-        empty_batches = 0
-
-        last_scanned_id = get_last_scanned_id(channel.id)
-        last_message = discord.Object(id=last_scanned_id) if last_scanned_id else None
-
-        try:
-            while True:
-                messages = [m async for m in channel.history(limit=100, before=last_message)]
-
-                print(f"[DEBUG] Fetched {len(messages)} messages "
-                    f"(before={last_message.id if last_message else None}, "
-                    f"scanned={scanned}, archived={total_archived})")
-
-                if not messages:
-                    empty_batches += 1
-                    print(f"[DEBUG] Batch vide #{empty_batches} (last_message={last_message.id if last_message else None})")
-
-                    if empty_batches >= 3:
-                        print("[DEBUG] 3 batchs vides consécutifs → fin du scan")
-                        break
-
-                    await asyncio.sleep(5)
-                    continue
-
-                empty_batches = 0
-
-                for message in messages:
-                    scanned += 1
-
-                    # Vérifie si une des réactions atteint le seuil
-                    if any(r.count >= getattr(self.bot, "reaction_threshold", 4) for r in message.reactions):
-                        if await try_archive_message(self.bot, message):
-                            total_archived += 1
-                            print(f"[ARCHIVE] ✅ Message {message.id} archivé (auteur={message.author})")
-
-                    last_message = message
-
-                    if scanned % 500 == 0:
-                        update_last_scanned_id(channel.id, last_message.id)
-
-                if scanned % 1000 == 0:
-                    await asyncio.sleep(3)
-                if scanned % 20000 == 0:
-                    await interaction.channel.send(
-                        f"🔍 Scan en cours dans {channel.mention} : "
-                        f"{scanned} messages scannés, {total_archived} archivés."
-                    )
-
-            if last_message:
-                update_last_scanned_id(channel.id, last_message.id)
+        jobs = getattr(self.bot, "scan_jobs", None)
+        if jobs is None:
+            await interaction.response.send_message("⚠️ Le gestionnaire de scans n'est pas démarré.", ephemeral=True)
+            return
+
+        job_id, created = await jobs.submit(channel, interaction.channel.id, interaction.user.id)
+        if created:
+            await interaction.response.send_message(
+                f"📜 Début du scan complet de {channel.mention} (tâche #{job_id}). "
+                f"Suivi avec `/scan_status`.", ephemeral=True
+            )
+        else:
+            await interaction.response.send_message(
+                f"⚠️ Un scan de {channel.mention} est déjà en cours (tâche #{job_id}).", ephemeral=True
+            )
 
-            await interaction.channel.send(
-                f"✅ Scan terminé dans {channel.mention} : {scanned} messages scannés, {total_archived} archivés."
+    # ----------- /scan_status ------------
+    @app_commands.command(
+        name="scan_status",
+        description="Affiche l'avancement des scans complets en cours."
+    )
+    @app_commands.guild_only()
+    async def scan_status(self, interaction: discord.Interaction):
+        rows = await get_active_scan_jobs(interaction.guild.id)
+        if not rows:
+            await interaction.response.send_message("💤 Aucun scan en cours.", ephemeral=True)
+            return
+
+        jobs = getattr(self.bot, "scan_jobs", None)
+        lines = []
+        for job_id, _, channel_id, _, _, status, _, _, scanned, archived, _ in rows:
+            progress = jobs.live.get(job_id) if jobs else None
+            if progress is None:
+                lines.append(f"**#{job_id}** <#{channel_id}> — en attente ({scanned} scannés, {archived} archivés)")
+                continue
+            eta = progress.eta()
+            lines.append(
+                f"**#{job_id}** <#{channel_id}> — {progress.percent():.1f} % · "
+                f"{progress.scanned} scannés, {progress.archived} archivés · "
+                f"ETA {format_duration(eta) if eta is not None else '?'}"
             )
 
-        except discord.Forbidden:
-            await interaction.followup.send("❌ Je n'ai pas accès à ce canal.", ephemeral=True)
-        except Exception as e:
-            print(f"[ERROR] Exception during scan_full: {e}")
-            await interaction.channel.send(f"⚠️ Erreur pendant le scan : {e}")
+        embed = discord.Embed(title="🔍 Scans en cours", description="\n".join(lines), color=discord.Color.blue())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    # ----------- /scan_cancel ------------
+    @app_commands.command(
+        name="scan_cancel",
+        description="Annule un scan complet en cours."
+    )
+    @app_commands.describe(job_id="Le numéro de la tâche (voir /scan_status)")
+    @app_commands.guild_only()
+    async def scan_cancel(self, interaction: discord.Interaction, job_id: int):
+        jobs = getattr(self.bot, "scan_jobs", None)
+        if jobs is None or not await jobs.cancel(job_id, interaction.guild_id):
+            await interaction.response.send_message("⚠️ Aucune tâche active avec ce numéro.", ephemeral=True)
+            return
+        await interaction.response.send_message(f"🛑 Tâche #{job_id} annulée.", ephemeral=True)
 
 async def setup(bot):
     await bot.add_cog(Scan(bot))
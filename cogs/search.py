@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+import discord
+from discord.ext import commands
+from discord import app_commands
+from db import search_archived_messages, snowflake_at
+
+RESULTS_PER_PAGE = 5
+
+def parse_day(value):
+    """Convertit une date AAAA-MM-JJ (UTC) en datetime, ou lève ValueError."""
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+class Search(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    # ----------- /search ------------
+    @app_commands.command(
+        name="search",
+        description="Recherche dans les messages archivés."
+    )
+    @app_commands.describe(
+        query="Mots à chercher (tous doivent apparaître, `mot*` pour un préfixe)",
+        author="Nom de l'auteur",
+        emoji="Emoji de la réaction qui a fait archiver le message",
+        after="Messages envoyés à partir de cette date (AAAA-MM-JJ)",
+        before="Messages envoyés jusqu'à cette date incluse (AAAA-MM-JJ)",
+        page="Numéro de la page de résultats"
+    )
+    @app_commands.guild_only()
+    async def search(self, interaction: discord.Interaction, query: str,
+                     author: str = None, emoji: str = None, after: str = None, before: str = None,
+                     page: app_commands.Range[int, 1] = 1):
+        try:
+            after_id = snowflake_at(parse_day(after).timestamp()) if after else None
+            before_id = snowflake_at((parse_day(before) + timedelta(days=1)).timestamp()) if before else None
+        except ValueError:
+            await interaction.response.send_message("⚠️ Date invalide, utilise le format AAAA-MM-JJ.", ephemeral=True)
+            return
+
+        rows, has_next = await search_archived_messages(
+            interaction.guild_id, query, author=author, emoji=emoji, after_id=after_id, before_id=before_id,
+            limit=RESULTS_PER_PAGE, offset=(page - 1) * RESULTS_PER_PAGE
+        )
+        if not rows:
+            text = "⚠️ Aucun message archivé ne correspond." if page == 1 else "⚠️ Plus aucun résultat sur cette page."
+            await interaction.response.send_message(text, ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title=f"🔎 Résultats pour « {query[:100]} »",
+            color=discord.Color.blue()
+        )
+        for message_id, snippet, author_name, message_url, reaction_emoji, reactions in rows:
+            sent_at = discord.utils.snowflake_time(message_id)
+            embed.add_field(
+                name=f"{author_name} — {discord.utils.format_dt(sent_at, 'd')}",
+                value=(f"{snippet[:900]}\n{reaction_emoji or ''} {reactions or 0} · "
+                       f"[Aller au message]({message_url}) · ID {message_id}"),
+                inline=False
+            )
+        embed.set_footer(text=f"Page {page}" + (f" · /search page:{page + 1} pour la suite" if has_next else ""))
+        await interaction.response.send_message(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(Search(bot))
@@ -10,41 +10,42 @@ class SelfReactAlert(commands.Cog):
         self.last_triggered = {}
 
     @commands.Cog.listener()
-    async def on_reaction_add(self, reaction, user):
-        # Ignorer les bots
-        if user.bot:
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        # Ignorer les bots et les messages privés
+        if payload.guild_id is None:
+            return
+        if payload.member is not None and payload.member.bot:
             return
-
-        message = reaction.message
 
         # Vérifie si l'utilisateur réagit à son propre message
-        if message.author.id != user.id:
+        if payload.message_author_id != payload.user_id:
             return
 
         # Cooldown de 60 secondes par utilisateur
         now = time.time()
-        last_time = self.last_triggered.get(user.id, 0)
+        last_time = self.last_triggered.get(payload.user_id, 0)
         if now - last_time < 60:
             return  # Trop tôt, on ignore
 
         # Met à jour le dernier déclenchement
-        self.last_triggered[user.id] = now
+        self.last_triggered[payload.user_id] = now
+        mention = f"<@{payload.user_id}>"
 
         # Liste de messages rigolos
         funny_messages = [
-            f"😏 {user.mention} se suce allègrement, on a l'habitude...",
-            f"😂 {user.mention} est prêt à tout pour stonks ses stats, sachez-le.",
-            f"🤡 {user.mention}, poti clown on l'a vu ta react tu croyais quoi ?",
-            f"{user.mention} est prêt à tout pour rattraper Olivier (sauf si c'est Olivier qui s'est auto-react j'ai la flemme de coder le bot pour faire la différence bref).",
-            f"📸 {user.mention} attrapé en 4k pour self-react",
-            f"🚨 {user.mention}, ceci est une descente de police haha j'ai dead ça la team ou quoi",
+            f"😏 {mention} se suce allègrement, on a l'habitude...",
+            f"😂 {mention} est prêt à tout pour stonks ses stats, sachez-le.",
+            f"🤡 {mention}, poti clown on l'a vu ta react tu croyais quoi ?",
+            f"{mention} est prêt à tout pour rattraper Olivier (sauf si c'est Olivier qui s'est auto-react j'ai la flemme de coder le bot pour faire la différence bref).",
+            f"📸 {mention} attrapé en 4k pour self-react",
+            f"🚨 {mention}, ceci est une descente de police haha j'ai dead ça la team ou quoi",
         ]
 
         response = random.choice(funny_messages)
 
         # Envoi du message (silencieusement si pas les permissions)
         try:
-            await message.channel.send(response)
+            await self.bot.get_partial_messageable(payload.channel_id, guild_id=payload.guild_id).send(response)
         except discord.Forbidden:
             pass
 
@@ -0,0 +1,134 @@
+import asyncio
+import math
+import time
+from collections import Counter
+
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+import db
+from shards import shard_for_guild
+
+SHARD_REPORT_INTERVAL = 60  # secondes entre deux relevés
+
+class Shards(commands.Cog):
+    """Latence et débit d'événements de chaque shard de ce processus.
+
+    Les événements de serveur (messages, réactions, interactions) sont comptés
+    par shard ; le total de la gateway l'est pour le processus. Un relevé est
+    affiché dans les logs et enregistré en base à chaque intervalle, pour que
+    /shards montre aussi les shards des autres processus.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.events = Counter()    # shard_id -> événements de serveur depuis le dernier relevé
+        self.gateway_events = 0    # tous les événements reçus depuis le dernier relevé
+        self._since = time.monotonic()
+        self._task = None
+
+    # Les extensions sont chargées avant la connexion : les relevés démarrent au premier on_ready
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._report_loop())
+
+    async def cog_unload(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _shard_of(self, guild_id):
+        if guild_id is None or not self.bot.shard_count:
+            return self.bot.shard_id or 0
+        return shard_for_guild(guild_id, self.bot.shard_count)
+
+    def _latencies(self):
+        if isinstance(self.bot, commands.AutoShardedBot):
+            return self.bot.latencies
+        return [(self.bot.shard_id or 0, self.bot.latency)]
+
+    # --- Compteurs ---
+    @commands.Cog.listener()
+    async def on_socket_event_type(self, event_type):
+        self.gateway_events += 1
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        self.events[self._shard_of(message.guild.id if message.guild else None)] += 1
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        self.events[self._shard_of(payload.guild_id)] += 1
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        self.events[self._shard_of(payload.guild_id)] += 1
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction):
+        self.events[self._shard_of(interaction.guild_id)] += 1
+
+    # --- Relevés ---
+    def snapshot(self):
+        """Retourne ([(shard_id, serveurs, latence ms, événements/s)], événements gateway/s) et remet à zéro."""
+        elapsed = max(time.monotonic() - self._since, 1e-9)
+        guilds = Counter(self._shard_of(guild.id) for guild in self.bot.guilds)
+        rows = []
+        for shard_id, latency in self._latencies():
+            latency_ms = latency * 1000 if math.isfinite(latency) else None
+            rows.append((shard_id, guilds[shard_id], latency_ms, self.events[shard_id] / elapsed))
+        gateway_rate = self.gateway_events / elapsed
+
+        self.events.clear()
+        self.gateway_events = 0
+        self._since = time.monotonic()
+        return rows, gateway_rate
+
+    async def report(self):
+        rows, gateway_rate = self.snapshot()
+        await db.write_shard_stats(getattr(self.bot, "worker_id", 0), rows)
+        details = " | ".join(
+            f"shard {shard_id} : {guilds} serveurs, "
+            f"{'?' if latency_ms is None else f'{latency_ms:.0f}'} ms, {rate:.1f} évts/s"
+            for shard_id, guilds, latency_ms, rate in rows
+        )
+        print(f"[SHARDS] 📡 Processus {getattr(self.bot, 'worker_id', 0)} : {gateway_rate:.1f} évts gateway/s | {details}")
+
+    async def _report_loop(self):
+        while True:
+            try:
+                await self.report()
+            except Exception as e:
+                print(f"[SHARDS] ⚠️ Relevé impossible : {e}")
+            await asyncio.sleep(SHARD_REPORT_INTERVAL)
+
+    # ----------- /shards ------------
+    @app_commands.command(
+        name="shards",
+        description="Affiche la latence et l'activité de chaque shard du bot."
+    )
+    async def shards(self, interaction: discord.Interaction):
+        rows = await db.get_shard_stats()
+        if not rows:
+            await interaction.response.send_message("⚠️ Aucun relevé pour le moment.", ephemeral=True)
+            return
+
+        lines = []
+        for shard_id, worker_id, guilds, latency_ms, rate, age in rows:
+            stale = " ⚠️" if age is not None and age > 3 * SHARD_REPORT_INTERVAL else ""
+            latency = "?" if latency_ms is None else f"{latency_ms:.0f} ms"
+            lines.append(f"**Shard {shard_id}** (processus {worker_id}) — {guilds} serveurs, "
+                         f"{latency}, {rate:.1f} évts/s · il y a {age}s{stale}")
+
+        embed = discord.Embed(
+            title="📡 Shards",
+            description="\n".join(lines)[:4000],
+            color=discord.Color.blue()
+        )
+        here = interaction.guild.shard_id if interaction.guild else self._shard_of(None)
+        embed.set_footer(text=f"Ce serveur est sur le shard {here}")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(Shards(bot))
@@ -1,8 +1,8 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import sqlite3
-from db import DB_PATH
+from db import get_archive_stats, rebuild_archive_stats, get_id_filter_stats, get_image_stats
+from cache import archived_rows, archived_embeds
 
 class Stats(commands.Cog):
     def __init__(self, bot):
@@ -12,30 +12,9 @@ class Stats(commands.Cog):
         name="stats",
         description="Affiche des statistiques sur les messages archivés."
     )
+    @app_commands.guild_only()
     async def stats(self, interaction: discord.Interaction):
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # Nombre total de messages archivés
-        cursor.execute("SELECT COUNT(*) FROM archived_messages")
-        total_archived = cursor.fetchone()[0] or 0
-
-        # Top 10 auteurs
-        cursor.execute(
-            "SELECT author_name, COUNT(*) as count FROM archived_messages "
-            "GROUP BY author_name ORDER BY count DESC LIMIT 10"
-        )
-        top_authors = cursor.fetchall()
-
-        # Top 10 emojis
-        cursor.execute(
-            "SELECT reaction_emoji, COUNT(*) as count FROM archived_messages "
-            "WHERE reaction_emoji IS NOT NULL "
-            "GROUP BY reaction_emoji ORDER BY count DESC LIMIT 10"
-        )
-        top_emojis = cursor.fetchall()
-
-        conn.close()
+        total_archived, top_authors, top_emojis = await get_archive_stats(interaction.guild_id, limit=10)
 
         # Embed
         embed = discord.Embed(
@@ -60,5 +39,50 @@ class Stats(commands.Cog):
 
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command(
+        name="stats_rebuild",
+        description="Recalcule les compteurs des statistiques (admin uniquement)."
+    )
+    @app_commands.guild_only()
+    @app_commands.checks.has_permissions(administrator=True)
+    async def stats_rebuild(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        await rebuild_archive_stats(interaction.guild_id)
+        await interaction.followup.send("♻️ Statistiques recalculées.", ephemeral=True)
+
+    @app_commands.command(
+        name="cache_stats",
+        description="Affiche l'efficacité des caches de messages archivés (admin uniquement)."
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def cache_stats(self, interaction: discord.Interaction):
+        embed = discord.Embed(title="🧠 Caches des messages archivés", color=discord.Color.blue())
+        for name, cache in (("Lignes", archived_rows), ("Embeds", archived_embeds)):
+            stats = cache.stats()
+            embed.add_field(
+                name=name,
+                value=(f"{stats['size']} / {stats['max_size']} entrées (TTL {cache.ttl:.0f}s)\n"
+                       f"{stats['hits']} hits · {stats['misses']} misses · {stats['hit_rate']:.0%}\n"
+                       f"{stats['evictions']} évictions"),
+                inline=True
+            )
+        id_filter = get_id_filter_stats()
+        if id_filter is not None:
+            embed.add_field(
+                name="Index des IDs archivés",
+                value=(f"{id_filter['ids']} / {id_filter['capacity']} IDs\n"
+                       f"{id_filter['memory_bytes'] / 1024 / 1024:.1f} Mo · "
+                       f"faux positifs ~{id_filter['error_rate']:.2%}"),
+                inline=True
+            )
+        images = await get_image_stats()
+        archiver = getattr(self.bot, "image_archiver", None)
+        value = (f"{images.get('stored', 0)} copiées · {images.get('pending', 0)} en attente · "
+                 f"{images.get('failed', 0)} en échec")
+        if archiver is not None:
+            value += f"\n{archiver.store_bytes / 1024 / 1024:.1f} / {archiver.store_max_bytes / 1024 / 1024:.0f} Mo"
+        embed.add_field(name="Images locales", value=value, inline=True)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(Stats(bot))
@@ -0,0 +1,83 @@
+import gzip
+import os
+
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+from archive_io import EXPORT_DIR, export_archive, export_path, import_archive
+
+
+class Transfer(commands.Cog):
+    """Export et import de l'archive d'un serveur (voir archive_io.py)."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    # ----------- /export ------------
+    @app_commands.command(
+        name="export",
+        description="Exporte l'archive de ce serveur en NDJSON compressé (admin uniquement)."
+    )
+    @app_commands.guild_only()
+    @app_commands.checks.has_permissions(administrator=True)
+    async def export(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        path = export_path(interaction.guild_id)
+        report = await export_archive(path, interaction.guild_id)
+        text = f"📤 Export terminé : {report.summary()}\n{report.details()}"
+
+        if report.bytes <= interaction.guild.filesize_limit:
+            await interaction.followup.send(text, file=discord.File(path), ephemeral=True)
+            os.remove(path)
+        else:
+            # Trop lourd pour Discord : le fichier reste sur le serveur du bot
+            await interaction.followup.send(f"{text}\nFichier trop lourd pour Discord, gardé dans `{path}`.",
+                                            ephemeral=True)
+
+    # ----------- /import ------------
+    @app_commands.command(
+        name="import",
+        description="Importe dans ce serveur un fichier produit par /export (admin uniquement)."
+    )
+    @app_commands.describe(
+        fichier="Fichier .ndjson.gz produit par /export",
+        serveur_source="ID du serveur d'origine, pour un export de tous les serveurs"
+    )
+    @app_commands.guild_only()
+    @app_commands.checks.has_permissions(administrator=True)
+    async def import_(self, interaction: discord.Interaction, fichier: discord.Attachment,
+                      serveur_source: str = None):
+        try:
+            source_guild_id = int(serveur_source) if serveur_source else None
+        except ValueError:
+            await interaction.response.send_message("⚠️ ID de serveur invalide, merci de fournir un nombre.",
+                                                    ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, f"import-{fichier.id}.ndjson.gz")
+        try:
+            await fichier.save(path)
+            # Les lignes du serveur d'origine sont rattachées à ce serveur ; relancer
+            # /import avec le même fichier reprend un import interrompu
+            report = await import_archive(path, interaction.guild_id, source_guild_id)
+        except (ValueError, EOFError, gzip.BadGzipFile) as e:
+            await interaction.followup.send(f"⚠️ Import impossible : {e}", ephemeral=True)
+            return
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+        if report.already_imported:
+            await interaction.followup.send("ℹ️ Ce fichier a déjà été importé dans ce serveur.", ephemeral=True)
+            return
+        await interaction.followup.send(
+            f"📥 Import terminé : {report.summary()}\n{report.details()}\n"
+            f"{report.imported} lignes écrites, {report.skipped} ignorées (autre serveur, plages scannées d'un autre serveur ou déjà importées).",
+            ephemeral=True
+        )
+
+
+async def setup(bot):
+    await bot.add_cog(Transfer(bot))
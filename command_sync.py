@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+
+import discord
+
+# ============================
+# SYNCHRONISATION DES SLASH COMMANDS
+# ============================
+
+# Empreinte de l'arbre au dernier sync réussi, par application et par cible
+# ("global" ou "guild:<id>"). Supprimer le fichier force le prochain sync.
+SYNC_STATE_PATH = "data/command_sync.json"
+# Serveur de développement : les commandes y sont synchronisées (effet immédiat)
+# au lieu d'être publiées globalement.
+DEV_GUILD_ID = int(os.getenv("BOT_DEV_GUILD_ID", "0")) or None
+
+
+def tree_fingerprint(tree, guild=None) -> str:
+    """Hash des commandes telles qu'elles seraient envoyées à Discord."""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda data: (data.get("type", 1), data["name"])
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def _load_state():
+    try:
+        with open(SYNC_STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_state(state):
+    os.makedirs(os.path.dirname(SYNC_STATE_PATH) or ".", exist_ok=True)
+    tmp_path = SYNC_STATE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, SYNC_STATE_PATH)
+
+
+async def sync_commands(bot, dev_guild_id=DEV_GUILD_ID) -> bool:
+    """Synchronise l'arbre si son empreinte a changé depuis le dernier sync.
+
+    Retourne True si un appel de sync a été fait.
+    """
+    guild = discord.Object(id=dev_guild_id) if dev_guild_id else None
+    if guild is not None:
+        bot.tree.copy_global_to(guild=guild)
+    target = f"guild:{dev_guild_id}" if guild is not None else "global"
+
+    fingerprint = tree_fingerprint(bot.tree, guild=guild)
+    state = _load_state()
+    synced = state.setdefault(str(bot.application_id), {})
+    if synced.get(target) == fingerprint:
+        print(f"🌐 Slash commands inchangées ({target}), pas de synchronisation.")
+        return False
+
+    commands = await bot.tree.sync(guild=guild)
+    synced[target] = fingerprint
+    _save_state(state)
+    print(f"🌐 {len(commands)} slash commands synchronisées ({target}).")
+    return True
@@ -1,15 +1,103 @@
+import asyncio
+import functools
+import json
+import pathlib
+import random
+import re
 import sqlite3
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import cache
+import metrics
+from membership import IdFilter
+from ranking import ScoreRanking
+from sampler import PollSampler
 
 DB_PATH = "data/messages.db"
 
 # ============================
-# INITIALISATION DES BASES
+# CONNEXION PARTAGÉE
 # ============================
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
-    # Table des messages archivés
+# Une seule connexion SQLite, ouverte une fois et possédée par un thread dédié.
+# Toutes les requêtes y sont sérialisées : la boucle d'événements de discord.py
+# n'attend jamais le disque, et sqlite3 réutilise ses requêtes préparées
+# (cache de statements) d'un appel à l'autre.
+#
+# Avec launcher.py, plusieurs processus partagent le même fichier : le mode WAL
+# permet des lectures concurrentes, et busy_timeout fait attendre un écrivain
+# plutôt qu'échouer. Chaque serveur n'est écrit que par le processus qui
+# possède son shard, ce qui garde exacts les index en mémoire par serveur.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+_conn = None
+
+# Réglages appliqués à chaque ouverture de connexion (ils ne sont pas persistants)
+PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",     # suffisant et sûr en mode WAL
+    "PRAGMA cache_size = -32000",      # ~32 Mo de cache de pages
+    "PRAGMA mmap_size = 268435456",    # 256 Mo lus via mmap
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+
+def _get_conn():
+    """Retourne la connexion partagée (à n'appeler que depuis le thread DB)."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+        for pragma in PRAGMAS:
+            _conn.execute(pragma)
+    return _conn
+
+
+def _threaded(func):
+    """Transforme une fonction synchrone en coroutine exécutée sur le thread DB."""
+    name = func.__name__.lstrip("_").removesuffix("_db")
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            metrics.DB_ERRORS.inc(1, name)
+            raise
+        finally:
+            metrics.DB_SECONDS.observe(time.perf_counter() - start, name)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(timed, *args, **kwargs))
+    return wrapper
+
+
+@_threaded
+def _close_conn():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+    _reset_indexes()
+
+
+async def close():
+    """Vide les écritures en attente puis ferme la connexion partagée."""
+    for writer in list(_writers):
+        await writer.flush()
+    await _close_conn()
+
+# ============================
+# MIGRATIONS DU SCHÉMA
+# ============================
+
+# Chaque migration reçoit un curseur et fait évoluer le schéma d'une version.
+# Les versions appliquées sont notées dans la table schema_version.
+
+def _migrate_initial(cursor):
+    # Schéma historique, tel qu'il existait avant les migrations
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS archived_messages (
             id INTEGER PRIMARY KEY,
@@ -20,152 +108,1655 @@ def init_db():
             server_id INTEGER,
             author_name TEXT,
             message_url TEXT,
-            image_url TEXT, 
+            image_url TEXT,
             reaction_emoji TEXT,
             archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             times_polled INTERGER DEFAULT 0
                     )''')
 
-    # Table de suivi du scan
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS scan_progress (
             channel_id INTEGER PRIMARY KEY,
             last_message_id INTEGER
                     )''')
-    
-    # Table des scores pour les sondages
+
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS poll_scores (
             user_id INTEGER PRIMARY KEY,
             points  INTEGER NOT NULL DEFAULT 0
                     )""")
-    
+
+
+def _migrate_wal(cursor):
+    # Le mode WAL est persistant : les lectures ne bloquent plus le scan
+    cursor.execute("PRAGMA journal_mode = WAL")
+
+
+def _migrate_times_polled_type(cursor):
+    # Corrige le type "INTERGER" de times_polled (reconstruction de la table)
+    cursor.execute('''
+        CREATE TABLE archived_messages_new (
+            id INTEGER PRIMARY KEY,
+            message_id INTEGER UNIQUE,
+            content TEXT,
+            reactions INTEGER,
+            channel_id INTEGER,
+            server_id INTEGER,
+            author_name TEXT,
+            message_url TEXT,
+            image_url TEXT,
+            reaction_emoji TEXT,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            times_polled INTEGER NOT NULL DEFAULT 0
+                    )''')
+    cursor.execute('''
+        INSERT INTO archived_messages_new
+            (id, message_id, content, reactions, channel_id, server_id, author_name,
+             message_url, image_url, reaction_emoji, archived_at, times_polled)
+        SELECT id, message_id, content, reactions, channel_id, server_id, author_name,
+               message_url, image_url, reaction_emoji, archived_at, COALESCE(times_polled, 0)
+        FROM archived_messages''')
+    cursor.execute("DROP TABLE archived_messages")
+    cursor.execute("ALTER TABLE archived_messages_new RENAME TO archived_messages")
+
+
+def _migrate_hot_indexes(cursor):
+    # Index couvrants pour les sondages (times_polled, auteurs) et /stats (auteurs, emojis)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_times_polled ON archived_messages (times_polled)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_author ON archived_messages (author_name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_emoji ON archived_messages (reaction_emoji)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_server ON archived_messages (server_id)")
+
+
+def _migrate_archive_slots(cursor):
+    # Index dense 0..n-1 des messages archivés, pour un tirage uniforme en O(log n).
+    # Une suppression déplace le dernier emplacement dans le trou : pas de lacune.
+    cursor.execute("""
+        CREATE TABLE archive_slots (
+            slot INTEGER PRIMARY KEY,
+            message_id INTEGER NOT NULL
+                    )""")
+    cursor.execute("CREATE INDEX idx_archive_slots_message ON archive_slots (message_id)")
+    cursor.execute("""
+        INSERT INTO archive_slots (slot, message_id)
+        SELECT ROW_NUMBER() OVER (ORDER BY id) - 1, message_id FROM archived_messages""")
+    cursor.execute("""
+        CREATE TRIGGER archive_slots_insert AFTER INSERT ON archived_messages BEGIN
+            INSERT INTO archive_slots (slot, message_id)
+            VALUES ((SELECT COALESCE(MAX(slot) + 1, 0) FROM archive_slots), NEW.message_id);
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_slots_delete AFTER DELETE ON archived_messages BEGIN
+            UPDATE archive_slots
+            SET message_id = (SELECT message_id FROM archive_slots ORDER BY slot DESC LIMIT 1)
+            WHERE message_id = OLD.message_id;
+            DELETE FROM archive_slots WHERE slot = (SELECT MAX(slot) FROM archive_slots);
+        END""")
+
+
+def _migrate_scan_jobs(cursor):
+    # Tâches de scan de fond (/scan_full), reprises après un redémarrage
+    cursor.execute("""
+        CREATE TABLE scan_jobs (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER,
+            channel_id INTEGER NOT NULL,
+            notify_channel_id INTEGER,
+            requested_by INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            cursor_id INTEGER,
+            start_cursor_id INTEGER,
+            scanned INTEGER NOT NULL DEFAULT 0,
+            archived INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )""")
+    cursor.execute("CREATE INDEX idx_scan_jobs_status ON scan_jobs (status)")
+
+
+def _migrate_scan_ranges(cursor):
+    # Plage scannée [low_id, high_id] par salon au lieu d'un curseur unique
+    # partagé par /scan (vers l'avant) et /scan_full (vers l'arrière).
+    # L'ancien curseur devient une plage réduite à un point : rien n'est sauté.
+    cursor.execute("""
+        CREATE TABLE scan_progress_new (
+            channel_id INTEGER PRIMARY KEY,
+            low_id INTEGER,
+            high_id INTEGER,
+            reached_start INTEGER NOT NULL DEFAULT 0
+                    )""")
+    cursor.execute("""
+        INSERT INTO scan_progress_new (channel_id, low_id, high_id)
+        SELECT channel_id, last_message_id, last_message_id FROM scan_progress""")
+    cursor.execute("DROP TABLE scan_progress")
+    cursor.execute("ALTER TABLE scan_progress_new RENAME TO scan_progress")
+
+
+def _migrate_archive_stats(cursor):
+    # Compteurs par auteur et par emoji pour /stats, tenus à jour par des triggers
+    # (le total vient de archive_slots, déjà dense)
+    cursor.execute("""
+        CREATE TABLE author_stats (
+            author_name TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+                    )""")
+    cursor.execute("CREATE INDEX idx_author_stats_count ON author_stats (count)")
+    cursor.execute("""
+        CREATE TABLE emoji_stats (
+            reaction_emoji TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+                    )""")
+    cursor.execute("CREATE INDEX idx_emoji_stats_count ON emoji_stats (count)")
+    cursor.execute("""
+        INSERT INTO author_stats (author_name, count)
+        SELECT author_name, COUNT(*) FROM archived_messages
+        WHERE author_name IS NOT NULL GROUP BY author_name""")
+    cursor.execute("""
+        INSERT INTO emoji_stats (reaction_emoji, count)
+        SELECT reaction_emoji, COUNT(*) FROM archived_messages
+        WHERE reaction_emoji IS NOT NULL GROUP BY reaction_emoji""")
+
+    cursor.execute("""
+        CREATE TRIGGER archive_stats_insert AFTER INSERT ON archived_messages BEGIN
+            INSERT INTO author_stats (author_name, count)
+            SELECT NEW.author_name, 1 WHERE NEW.author_name IS NOT NULL
+            ON CONFLICT (author_name) DO UPDATE SET count = count + 1;
+            INSERT INTO emoji_stats (reaction_emoji, count)
+            SELECT NEW.reaction_emoji, 1 WHERE NEW.reaction_emoji IS NOT NULL
+            ON CONFLICT (reaction_emoji) DO UPDATE SET count = count + 1;
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_stats_delete AFTER DELETE ON archived_messages BEGIN
+            UPDATE author_stats SET count = count - 1 WHERE author_name = OLD.author_name;
+            DELETE FROM author_stats WHERE author_name = OLD.author_name AND count <= 0;
+            UPDATE emoji_stats SET count = count - 1 WHERE reaction_emoji = OLD.reaction_emoji;
+            DELETE FROM emoji_stats WHERE reaction_emoji = OLD.reaction_emoji AND count <= 0;
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_stats_update_author AFTER UPDATE OF author_name ON archived_messages
+        WHEN OLD.author_name IS NOT NEW.author_name BEGIN
+            UPDATE author_stats SET count = count - 1 WHERE author_name = OLD.author_name;
+            DELETE FROM author_stats WHERE author_name = OLD.author_name AND count <= 0;
+            INSERT INTO author_stats (author_name, count)
+            SELECT NEW.author_name, 1 WHERE NEW.author_name IS NOT NULL
+            ON CONFLICT (author_name) DO UPDATE SET count = count + 1;
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_stats_update_emoji AFTER UPDATE OF reaction_emoji ON archived_messages
+        WHEN OLD.reaction_emoji IS NOT NEW.reaction_emoji BEGIN
+            UPDATE emoji_stats SET count = count - 1 WHERE reaction_emoji = OLD.reaction_emoji;
+            DELETE FROM emoji_stats WHERE reaction_emoji = OLD.reaction_emoji AND count <= 0;
+            INSERT INTO emoji_stats (reaction_emoji, count)
+            SELECT NEW.reaction_emoji, 1 WHERE NEW.reaction_emoji IS NOT NULL
+            ON CONFLICT (reaction_emoji) DO UPDATE SET count = count + 1;
+        END""")
+
+
+def _migrate_scores_index(cursor):
+    # Classement paginé et voisinage d'un joueur : parcours de l'index, sans tri
+    cursor.execute("CREATE INDEX idx_poll_scores_points ON poll_scores (points DESC, user_id)")
+
+
+def _migrate_search_index(cursor):
+    # Index plein texte du contenu archivé, en "external content" : le texte
+    # reste dans archived_messages, archive_fts ne stocke que l'index.
+    cursor.execute("""
+        CREATE VIRTUAL TABLE archive_fts USING fts5(
+            content,
+            content = 'archived_messages',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+                    )""")
+    cursor.execute("""
+        CREATE TRIGGER archive_fts_insert AFTER INSERT ON archived_messages BEGIN
+            INSERT INTO archive_fts (rowid, content) VALUES (NEW.id, NEW.content);
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_fts_delete AFTER DELETE ON archived_messages BEGIN
+            INSERT INTO archive_fts (archive_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_fts_update AFTER UPDATE OF content ON archived_messages BEGIN
+            INSERT INTO archive_fts (archive_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+            INSERT INTO archive_fts (rowid, content) VALUES (NEW.id, NEW.content);
+        END""")
+    # Indexation des messages déjà archivés
+    cursor.execute("INSERT INTO archive_fts (archive_fts) VALUES ('rebuild')")
+
+
+def _fill_archive_stats(cursor, server_id=None):
+    """(Re)calcule les compteurs de /stats, pour un serveur ou pour tous."""
+    where, params = ("WHERE server_id = ?", (server_id,)) if server_id is not None else ("", ())
+    cursor.execute(f"DELETE FROM author_stats {where}", params)
+    cursor.execute(f"DELETE FROM emoji_stats {where}", params)
+    where = "AND server_id = ?" if server_id is not None else ""
+    cursor.execute(f"""
+        INSERT INTO author_stats (server_id, author_name, count)
+        SELECT COALESCE(server_id, 0), author_name, COUNT(*) FROM archived_messages
+        WHERE author_name IS NOT NULL {where} GROUP BY COALESCE(server_id, 0), author_name""", params)
+    cursor.execute(f"""
+        INSERT INTO emoji_stats (server_id, reaction_emoji, count)
+        SELECT COALESCE(server_id, 0), reaction_emoji, COUNT(*) FROM archived_messages
+        WHERE reaction_emoji IS NOT NULL {where} GROUP BY COALESCE(server_id, 0), reaction_emoji""", params)
+
+
+def _migrate_guild_isolation(cursor):
+    # Toutes les données sont rangées par serveur : chaque commande ne parcourt
+    # que les lignes de son serveur. Les messages sans serveur vont dans le
+    # serveur 0. Les triggers sont recréés sur les nouvelles tables.
+
+    # --- Index composites sur archived_messages ---
+    for name in ("idx_archived_times_polled", "idx_archived_author", "idx_archived_emoji", "idx_archived_server"):
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    cursor.execute("CREATE INDEX idx_archived_server_polled ON archived_messages (server_id, times_polled)")
+    cursor.execute("CREATE INDEX idx_archived_server_author ON archived_messages (server_id, author_name)")
+    cursor.execute("CREATE INDEX idx_archived_server_emoji ON archived_messages (server_id, reaction_emoji)")
+
+    # --- Emplacements du tirage aléatoire : une suite dense 0..n-1 par serveur ---
+    for name in ("archive_slots_insert", "archive_slots_delete"):
+        cursor.execute(f"DROP TRIGGER {name}")
+    cursor.execute("DROP TABLE archive_slots")
+    cursor.execute("""
+        CREATE TABLE archive_slots (
+            server_id INTEGER NOT NULL,
+            slot INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            PRIMARY KEY (server_id, slot)
+                    )""")
+    cursor.execute("CREATE INDEX idx_archive_slots_message ON archive_slots (message_id)")
+    cursor.execute("""
+        INSERT INTO archive_slots (server_id, slot, message_id)
+        SELECT COALESCE(server_id, 0), ROW_NUMBER() OVER (PARTITION BY COALESCE(server_id, 0) ORDER BY id) - 1, message_id
+        FROM archived_messages""")
+    cursor.execute("""
+        CREATE TRIGGER archive_slots_insert AFTER INSERT ON archived_messages BEGIN
+            INSERT INTO archive_slots (server_id, slot, message_id)
+            VALUES (COALESCE(NEW.server_id, 0),
+                    (SELECT COALESCE(MAX(slot) + 1, 0) FROM archive_slots WHERE server_id = COALESCE(NEW.server_id, 0)),
+                    NEW.message_id);
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_slots_delete AFTER DELETE ON archived_messages BEGIN
+            UPDATE archive_slots
+            SET message_id = (SELECT message_id FROM archive_slots WHERE server_id = COALESCE(OLD.server_id, 0)
+                              ORDER BY slot DESC LIMIT 1)
+            WHERE message_id = OLD.message_id;
+            DELETE FROM archive_slots
+            WHERE server_id = COALESCE(OLD.server_id, 0)
+              AND slot = (SELECT MAX(slot) FROM archive_slots WHERE server_id = COALESCE(OLD.server_id, 0));
+        END""")
+
+    # --- Compteurs de /stats par serveur ---
+    for name in ("archive_stats_insert", "archive_stats_delete",
+                 "archive_stats_update_author", "archive_stats_update_emoji"):
+        cursor.execute(f"DROP TRIGGER {name}")
+    cursor.execute("DROP TABLE author_stats")
+    cursor.execute("DROP TABLE emoji_stats")
+    cursor.execute("""
+        CREATE TABLE author_stats (
+            server_id INTEGER NOT NULL,
+            author_name TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (server_id, author_name)
+                    )""")
+    cursor.execute("CREATE INDEX idx_author_stats_count ON author_stats (server_id, count)")
+    cursor.execute("""
+        CREATE TABLE emoji_stats (
+            server_id INTEGER NOT NULL,
+            reaction_emoji TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (server_id, reaction_emoji)
+                    )""")
+    cursor.execute("CREATE INDEX idx_emoji_stats_count ON emoji_stats (server_id, count)")
+    _fill_archive_stats(cursor)
+
+    cursor.execute("""
+        CREATE TRIGGER archive_stats_insert AFTER INSERT ON archived_messages BEGIN
+            INSERT INTO author_stats (server_id, author_name, count)
+            SELECT COALESCE(NEW.server_id, 0), NEW.author_name, 1 WHERE NEW.author_name IS NOT NULL
+            ON CONFLICT (server_id, author_name) DO UPDATE SET count = count + 1;
+            INSERT INTO emoji_stats (server_id, reaction_emoji, count)
+            SELECT COALESCE(NEW.server_id, 0), NEW.reaction_emoji, 1 WHERE NEW.reaction_emoji IS NOT NULL
+            ON CONFLICT (server_id, reaction_emoji) DO UPDATE SET count = count + 1;
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_stats_delete AFTER DELETE ON archived_messages BEGIN
+            UPDATE author_stats SET count = count - 1
+            WHERE server_id = COALESCE(OLD.server_id, 0) AND author_name = OLD.author_name;
+            DELETE FROM author_stats
+            WHERE server_id = COALESCE(OLD.server_id, 0) AND author_name = OLD.author_name AND count <= 0;
+            UPDATE emoji_stats SET count = count - 1
+            WHERE server_id = COALESCE(OLD.server_id, 0) AND reaction_emoji = OLD.reaction_emoji;
+            DELETE FROM emoji_stats
+            WHERE server_id = COALESCE(OLD.server_id, 0) AND reaction_emoji = OLD.reaction_emoji AND count <= 0;
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_stats_update_author AFTER UPDATE OF author_name ON archived_messages
+        WHEN OLD.author_name IS NOT NEW.author_name BEGIN
+            UPDATE author_stats SET count = count - 1
+            WHERE server_id = COALESCE(OLD.server_id, 0) AND author_name = OLD.author_name;
+            DELETE FROM author_stats
+            WHERE server_id = COALESCE(OLD.server_id, 0) AND author_name = OLD.author_name AND count <= 0;
+            INSERT INTO author_stats (server_id, author_name, count)
+            SELECT COALESCE(NEW.server_id, 0), NEW.author_name, 1 WHERE NEW.author_name IS NOT NULL
+            ON CONFLICT (server_id, author_name) DO UPDATE SET count = count + 1;
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archive_stats_update_emoji AFTER UPDATE OF reaction_emoji ON archived_messages
+        WHEN OLD.reaction_emoji IS NOT NEW.reaction_emoji BEGIN
+            UPDATE emoji_stats SET count = count - 1
+            WHERE server_id = COALESCE(OLD.server_id, 0) AND reaction_emoji = OLD.reaction_emoji;
+            DELETE FROM emoji_stats
+            WHERE server_id = COALESCE(OLD.server_id, 0) AND reaction_emoji = OLD.reaction_emoji AND count <= 0;
+            INSERT INTO emoji_stats (server_id, reaction_emoji, count)
+            SELECT COALESCE(NEW.server_id, 0), NEW.reaction_emoji, 1 WHERE NEW.reaction_emoji IS NOT NULL
+            ON CONFLICT (server_id, reaction_emoji) DO UPDATE SET count = count + 1;
+        END""")
+
+    # --- Classement des polls par serveur ---
+    # Les anciens scores n'avaient pas de serveur : ils reviennent au seul serveur
+    # connu s'il n'y en a qu'un, sinon au serveur 0 (conservés, mais invisibles).
+    cursor.execute("SELECT DISTINCT server_id FROM archived_messages WHERE server_id IS NOT NULL LIMIT 2")
+    servers = cursor.fetchall()
+    legacy_server = servers[0][0] if len(servers) == 1 else 0
+    cursor.execute("""
+        CREATE TABLE poll_scores_new (
+            server_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            points INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (server_id, user_id)
+                    )""")
+    cursor.execute("INSERT INTO poll_scores_new (server_id, user_id, points) SELECT ?, user_id, points FROM poll_scores",
+                   (legacy_server,))
+    cursor.execute("DROP TABLE poll_scores")
+    cursor.execute("ALTER TABLE poll_scores_new RENAME TO poll_scores")
+    cursor.execute("CREATE INDEX idx_poll_scores_points ON poll_scores (server_id, points DESC, user_id)")
+
+    # --- Scans ---
+    cursor.execute("ALTER TABLE scan_progress ADD COLUMN guild_id INTEGER")
+    cursor.execute("""
+        UPDATE scan_progress SET guild_id = COALESCE(
+            (SELECT guild_id FROM scan_jobs WHERE scan_jobs.channel_id = scan_progress.channel_id LIMIT 1),
+            (SELECT server_id FROM archived_messages WHERE archived_messages.channel_id = scan_progress.channel_id LIMIT 1))""")
+    cursor.execute("CREATE INDEX idx_scan_progress_guild ON scan_progress (guild_id)")
+    cursor.execute("DROP INDEX idx_scan_jobs_status")
+    cursor.execute("CREATE INDEX idx_scan_jobs_status ON scan_jobs (status, guild_id)")
+
+
+def _migrate_shard_stats(cursor):
+    # Dernier relevé de chaque shard, écrit par le processus qui le possède :
+    # /shards voit ainsi tous les processus lancés par launcher.py
+    cursor.execute("""
+        CREATE TABLE shard_stats (
+            shard_id INTEGER PRIMARY KEY,
+            worker_id INTEGER,
+            guilds INTEGER,
+            latency_ms REAL,
+            events_per_s REAL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )""")
+
+
+def _migrate_polls(cursor):
+    # Sondages ouverts et votes, pour les reprendre après un redémarrage
+    cursor.execute("""
+        CREATE TABLE polls (
+            id INTEGER PRIMARY KEY,
+            server_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER,
+            archived_message_id INTEGER,
+            true_author TEXT NOT NULL,
+            choices TEXT NOT NULL,
+            message_url TEXT,
+            content TEXT,
+            ends_at REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )""")
+    cursor.execute("CREATE INDEX idx_polls_status ON polls (status, ends_at)")
+    cursor.execute("""
+        CREATE TABLE poll_votes (
+            poll_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            choice INTEGER NOT NULL,
+            PRIMARY KEY (poll_id, user_id)
+                    )""")
+
+
+def _migrate_image_store(cursor):
+    # Copies locales des images archivées (voir images.py). Les fichiers sont
+    # nommés par leur SHA-256 : une image archivée plusieurs fois n'est stockée
+    # qu'une fois. `file` est le fichier servi dans les embeds (la miniature
+    # quand l'original est trop lourd).
+    cursor.execute("""
+        CREATE TABLE image_files (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            content_type TEXT,
+            path TEXT NOT NULL,
+            thumb_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )""")
+    cursor.execute("""
+        CREATE TABLE archived_images (
+            message_id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            sha256 TEXT,
+            file TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )""")
+    cursor.execute("CREATE INDEX idx_archived_images_pending ON archived_images (message_id) WHERE status = 'pending'")
+    cursor.execute("CREATE INDEX idx_archived_images_sha ON archived_images (sha256)")
+    cursor.execute("""
+        CREATE TRIGGER archived_images_insert AFTER INSERT ON archived_messages
+        WHEN NEW.image_url IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO archived_images (message_id, url) VALUES (NEW.message_id, NEW.image_url);
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archived_images_delete AFTER DELETE ON archived_messages
+        BEGIN
+            DELETE FROM archived_images WHERE message_id = OLD.message_id;
+        END""")
+    # Images déjà archivées : leurs URL ont souvent expiré, elles passeront en
+    # échec après quelques tentatives
+    cursor.execute("""INSERT INTO archived_images (message_id, url)
+                      SELECT message_id, image_url FROM archived_messages WHERE image_url IS NOT NULL""")
+
+
+def _migrate_archive_imports(cursor):
+    # Avancement des imports (voir archive_io.py), par export : un import
+    # interrompu reprend après la dernière ligne validée
+    cursor.execute("""
+        CREATE TABLE archive_imports (
+            export_id TEXT PRIMARY KEY,
+            lines INTEGER NOT NULL DEFAULT 0,
+            imported INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )""")
+
+
+def _migrate_archived_reactions(cursor):
+    # Compteur de chaque emoji des messages archivés, tenu à jour après
+    # l'archivage (voir apply_reaction_deltas). Pour les messages déjà archivés,
+    # et les lignes insérées sans détail (imports), seul l'emoji enregistré est
+    # connu, avec le plus grand compteur du message : une approximation.
+    cursor.execute("""
+        CREATE TABLE archived_reactions (
+            message_id INTEGER NOT NULL,
+            emoji TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (message_id, emoji)
+                    ) WITHOUT ROWID""")
+    cursor.execute("""
+        INSERT INTO archived_reactions (message_id, emoji, count)
+        SELECT message_id, reaction_emoji, reactions FROM archived_messages
+        WHERE reaction_emoji IS NOT NULL AND reactions > 0""")
+    cursor.execute("""
+        CREATE TRIGGER archived_reactions_insert AFTER INSERT ON archived_messages
+        WHEN NEW.reaction_emoji IS NOT NULL AND NEW.reactions > 0
+        BEGIN
+            INSERT OR IGNORE INTO archived_reactions (message_id, emoji, count)
+            VALUES (NEW.message_id, NEW.reaction_emoji, NEW.reactions);
+        END""")
+    cursor.execute("""
+        CREATE TRIGGER archived_reactions_delete AFTER DELETE ON archived_messages
+        BEGIN
+            DELETE FROM archived_reactions WHERE message_id = OLD.message_id;
+        END""")
+
+
+# (version, description, migration, exécutée dans une transaction ?)
+# Le passage en WAL est impossible à l'intérieur d'une transaction.
+MIGRATIONS = [
+    (1, "schéma initial", _migrate_initial, True),
+    (2, "journal WAL", _migrate_wal, False),
+    (3, "times_polled en INTEGER", _migrate_times_polled_type, True),
+    (4, "index des requêtes fréquentes", _migrate_hot_indexes, True),
+    (5, "emplacements pour le tirage aléatoire", _migrate_archive_slots, True),
+    (6, "tâches de scan de fond", _migrate_scan_jobs, True),
+    (7, "plages scannées par salon", _migrate_scan_ranges, True),
+    (8, "compteurs incrémentaux pour /stats", _migrate_archive_stats, True),
+    (9, "index du classement des polls", _migrate_scores_index, True),
+    (10, "recherche plein texte", _migrate_search_index, True),
+    (11, "données isolées par serveur", _migrate_guild_isolation, True),
+    (12, "relevés des shards", _migrate_shard_stats, True),
+    (13, "sondages persistants", _migrate_polls, True),
+    (14, "copies locales des images", _migrate_image_store, True),
+    (15, "reprise des imports", _migrate_archive_imports, True),
+    (16, "réactions des messages archivés", _migrate_archived_reactions, True),
+]
+
+
+def _schema_version(cursor) -> int:
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+
+def _run_migrations(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )""")
     conn.commit()
-    conn.close()
+
+    current = _schema_version(cursor)
+    for version, description, migrate, transactional in MIGRATIONS:
+        if version <= current:
+            continue
+        if transactional:
+            # Verrou d'écriture dès le début : si plusieurs processus démarrent
+            # ensemble (launcher.py), un seul applique la migration, les autres
+            # attendent puis constatent qu'elle est faite
+            cursor.execute("BEGIN IMMEDIATE")
+            if _schema_version(cursor) >= version:
+                conn.rollback()
+                continue
+        try:
+            migrate(cursor)
+            cursor.execute("INSERT OR IGNORE INTO schema_version (version, description) VALUES (?, ?)",
+                           (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"🗄️ Migration {version} appliquée : {description}")
+
+# ============================
+# INITIALISATION DES BASES
+# ============================
+@_threaded
+def init_db():
+    _run_migrations(_get_conn())
+    _load_id_filter()
+
+# ============================
+# INDEX EN MÉMOIRE
+# ============================
+
+# Structures chargées à la première utilisation puis tenues à jour après chaque
+# écriture validée. Comme la connexion, elles ne sont touchées que depuis le
+# thread DB. Les tirages et classements sont propres à chaque serveur : on ne
+# charge que ceux des serveurs qui s'en servent.
+_samplers = {}  # server_id -> PollSampler
+
+# Filtre de Bloom des message_id archivés, devant is_message_archived : une
+# réponse négative (le cas de presque tous les messages d'un scan) ne coûte ni
+# requête ni passage par le thread DB. Sa taille est bornée par ID_FILTER_MAX_BYTES ;
+# au-delà, seuls les faux positifs (vérifiés en base) augmentent.
+ID_FILTER_ERROR_RATE = 0.01
+ID_FILTER_MIN_CAPACITY = 100_000
+ID_FILTER_MAX_BYTES = 32 * 1024 * 1024
+_id_filter = None
+
+# Classement des polls : rang d'un joueur en O(log n), et première page du
+# leaderboard gardée telle quelle tant qu'aucun score ne peut la modifier.
+TOP_CACHE_SIZE = 10
+_rankings = {}    # server_id -> ScoreRanking
+_top_caches = {}  # server_id -> [(user_id, points)]
+
+
+def _reset_indexes():
+    global _id_filter
+    _samplers.clear()
+    _id_filter = None
+    _rankings.clear()
+    _top_caches.clear()
+
+
+def _load_id_filter():
+    """(Re)construit le filtre avec de la marge : deux fois le nombre de lignes."""
+    global _id_filter
+    cursor = _get_conn().cursor()
+    cursor.execute("SELECT COUNT(*) FROM archived_messages")
+    total = cursor.fetchone()[0]
+    id_filter = IdFilter(max(ID_FILTER_MIN_CAPACITY, 2 * total), ID_FILTER_ERROR_RATE, ID_FILTER_MAX_BYTES)
+    cursor.execute("SELECT message_id FROM archived_messages")
+    for (message_id,) in cursor:
+        id_filter.add(message_id)
+    _id_filter = id_filter
+    print(f"🧮 Index des messages archivés : {total} ids, "
+          f"{id_filter.memory_bytes / 1024 / 1024:.1f} Mo, faux positifs ~{id_filter.error_rate():.2%}")
+
+
+def _remember_ids(message_ids):
+    """Ajoute des ids au filtre avant le commit : il ne doit jamais répondre
+    « sûrement pas archivé » pour une ligne déjà visible en base."""
+    if _id_filter is not None:
+        for message_id in message_ids:
+            _id_filter.add(message_id)
+
+
+def _grow_id_filter():
+    """Reconstruit le filtre s'il a dépassé sa capacité. Appelée après le commit :
+    la relecture de toute la table ne tient pas la transaction d'écriture."""
+    if (_id_filter is not None and _id_filter.count > _id_filter.capacity
+            and _id_filter.memory_bytes < ID_FILTER_MAX_BYTES):
+        _load_id_filter()
+
+
+def _get_sampler(server_id):
+    sampler = _samplers.get(server_id)
+    if sampler is None:
+        sampler = _samplers[server_id] = PollSampler()
+        cursor = _get_conn().cursor()
+        cursor.execute("SELECT message_id, times_polled, author_name FROM archived_messages WHERE server_id = ?",
+                       (server_id,))
+        for message_id, times_polled, author_name in cursor:
+            sampler.add(message_id, times_polled, author_name)
+    return sampler
+
+
+def _get_ranking(server_id):
+    ranking = _rankings.get(server_id)
+    if ranking is None:
+        ranking = _rankings[server_id] = ScoreRanking()
+        cursor = _get_conn().cursor()
+        cursor.execute("SELECT user_id, points FROM poll_scores WHERE server_id = ?", (server_id,))
+        for user_id, points in cursor:
+            ranking.set(user_id, points)
+    return ranking
+
+
+# Appelé après le commit de nouvelles lignes (tuples au format de _INSERT_ARCHIVED)
+def _after_archive(rows):
+    _grow_id_filter()
+    for row in rows:
+        sampler = _samplers.get(row[4])
+        if sampler is not None:
+            sampler.add(row[0], 0, row[5])
+
+
+def _after_unarchive(server_id, message_id):
+    sampler = _samplers.get(server_id)
+    if sampler is not None:
+        sampler.remove(message_id)
 
 # ============================
 # FONCTIONS POUR L’ARCHIVAGE
 # ============================
 
-# Archive un message dans la base, avec adresse de l'image si disponible
-def archive_message(message_id, content, reactions, channel_id, server_id, author_name, message_url, image_url=None, reaction_emoji=None):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''INSERT OR IGNORE INTO archived_messages 
+_INSERT_ARCHIVED = '''INSERT OR IGNORE INTO archived_messages
                       (message_id, content, reactions, channel_id, server_id, author_name, message_url, image_url, reaction_emoji)
-                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                   (message_id, content, reactions, channel_id, server_id, author_name, message_url, image_url, reaction_emoji))
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+
+# Colonnes d'un message archivé à afficher (commandes, sondages). La dernière
+# est le fichier local de l'image (images.py), NULL tant qu'il n'est pas stocké.
+_DISPLAY_COLUMNS = ("a.message_id, a.content, a.author_name, a.message_url, a.image_url, a.reaction_emoji, "
+                    "(SELECT i.file FROM archived_images i WHERE i.message_id = a.message_id AND i.status = 'stored')")
+
+
+# Insère des lignes et retourne celles qui ont réellement été ajoutées.
+# Les ids vont dans le filtre avant le commit : un id en trop n'est qu'un faux
+# positif, alors qu'un id manquant ferait croire qu'un message n'est pas archivé.
+def _insert_archived(cursor, rows):
+    _remember_ids(row[0] for row in rows)
+    inserted = []
+    for row in rows:
+        cursor.execute(_INSERT_ARCHIVED, row)
+        if cursor.rowcount:
+            inserted.append(row)
+    return inserted
+
+# Détail des réactions au moment de l'archivage ([(message_id, emoji, count)]),
+# pour les seules lignes réellement ajoutées
+def _insert_reaction_counts(cursor, inserted, reaction_counts):
+    inserted_ids = {row[0] for row in inserted}
+    rows = [row for row in reaction_counts if row[0] in inserted_ids and row[2] > 0]
+    if rows:
+        cursor.executemany("INSERT OR REPLACE INTO archived_reactions (message_id, emoji, count) VALUES (?, ?, ?)",
+                           rows)
+
+# Archive un message dans la base, avec adresse de l'image si disponible.
+# `reaction_counts` ({emoji: compteur}) détaille toutes ses réactions.
+async def archive_message(message_id, content, reactions, channel_id, server_id, author_name, message_url, image_url=None, reaction_emoji=None, reaction_counts=None):
+    await _archive_message_db(message_id, content, reactions, channel_id, server_id, author_name, message_url, image_url, reaction_emoji, reaction_counts)
+    cache.invalidate_archived(message_id)
+
+@_threaded
+def _archive_message_db(message_id, content, reactions, channel_id, server_id, author_name, message_url, image_url=None, reaction_emoji=None, reaction_counts=None):
+    conn = _get_conn()
+    cursor = conn.cursor()
+    inserted = _insert_archived(cursor, [
+        (message_id, content, reactions, channel_id, server_id, author_name, message_url, image_url, reaction_emoji)
+    ])
+    if reaction_counts:
+        _insert_reaction_counts(cursor, inserted, [(message_id, emoji, count) for emoji, count in reaction_counts.items()])
     conn.commit()
-    conn.close()
+    _after_archive(inserted)
 
-# Vérifie si un message a déjà été archivé
-def is_message_archived(message_id):
-    conn = sqlite3.connect(DB_PATH)
+# Supprime un message de l'archive d'un serveur. Retourne True s'il y était.
+async def unarchive_message(server_id: int, message_id: int) -> bool:
+    removed = await _unarchive_message_db(server_id, message_id)
+    cache.invalidate_archived(message_id)
+    return removed
+
+@_threaded
+def _unarchive_message_db(server_id: int, message_id: int) -> bool:
+    conn = _get_conn()
     cursor = conn.cursor()
+    cursor.execute("DELETE FROM archived_messages WHERE message_id = ? AND server_id = ?", (message_id, server_id))
+    conn.commit()
+    if cursor.rowcount > 0:
+        _after_unarchive(server_id, message_id)
+        return True
+    return False
+
+# Vérifie si un message a déjà été archivé
+async def is_message_archived(message_id):
+    id_filter = _id_filter
+    if id_filter is not None and message_id not in id_filter:
+        return False
+    return await _is_message_archived_db(message_id)
+
+@_threaded
+def _is_message_archived_db(message_id):
+    if _id_filter is None:
+        _load_id_filter()
+    cursor = _get_conn().cursor()
     cursor.execute('SELECT 1 FROM archived_messages WHERE message_id = ?', (message_id,))
     result = cursor.fetchone()
-    conn.close()
     return result is not None
 
-# Récupère le contenu d'un message archivé par son ID
-def get_archived_message(message_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+# Réponse immédiate, sans requête : False si le message n'est sûrement pas
+# archivé, True s'il l'est peut-être (faux positifs, voir ID_FILTER_ERROR_RATE)
+def may_be_archived(message_id) -> bool:
+    id_filter = _id_filter
+    return id_filter is None or message_id in id_filter
+
+# Taille et précision du filtre des messages archivés
+def get_id_filter_stats():
+    id_filter = _id_filter
+    if id_filter is None:
+        return None
+    return {
+        "ids": id_filter.count,
+        "capacity": id_filter.capacity,
+        "memory_bytes": id_filter.memory_bytes,
+        "error_rate": id_filter.error_rate(),
+    }
+
+# Récupère le contenu d'un message archivé par son ID (lu d'abord dans le cache)
+async def get_archived_message(server_id: int, message_id: int):
+    cached = cache.archived_rows.get(message_id)
+    if cached is None:
+        cached = await _get_archived_message_db(message_id)
+        if cached is None:
+            return None
+        cache.archived_rows.put(message_id, cached)
+    row_server_id, row = cached
+    return row if row_server_id == server_id else None
+
+# Retourne (server_id, ligne) : la ligne est mise en cache quel que soit le serveur demandé
+@_threaded
+def _get_archived_message_db(message_id: int):
+    cursor = _get_conn().cursor()
     cursor.execute(
-        'SELECT message_id, content, author_name, message_url, image_url, reaction_emoji '
-        'FROM archived_messages WHERE message_id = ?',
+        f'SELECT a.server_id, {_DISPLAY_COLUMNS} FROM archived_messages a WHERE a.message_id = ?',
         (message_id,)
-    )    
+    )
     row = cursor.fetchone()
-    conn.close()
-    return row if row else None
+    return (row[0], row[1:]) if row else None
 
-# Récupère un message aléatoire depuis la base
-def get_random_archived_message():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+# Récupère un message aléatoire d'un serveur (tirage uniforme dans archive_slots)
+async def get_random_archived_message(server_id: int):
+    row = await _get_random_archived_message_db(server_id)
+    if row:
+        cache.archived_rows.put(row[0], (server_id, row))
+    return row
+
+@_threaded
+def _get_random_archived_message_db(server_id: int):
+    cursor = _get_conn().cursor()
+    cursor.execute('SELECT MAX(slot) FROM archive_slots WHERE server_id = ?', (server_id,))
+    last_slot = cursor.fetchone()[0]
+    if last_slot is None:
+        return None
     cursor.execute(
-        'SELECT message_id, content, author_name, message_url, image_url, reaction_emoji '
-        'FROM archived_messages ORDER BY RANDOM() LIMIT 1'
-    )   
+        f'SELECT {_DISPLAY_COLUMNS} '
+        'FROM archive_slots s JOIN archived_messages a ON a.message_id = s.message_id '
+        'WHERE s.server_id = ? AND s.slot = ?',
+        (server_id, random.randint(0, last_slot))
+    )
     row = cursor.fetchone()
-    conn.close()
     return row if row else None
 
-# Récupère un message aléatoire rarement vu depuis la base
-def get_random_unseen_archived_message():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT message_id, content FROM archived_messages ORDER BY times_polled ASC, RANDOM() LIMIT 1')
-    row = cursor.fetchone()
-    conn.close()
-    return row if row else None
+# ============================
+# RECHERCHE PLEIN TEXTE
+# ============================
+
+DISCORD_EPOCH_MS = 1420070400000
+
+# Au-delà de ce nombre de correspondances, trier par pertinence (bm25) oblige à
+# noter chacune d'elles : les résultats sont alors donnés du plus récent au plus
+# ancien, ce que FTS5 lit directement dans l'ordre de son index.
+SEARCH_RANKED_MAX_MATCHES = 20_000
+
+
+def snowflake_at(timestamp: float) -> int:
+    """Plus petit snowflake possible à cet instant (timestamp Unix en secondes)."""
+    return max(0, int(timestamp * 1000) - DISCORD_EPOCH_MS) << 22
+
+
+def _fts_query(text):
+    """Transforme la saisie libre en requête FTS5 : chaque mot doit apparaître.
+
+    Les mots sont mis entre guillemets pour que la ponctuation de l'utilisateur
+    ne soit jamais lue comme la syntaxe FTS5 ; un `*` final garde la recherche
+    par préfixe (`chat*` trouve chaton, chats...).
+    """
+    terms = []
+    for word, prefix in re.findall(r"(\w+)(\*?)", text):
+        terms.append(f'"{word}"{prefix}')
+    return " ".join(terms) or None
+
+
+@_threaded
+def search_archived_messages(server_id, text, author=None, emoji=None, after_id=None, before_id=None,
+                             limit: int = 5, offset: int = 0):
+    """Recherche dans le contenu archivé d'un serveur, du plus au moins pertinent (bm25),
+    ou du plus récent au plus ancien pour les mots trop courants.
+
+    Retourne (lignes, page suivante ?) ; chaque ligne est
+    (message_id, extrait, author_name, message_url, reaction_emoji, reactions).
+    `after_id` / `before_id` bornent la date via les snowflakes (voir snowflake_at).
+    """
+    query = _fts_query(text)
+    if query is None:
+        return [], False
+
+    # CROSS JOIN : l'index FTS doit mener la jointure. Sinon SQLite peut partir
+    # des index (server_id, ...) et réévaluer le MATCH pour chaque message du serveur.
+    sql = ("SELECT a.message_id, snippet(archive_fts, 0, '**', '**', '…', 16), "
+           "a.author_name, a.message_url, a.reaction_emoji, a.reactions "
+           "FROM archive_fts CROSS JOIN archived_messages a ON a.id = archive_fts.rowid "
+           "WHERE archive_fts MATCH ? AND a.server_id = ?")
+    params = [query, server_id]
+    if author:
+        sql += " AND a.author_name = ? COLLATE NOCASE"
+        params.append(author)
+    if emoji:
+        sql += " AND a.reaction_emoji = ?"
+        params.append(emoji)
+    if after_id is not None:
+        sql += " AND a.message_id >= ?"
+        params.append(after_id)
+    if before_id is not None:
+        sql += " AND a.message_id < ?"
+        params.append(before_id)
+
+    cursor = _get_conn().cursor()
+    cursor.execute("SELECT COUNT(*) FROM (SELECT 1 FROM archive_fts CROSS JOIN archived_messages a ON a.id = archive_fts.rowid "
+                   "WHERE archive_fts MATCH ? AND a.server_id = ? LIMIT ?)",
+                   (query, server_id, SEARCH_RANKED_MAX_MATCHES + 1))
+    if cursor.fetchone()[0] <= SEARCH_RANKED_MAX_MATCHES:
+        sql += " ORDER BY bm25(archive_fts)"
+    else:
+        sql += " ORDER BY archive_fts.rowid DESC"
+    # Une ligne de plus que demandé : savoir s'il existe une page suivante
+    # sans compter tous les résultats filtrés
+    sql += " LIMIT ? OFFSET ?"
+    params += [limit + 1, offset]
+
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    return rows[:limit], len(rows) > limit
 
 # ============================
-# FONCTIONS POUR LE SCAN
+# FONCTIONS POUR LES SONDAGES
 # ============================
 
-# Met à jour la position du dernier message scanné dans un salon
-def update_last_scanned_id(channel_id, last_message_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('REPLACE INTO scan_progress (channel_id, last_message_id) VALUES (?, ?)',
-                   (channel_id, last_message_id))
+# Choisit le message à faire deviner : un des moins sondés, au hasard
+@_threaded
+def get_poll_candidate(server_id: int):
+    sampler = _get_sampler(server_id)
+    cursor = _get_conn().cursor()
+    while True:
+        message_id = sampler.pick()
+        if message_id is None:
+            return None
+        cursor.execute(
+            f'SELECT {_DISPLAY_COLUMNS} FROM archived_messages a WHERE a.message_id = ?',
+            (message_id,)
+        )
+        row = cursor.fetchone()
+        if row:
+            return row
+        # Ligne supprimée hors du bot : on l'oublie et on retire
+        sampler.remove(message_id)
+
+# Tire au hasard des auteurs différents du vrai auteur (les leurres du sondage)
+@_threaded
+def get_other_authors(server_id: int, true_author: str, limit: int = 3):
+    return _get_sampler(server_id).other_authors(true_author, limit)
+
+# Incrémente le compteur de sondages d'un message
+@_threaded
+def increment_times_polled(server_id: int, message_id: int):
+    conn = _get_conn()
+    conn.execute("UPDATE archived_messages SET times_polled = times_polled + 1 WHERE message_id = ?", (message_id,))
     conn.commit()
-    conn.close()
+    sampler = _samplers.get(server_id)
+    if sampler is not None:
+        sampler.bump(message_id)
+
+# ============================
+# FONCTIONS POUR LES STATS
+# ============================
+@_threaded
+def get_archive_stats(server_id: int, limit: int = 10):
+    """Retourne (total, top auteurs, top emojis) des messages archivés d'un serveur."""
+    cursor = _get_conn().cursor()
+
+    # Nombre total de messages archivés (les emplacements sont denses)
+    cursor.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM archive_slots WHERE server_id = ?", (server_id,))
+    total_archived = cursor.fetchone()[0]
+
+    # Top auteurs
+    cursor.execute("SELECT author_name, count FROM author_stats WHERE server_id = ? "
+                   "ORDER BY count DESC LIMIT ?", (server_id, limit))
+    top_authors = cursor.fetchall()
+
+    # Top emojis
+    cursor.execute("SELECT reaction_emoji, count FROM emoji_stats WHERE server_id = ? "
+                   "ORDER BY count DESC LIMIT ?", (server_id, limit))
+    top_emojis = cursor.fetchall()
+
+    return total_archived, top_authors, top_emojis
+
+@_threaded
+def rebuild_archive_stats(server_id=None):
+    """Recalcule les compteurs de /stats depuis archived_messages (un serveur, ou tous)."""
+    conn = _get_conn()
+    with conn:
+        _fill_archive_stats(conn.cursor(), server_id)
+
+# ============================
+# FONCTIONS POUR LE SCAN
+# ============================
+
+# Chaque salon a une plage scannée continue [low_id, high_id] (snowflakes inclus).
+# Les scans "récents" l'étendent vers le haut (after=high_id), les scans complets
+# vers le bas (before=low_id) ; reached_start indique que le début du salon est atteint.
+
+# Écrit en une seule transaction un lot d'archivages et l'extension de plage associée
+# (et, pour une tâche de fond, son curseur et ses compteurs). Retourne le nombre de lignes ajoutées.
+@_threaded
+def write_scan_batch(channel_id, rows, low_id=None, high_id=None, reached_start=False,
+                     job_id=None, last_message_id=None, scanned=0, guild_id=None, reaction_counts=()):
+    conn = _get_conn()
+    with conn:
+        cursor = conn.cursor()
+        inserted = _insert_archived(cursor, rows)
+        _insert_reaction_counts(cursor, inserted, reaction_counts)
+        if low_id is not None or reached_start:
+            conn.execute('''INSERT INTO scan_progress (channel_id, guild_id, low_id, high_id, reached_start)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(channel_id) DO UPDATE SET
+                                guild_id = COALESCE(excluded.guild_id, guild_id),
+                                low_id = MIN(COALESCE(low_id, excluded.low_id), COALESCE(excluded.low_id, low_id)),
+                                high_id = MAX(COALESCE(high_id, excluded.high_id), COALESCE(excluded.high_id, high_id)),
+                                reached_start = MAX(reached_start, excluded.reached_start)''',
+                         (channel_id, guild_id, low_id, high_id, int(reached_start)))
+        if job_id is not None:
+            conn.execute('''UPDATE scan_jobs
+                            SET cursor_id = COALESCE(?, cursor_id), scanned = scanned + ?, archived = archived + ?,
+                                updated_at = CURRENT_TIMESTAMP
+                            WHERE id = ?''',
+                         (last_message_id, scanned, len(inserted), job_id))
+    _after_archive(inserted)
+    return len(inserted)
+
+# Récupère la plage scannée d'un salon : (low_id, high_id, reached_start) ou None
+@_threaded
+def get_scan_range(channel_id):
+    cursor = _get_conn().cursor()
+    cursor.execute('SELECT low_id, high_id, reached_start FROM scan_progress WHERE channel_id = ?', (channel_id,))
+    row = cursor.fetchone()
+    if not row or row[0] is None:
+        return None
+    return row[0], row[1], bool(row[2])
+
+
+# ============================
+# TÂCHES DE SCAN DE FOND
+# ============================
+
+# Statuts : pending (en attente), running, done, cancelled, failed.
+# Au démarrage, une tâche "running" est une tâche interrompue : elle reprend.
+ACTIVE_JOB_STATUSES = ("pending", "running")
 
-# Récupère l'ID du dernier message scanné dans un salon
-def get_last_scanned_id(channel_id):
-    conn = sqlite3.connect(DB_PATH)
+_JOB_COLUMNS = ("id, guild_id, channel_id, notify_channel_id, requested_by, status, "
+                "cursor_id, start_cursor_id, scanned, archived, error")
+
+
+# Crée une tâche de scan, sauf si le salon en a déjà une active. Retourne (id, créée ?)
+@_threaded
+def create_scan_job(guild_id, channel_id, notify_channel_id, requested_by, cursor_id=None, start_cursor_id=None):
+    conn = _get_conn()
     cursor = conn.cursor()
-    cursor.execute('SELECT last_message_id FROM scan_progress WHERE channel_id = ?', (channel_id,))
+    cursor.execute("SELECT id FROM scan_jobs WHERE channel_id = ? AND status IN (?, ?)",
+                   (channel_id, *ACTIVE_JOB_STATUSES))
     row = cursor.fetchone()
-    conn.close()
-    return row[0] if row else None
+    if row:
+        return row[0], False
+    cursor.execute('''INSERT INTO scan_jobs
+                      (guild_id, channel_id, notify_channel_id, requested_by, cursor_id, start_cursor_id)
+                      VALUES (?, ?, ?, ?, ?, ?)''',
+                   (guild_id, channel_id, notify_channel_id, requested_by, cursor_id, start_cursor_id))
+    conn.commit()
+    return cursor.lastrowid, True
+
+# Tâches en attente ou en cours, les plus anciennes d'abord
+@_threaded
+def get_active_scan_jobs(guild_id=None):
+    cursor = _get_conn().cursor()
+    query = f"SELECT {_JOB_COLUMNS} FROM scan_jobs WHERE status IN (?, ?)"
+    params = list(ACTIVE_JOB_STATUSES)
+    if guild_id is not None:
+        query += " AND guild_id = ?"
+        params.append(guild_id)
+    cursor.execute(query + " ORDER BY id", params)
+    return cursor.fetchall()
+
+@_threaded
+def get_scan_job(job_id, guild_id=None):
+    cursor = _get_conn().cursor()
+    if guild_id is None:
+        cursor.execute(f"SELECT {_JOB_COLUMNS} FROM scan_jobs WHERE id = ?", (job_id,))
+    else:
+        cursor.execute(f"SELECT {_JOB_COLUMNS} FROM scan_jobs WHERE id = ? AND guild_id = ?", (job_id, guild_id))
+    return cursor.fetchone()
+
+# Change le statut d'une tâche encore active. Retourne False si elle ne l'est plus
+# (annulée entre-temps, éventuellement par un autre processus) : rien n'est écrasé.
+@_threaded
+def set_scan_job_status(job_id, status, error=None):
+    conn = _get_conn()
+    cursor = conn.execute('''UPDATE scan_jobs SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                             WHERE id = ? AND status IN (?, ?)''',
+                          (status, error, job_id, *ACTIVE_JOB_STATUSES))
+    conn.commit()
+    return cursor.rowcount > 0
+
+# ============================
+# SUIVI DES SHARDS
+# ============================
+
+# Enregistre le relevé des shards d'un processus : [(shard_id, serveurs, latence ms, événements/s)]
+@_threaded
+def write_shard_stats(worker_id, rows):
+    conn = _get_conn()
+    with conn:
+        conn.executemany('''INSERT INTO shard_stats (shard_id, worker_id, guilds, latency_ms, events_per_s, updated_at)
+                              VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                              ON CONFLICT(shard_id) DO UPDATE SET
+                                  worker_id = excluded.worker_id, guilds = excluded.guilds,
+                                  latency_ms = excluded.latency_ms, events_per_s = excluded.events_per_s,
+                                  updated_at = excluded.updated_at''',
+                         [(shard_id, worker_id, guilds, latency_ms, events_per_s)
+                          for shard_id, guilds, latency_ms, events_per_s in rows])
+
+# Derniers relevés de tous les shards, avec leur âge en secondes
+@_threaded
+def get_shard_stats():
+    cursor = _get_conn().cursor()
+    cursor.execute('''SELECT shard_id, worker_id, guilds, latency_ms, events_per_s,
+                             CAST(strftime('%s', 'now') - strftime('%s', updated_at) AS INTEGER)
+                      FROM shard_stats ORDER BY shard_id''')
+    return cursor.fetchall()
+
+# ============================
+# ÉCRITURE DIFFÉRÉE DES SCANS
+# ============================
+
+SCAN_BATCH_ROWS = 500     # opérations (archivages + points de reprise) par transaction
+SCAN_BATCH_DELAY = 1.0    # secondes maximum entre deux transactions
+
+# Écrivains encore ouverts, vidés par close() à l'arrêt du bot
+_writers = weakref.WeakSet()
+
+
+class ScanWriter:
+    """Regroupe les archivages et l'avancement d'un scan en transactions.
+
+    Les lignes et l'extension de la plage scannée partent dans la même
+    transaction, et la plage ne couvre jamais que des messages déjà traités :
+    après un crash, le scan reprend au dernier lot validé et ne saute aucun
+    message. Les messages doivent être passés à checkpoint() dans l'ordre,
+    en partant d'un bord de la plage déjà scannée.
+    """
+
+    def __init__(self, channel_id, guild_id=None, job_id=None, max_rows=SCAN_BATCH_ROWS, max_delay=SCAN_BATCH_DELAY):
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.job_id = job_id
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._rows = []
+        self._reaction_counts = []
+        self._pending_ids = set()
+        self._low = self._high = self._last_message_id = None
+        self._reached_start = False
+        self._scanned = 0
+        self._ops = 0
+        self._last_flush = time.monotonic()
+        _writers.add(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def is_pending(self, message_id) -> bool:
+        """Vrai si le message attend déjà d'être écrit dans ce lot."""
+        return message_id in self._pending_ids
+
+    async def archive(self, message_id, content, reactions, channel_id, server_id, author_name, message_url, image_url=None, reaction_emoji=None, reaction_counts=None):
+        self._rows.append((message_id, content, reactions, channel_id, server_id, author_name, message_url, image_url, reaction_emoji))
+        if reaction_counts:
+            self._reaction_counts.extend((message_id, emoji, count) for emoji, count in reaction_counts.items())
+        self._pending_ids.add(message_id)
+        await self._tick()
+
+    async def checkpoint(self, message_id):
+        self._last_message_id = message_id
+        self._low = message_id if self._low is None else min(self._low, message_id)
+        self._high = message_id if self._high is None else max(self._high, message_id)
+        self._scanned += 1
+        await self._tick()
+
+    async def mark_start_reached(self):
+        """Le scan a atteint le premier message du salon."""
+        self._reached_start = True
+        await self._tick()
+
+    async def _tick(self):
+        self._ops += 1
+        if self._ops >= self.max_rows or time.monotonic() - self._last_flush >= self.max_delay:
+            await self.flush()
+
+    async def flush(self):
+        rows, low, high, reached_start = self._rows, self._low, self._high, self._reached_start
+        last_message_id, scanned, reaction_counts = self._last_message_id, self._scanned, self._reaction_counts
+        self._rows, self._reaction_counts, self._pending_ids = [], [], set()
+        self._low = self._high = self._last_message_id = None
+        self._reached_start = False
+        self._scanned = self._ops = 0
+        self._last_flush = time.monotonic()
+        if rows or low is not None or reached_start:
+            archived = await write_scan_batch(self.channel_id, rows, low, high, reached_start,
+                                              self.job_id, last_message_id, scanned, self.guild_id,
+                                              reaction_counts)
+            metrics.SCAN_MESSAGES.inc(scanned)
+            metrics.SCAN_ARCHIVED.inc(archived)
+            for row in rows:
+                cache.invalidate_archived(row[0])
+
+    async def close(self):
+        await self.flush()
+        _writers.discard(self)
 
 
 # ============================
 # FONCTIONS POUR LES RANKED
 # ============================
-def add_points(user_id: int, points: int = 1):
-    """Ajoute des points à un utilisateur."""
-    conn = sqlite3.connect(DB_PATH)
+# Appelé après le commit de nouveaux scores : [(user_id, nouveau total)]
+def _after_points(server_id, totals):
+    ranking = _rankings.get(server_id)
+    if ranking is not None:
+        for user_id, total in totals:
+            ranking.set(user_id, total)
+    # La première page ne change que si un joueur y est déjà, ou peut y entrer
+    top = _top_caches.get(server_id)
+    if top is not None and any(
+        len(top) < TOP_CACHE_SIZE
+        or total >= top[-1][1]
+        or any(row[0] == user_id for row in top)
+        for user_id, total in totals
+    ):
+        del _top_caches[server_id]
+
+
+def _ranked(server_id, rows):
+    """Ajoute le rang (les ex æquo partagent le même) aux lignes (user_id, points)."""
+    ranking = _get_ranking(server_id)
+    return [(ranking.rank_of(points), user_id, points) for user_id, points in rows]
+
+
+@_threaded
+def add_points(server_id: int, user_id: int, points: int = 1):
+    """Ajoute des points à un utilisateur, dans le classement d'un serveur."""
+    conn = _get_conn()
     cursor = conn.cursor()
     cursor.execute("""
-        INSERT INTO poll_scores (user_id, points)
-        VALUES (?, ?)
-        ON CONFLICT(user_id) DO UPDATE SET points = points + excluded.points
-    """, (user_id, points))
+        INSERT INTO poll_scores (server_id, user_id, points)
+        VALUES (?, ?, ?)
+        ON CONFLICT(server_id, user_id) DO UPDATE SET points = points + excluded.points
+        RETURNING points
+    """, (server_id, user_id, points))
+    total = cursor.fetchone()[0]
     conn.commit()
-    conn.close()
+    _after_points(server_id, [(user_id, total)])
+
+@_threaded
+def get_leaderboard(server_id: int, limit: int = 10, offset: int = 0):
+    """Retourne une page du classement d'un serveur : [(rang, user_id, points)]."""
+    cursor = _get_conn().cursor()
+    if offset + limit <= TOP_CACHE_SIZE:
+        top = _top_caches.get(server_id)
+        if top is None:
+            cursor.execute("""
+                SELECT user_id, points
+                FROM poll_scores
+                WHERE server_id = ?
+                ORDER BY points DESC, user_id ASC
+                LIMIT ?
+            """, (server_id, TOP_CACHE_SIZE))
+            top = _top_caches[server_id] = cursor.fetchall()
+        return _ranked(server_id, top[offset:offset + limit])
 
-def get_leaderboard(limit: int = 10):
-    """Retourne le top des utilisateurs par points."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     cursor.execute("""
         SELECT user_id, points
         FROM poll_scores
+        WHERE server_id = ?
         ORDER BY points DESC, user_id ASC
-        LIMIT ?
-    """, (limit,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+        LIMIT ? OFFSET ?
+    """, (server_id, limit, offset))
+    return _ranked(server_id, cursor.fetchall())
 
-def get_user_points(user_id: int) -> int:
-    """Retourne le nombre de points d’un utilisateur (0 si aucun)."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT points FROM poll_scores WHERE user_id = ?", (user_id,))
+@_threaded
+def count_ranked_players(server_id: int) -> int:
+    """Nombre de joueurs ayant un score sur un serveur."""
+    return len(_get_ranking(server_id))
+
+@_threaded
+def get_user_points(server_id: int, user_id: int) -> int:
+    """Retourne le nombre de points d’un utilisateur sur un serveur (0 si aucun)."""
+    cursor = _get_conn().cursor()
+    cursor.execute("SELECT points FROM poll_scores WHERE server_id = ? AND user_id = ?", (server_id, user_id))
     row = cursor.fetchone()
-    conn.close()
     return row[0] if row else 0
 
-def reset_leaderboard():
-    """Réinitialise complètement le classement."""
-    conn = sqlite3.connect(DB_PATH)
+@_threaded
+def get_user_rank(server_id: int, user_id: int):
+    """Retourne (rang, points, nombre de joueurs), ou None si l'utilisateur n'a aucun score."""
+    ranking = _get_ranking(server_id)
+    points = ranking.get(user_id)
+    if points is None:
+        return None
+    return ranking.rank_of(points), points, len(ranking)
+
+@_threaded
+def get_leaderboard_around(server_id: int, user_id: int, radius: int = 2):
+    """Retourne les joueurs autour d'un utilisateur : [(rang, user_id, points)].
+
+    On part de sa position dans l'index (server_id, points DESC, user_id) et on
+    lit `radius` joueurs de chaque côté, sans parcourir ceux qui précèdent.
+    """
+    points = _get_ranking(server_id).get(user_id)
+    if points is None:
+        return []
+    cursor = _get_conn().cursor()
+
+    # Au-dessus : même score et user_id plus petit, puis scores plus élevés
+    cursor.execute("""
+        SELECT user_id, points FROM poll_scores
+        WHERE server_id = ? AND points = ? AND user_id < ? ORDER BY user_id DESC LIMIT ?
+    """, (server_id, points, user_id, radius))
+    above = cursor.fetchall()
+    if len(above) < radius:
+        cursor.execute("""
+            SELECT user_id, points FROM poll_scores
+            WHERE server_id = ? AND points > ? ORDER BY points ASC, user_id DESC LIMIT ?
+        """, (server_id, points, radius - len(above)))
+        above += cursor.fetchall()
+
+    # En dessous : même score et user_id plus grand, puis scores plus faibles
+    cursor.execute("""
+        SELECT user_id, points FROM poll_scores
+        WHERE server_id = ? AND points = ? AND user_id > ? ORDER BY user_id ASC LIMIT ?
+    """, (server_id, points, user_id, radius))
+    below = cursor.fetchall()
+    if len(below) < radius:
+        cursor.execute("""
+            SELECT user_id, points FROM poll_scores
+            WHERE server_id = ? AND points < ? ORDER BY points DESC, user_id ASC LIMIT ?
+        """, (server_id, points, radius - len(below)))
+        below += cursor.fetchall()
+
+    return _ranked(server_id, above[::-1] + [(user_id, points)] + below)
+
+@_threaded
+def reset_leaderboard(server_id: int):
+    """Réinitialise le classement d'un serveur."""
+    conn = _get_conn()
+    conn.execute("DELETE FROM poll_scores WHERE server_id = ?", (server_id,))
+    conn.commit()
+    _rankings[server_id] = ScoreRanking()
+    _top_caches.pop(server_id, None)
+
+# ============================
+# SONDAGES PERSISTANTS
+# ============================
+
+# Un sondage ouvert est enregistré avec ses choix et sa date de fin ; les votes
+# arrivent par lots (voir cogs/polls.py) et la clôture écrit en une transaction
+# les derniers votes, le statut et les points des gagnants.
+
+_POLL_COLUMNS = "id, server_id, channel_id, message_id, true_author, choices, message_url, content, ends_at"
+
+
+@_threaded
+def create_poll(server_id, channel_id, archived_message_id, true_author, choices, message_url, content, ends_at):
+    conn = _get_conn()
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM poll_scores")
+    cursor.execute('''INSERT INTO polls
+                      (server_id, channel_id, archived_message_id, true_author, choices, message_url, content, ends_at)
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                   (server_id, channel_id, archived_message_id, true_author, json.dumps(choices),
+                    message_url, content, ends_at))
+    conn.commit()
+    return cursor.lastrowid
+
+@_threaded
+def set_poll_message(poll_id, message_id):
+    conn = _get_conn()
+    conn.execute("UPDATE polls SET message_id = ? WHERE id = ?", (message_id, poll_id))
     conn.commit()
-    conn.close()
\ No newline at end of file
+
+# Sondages encore ouverts, avec leurs votes : [(ligne, {user_id: choix})]
+@_threaded
+def get_open_polls():
+    cursor = _get_conn().cursor()
+    cursor.execute(f"SELECT {_POLL_COLUMNS} FROM polls WHERE status = 'open' ORDER BY ends_at")
+    polls = []
+    for row in cursor.fetchall():
+        row = row[:5] + (json.loads(row[5]),) + row[6:]
+        votes = dict(cursor.execute("SELECT user_id, choice FROM poll_votes WHERE poll_id = ?", (row[0],)).fetchall())
+        polls.append((row, votes))
+    return polls
+
+# Écrit un lot de votes : [(poll_id, user_id, choix)]
+@_threaded
+def write_poll_votes(votes):
+    conn = _get_conn()
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO poll_votes (poll_id, user_id, choice) VALUES (?, ?, ?)", votes)
+
+# Clôt un sondage : derniers votes, statut et points des gagnants dans une seule transaction
+@_threaded
+def close_poll(poll_id, server_id, votes=(), winner_ids=(), points: int = 1):
+    conn = _get_conn()
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO poll_votes (poll_id, user_id, choice) VALUES (?, ?, ?)", votes)
+        cursor = conn.execute("UPDATE polls SET status = 'closed' WHERE id = ? AND status = 'open'", (poll_id,))
+        if cursor.rowcount == 0:
+            return False  # déjà clos (points déjà attribués)
+        conn.executemany('''INSERT INTO poll_scores (server_id, user_id, points)
+                              VALUES (?, ?, ?)
+                              ON CONFLICT(server_id, user_id) DO UPDATE SET points = points + excluded.points''',
+                         [(server_id, user_id, points) for user_id in winner_ids])
+
+    if winner_ids and (server_id in _rankings or server_id in _top_caches):
+        winner_ids = list(winner_ids)
+        cursor = conn.execute(
+            f"SELECT user_id, points FROM poll_scores WHERE server_id = ? "
+            f"AND user_id IN ({','.join('?' * len(winner_ids))})",
+            (server_id, *winner_ids))
+        _after_points(server_id, cursor.fetchall())
+    return True
+
+
+# ============================
+# IMAGES ARCHIVÉES (COPIES LOCALES)
+# ============================
+# Voir images.py : les téléchargements sont faits hors du thread DB, seul l'état
+# de chaque image (en attente / stockée / en échec) est tenu ici.
+
+# Images à télécharger : [(message_id, server_id, url)], les plus anciennes d'abord ;
+# une image en échec passager n'est reprise qu'après `retry_delay` secondes
+@_threaded
+def get_pending_images(limit: int, retry_delay: int):
+    cursor = _get_conn().cursor()
+    cursor.execute('''SELECT i.message_id, a.server_id, i.url
+                      FROM archived_images i JOIN archived_messages a ON a.message_id = i.message_id
+                      WHERE i.status = 'pending'
+                        AND (i.attempts = 0 OR i.updated_at <= datetime('now', ?))
+                      ORDER BY i.message_id LIMIT ?''', (f"-{retry_delay} seconds", limit))
+    return cursor.fetchall()
+
+# Fichier déjà stocké pour ce contenu : (path, thumb_path) ou None
+@_threaded
+def get_image_file(sha256: str):
+    cursor = _get_conn().cursor()
+    cursor.execute("SELECT path, thumb_path FROM image_files WHERE sha256 = ?", (sha256,))
+    return cursor.fetchone()
+
+# Enregistre le fichier (s'il est nouveau) et le rattache au message archivé.
+# Retourne True si le fichier n'était pas encore référencé.
+@_threaded
+def store_image(message_id, sha256, size, content_type, path, thumb_path, served_file) -> bool:
+    conn = _get_conn()
+    with conn:
+        created = conn.execute('''INSERT OR IGNORE INTO image_files (sha256, size, content_type, path, thumb_path)
+                                  VALUES (?, ?, ?, ?, ?)''', (sha256, size, content_type, path, thumb_path)).rowcount
+        conn.execute('''UPDATE archived_images
+                        SET status = 'stored', sha256 = ?, file = ?, error = NULL, updated_at = CURRENT_TIMESTAMP
+                        WHERE message_id = ?''', (sha256, served_file, message_id))
+    return created > 0
+
+# Compte un échec ; l'image est abandonnée si `permanent` ou après max_attempts essais
+@_threaded
+def fail_image(message_id, error: str, permanent: bool, max_attempts: int):
+    conn = _get_conn()
+    with conn:
+        conn.execute('''UPDATE archived_images
+                        SET attempts = attempts + 1, error = ?, updated_at = CURRENT_TIMESTAMP,
+                            status = CASE WHEN ? OR attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+                        WHERE message_id = ?''', (error[:200], int(permanent), max_attempts, message_id))
+
+# Taille totale du stock d'images, en octets
+@_threaded
+def get_image_store_size() -> int:
+    cursor = _get_conn().cursor()
+    cursor.execute("SELECT COALESCE(SUM(size), 0) FROM image_files")
+    return cursor.fetchone()[0]
+
+# Retire de la base les fichiers qui ne servent plus à aucun message archivé
+# (désarchivés) et retourne leurs chemins, à supprimer du disque
+@_threaded
+def pop_unreferenced_images():
+    conn = _get_conn()
+    with conn:
+        rows = conn.execute('''SELECT sha256, path, thumb_path FROM image_files f
+                               WHERE NOT EXISTS (SELECT 1 FROM archived_images i WHERE i.sha256 = f.sha256)''').fetchall()
+        conn.executemany("DELETE FROM image_files WHERE sha256 = ?", [(row[0],) for row in rows])
+    return [(path, thumb_path) for _, path, thumb_path in rows]
+
+# Nombre d'images par statut : {'pending': n, 'stored': n, 'failed': n}
+@_threaded
+def get_image_stats():
+    cursor = _get_conn().cursor()
+    cursor.execute("SELECT status, COUNT(*) FROM archived_images GROUP BY status")
+    return dict(cursor.fetchall())
+
+
+# ============================
+# EXPORT / IMPORT DE L'ARCHIVE
+# ============================
+# Voir archive_io.py. L'export lit un instantané sur sa propre connexion ;
+# l'import écrit ici, par lots, pour garder les index en mémoire à jour.
+
+# Colonnes exportées par table, et colonne du serveur de chaque ligne
+EXPORT_TABLES = {
+    "archived_messages": (("message_id", "content", "reactions", "channel_id", "server_id", "author_name",
+                           "message_url", "image_url", "reaction_emoji", "archived_at", "times_polled"),
+                          "server_id"),
+    "poll_scores": (("server_id", "user_id", "points"), "server_id"),
+    "scan_progress": (("channel_id", "guild_id", "low_id", "high_id", "reached_start"), "guild_id"),
+    # Après archived_messages : le message doit exister quand son détail est importé
+    "archived_reactions": (("message_id", "emoji", "count", "server_id"), "server_id"),
+}
+
+# Tables lues par jointure à l'export (archived_reactions n'a pas de colonne serveur)
+EXPORT_SOURCES = {
+    "archived_reactions": "archived_reactions JOIN archived_messages USING (message_id)",
+}
+
+# Un import ne remplace rien : messages et plages de scan déjà présents sont
+# gardés, et un score n'est jamais abaissé (réimporter un fichier est sans effet)
+_IMPORT_STATEMENTS = {
+    "archived_messages": '''INSERT OR IGNORE INTO archived_messages
+                            (message_id, content, reactions, channel_id, server_id, author_name,
+                             message_url, image_url, reaction_emoji, archived_at, times_polled)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, 0))''',
+    "poll_scores": '''INSERT INTO poll_scores (server_id, user_id, points) VALUES (?, ?, ?)
+                      ON CONFLICT(server_id, user_id) DO UPDATE SET points = MAX(points, excluded.points)''',
+    "scan_progress": '''INSERT OR IGNORE INTO scan_progress (channel_id, guild_id, low_id, high_id, reached_start)
+                        VALUES (?, ?, ?, ?, COALESCE(?, 0))''',
+    # Seulement pour un message de ce serveur ; l'emoji semé par le trigger d'insertion est gardé
+    "archived_reactions": '''INSERT INTO archived_reactions (message_id, emoji, count)
+                             SELECT ?1, ?2, ?3
+                             WHERE EXISTS (SELECT 1 FROM archived_messages WHERE message_id = ?1 AND server_id = ?4)
+                             ON CONFLICT(message_id, emoji) DO NOTHING''',
+}
+
+# Avancement d'un import : (lignes déjà traitées, lignes écrites, terminé ?) ou None
+@_threaded
+def get_import_progress(export_id: str):
+    cursor = _get_conn().cursor()
+    cursor.execute("SELECT lines, imported, done FROM archive_imports WHERE export_id = ?", (export_id,))
+    return cursor.fetchone()
+
+# Écrit un lot ({table: [tuples]}) et l'avancement de l'import dans la même
+# transaction. Retourne le nombre de lignes réellement ajoutées ou modifiées.
+@_threaded
+def import_batch(export_id: str, batch, lines: int) -> int:
+    conn = _get_conn()
+    messages = batch.get("archived_messages", ())
+    # Comme _insert_archived : les ids vont dans le filtre avant le commit
+    _remember_ids(row[0] for row in messages)
+
+    imported = 0
+    with conn:
+        for table, rows in batch.items():
+            if rows:
+                # rowcount ne compte pas les écritures des triggers
+                imported += conn.executemany(_IMPORT_STATEMENTS[table], rows).rowcount
+        conn.execute('''INSERT INTO archive_imports (export_id, lines, imported) VALUES (?, ?, ?)
+                        ON CONFLICT(export_id) DO UPDATE SET lines = excluded.lines,
+                            imported = imported + excluded.imported, updated_at = CURRENT_TIMESTAMP''',
+                     (export_id, lines, imported))
+    _grow_id_filter()
+
+    # Index des serveurs touchés : rechargés à leur prochaine utilisation
+    for row in messages:
+        _samplers.pop(row[4], None)
+    for server_id, _, _ in batch.get("poll_scores", ()):
+        _rankings.pop(server_id, None)
+        _top_caches.pop(server_id, None)
+    return imported
+
+@_threaded
+def finish_import(export_id: str):
+    conn = _get_conn()
+    conn.execute("UPDATE archive_imports SET done = 1, updated_at = CURRENT_TIMESTAMP WHERE export_id = ?",
+                 (export_id,))
+    conn.commit()
+
+# ============================
+# RESTAURATION D'UNE SAUVEGARDE
+# ============================
+# Voir backups.py. La sauvegarde est recopiée page par page dans la base
+# ouverte (API de sauvegarde de SQLite) : les autres connexions voient la base
+# restaurée sans qu'on ait à remplacer le fichier sous leurs pieds.
+
+async def restore_backup(path: str, pages: int = 1024):
+    """Remplace tout le contenu de la base par celui de la sauvegarde `path`."""
+    for writer in list(_writers):
+        await writer.flush()
+    await _restore_backup_db(path, pages)
+    cache.archived_rows.clear()
+    cache.archived_embeds.clear()
+
+@_threaded
+def _restore_backup_db(path: str, pages: int):
+    conn = _get_conn()
+    source = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        source.backup(conn, pages=pages)
+    finally:
+        source.close()
+    conn.execute("PRAGMA journal_mode = WAL")
+    # Une sauvegarde plus ancienne que le code est mise à niveau
+    _run_migrations(conn)
+    _reset_indexes()
+    _load_id_filter()
+
+# ============================
+# RÉACTIONS DES MESSAGES ARCHIVÉS
+# ============================
+# Les ajouts et retraits de réactions sur des messages déjà archivés sont
+# regroupés en mémoire (voir reactions.ReactionDeltas) puis appliqués ici par
+# lots : un message très réactif ne coûte qu'une écriture par lot.
+
+# Les variations des messages non archivés (faux positifs du filtre) sont ignorées
+_APPLY_REACTION_DELTA = '''INSERT INTO archived_reactions (message_id, emoji, count)
+                           SELECT ?1, ?2, ?3 WHERE EXISTS (SELECT 1 FROM archived_messages WHERE message_id = ?1)
+                           ON CONFLICT(message_id, emoji) DO UPDATE SET count = count + excluded.count'''
+
+# Compteur et emoji principal recalculés depuis le détail ; à égalité, l'emoji
+# principal actuel est gardé (les compteurs de /stats suivent par trigger)
+_REFRESH_REACTIONS = '''UPDATE archived_messages SET
+                            reactions = COALESCE((SELECT MAX(r.count) FROM archived_reactions r
+                                                  WHERE r.message_id = archived_messages.message_id), 0),
+                            reaction_emoji = CASE
+                                WHEN (SELECT r.count FROM archived_reactions r
+                                      WHERE r.message_id = archived_messages.message_id
+                                        AND r.emoji = archived_messages.reaction_emoji)
+                                     >= (SELECT MAX(r.count) FROM archived_reactions r
+                                         WHERE r.message_id = archived_messages.message_id)
+                                THEN reaction_emoji
+                                ELSE COALESCE((SELECT r.emoji FROM archived_reactions r
+                                               WHERE r.message_id = archived_messages.message_id
+                                               ORDER BY r.count DESC, r.emoji LIMIT 1), reaction_emoji)
+                            END
+                        WHERE message_id = ?'''
+
+# Applique des variations [(message_id, emoji, delta)] ; retourne le nombre de
+# messages archivés mis à jour
+async def apply_reaction_deltas(deltas) -> int:
+    updated = await _apply_reaction_deltas_db(deltas)
+    for message_id in {delta[0] for delta in deltas}:
+        cache.invalidate_archived(message_id)
+    return updated
+
+@_threaded
+def _apply_reaction_deltas_db(deltas) -> int:
+    message_ids = [(message_id,) for message_id in sorted({delta[0] for delta in deltas})]
+    conn = _get_conn()
+    with conn:
+        conn.executemany(_APPLY_REACTION_DELTA, deltas)
+        conn.executemany("DELETE FROM archived_reactions WHERE message_id = ? AND count <= 0", message_ids)
+        return conn.executemany(_REFRESH_REACTIONS, message_ids).rowcount
+
+# Détail des réactions d'un message archivé : [(emoji, compteur)], du plus au moins fréquent
+@_threaded
+def get_archived_reactions(message_id: int):
+    cursor = _get_conn().cursor()
+    cursor.execute("SELECT emoji, count FROM archived_reactions WHERE message_id = ? ORDER BY count DESC, emoji",
+                   (message_id,))
+    return cursor.fetchall()
+
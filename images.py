@@ -0,0 +1,309 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import tempfile
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+import discord
+
+import cache
+import db
+import metrics
+from shards import owns_guild
+
+try:
+    from PIL import Image
+except ImportError:  # miniatures désactivées sans Pillow
+    Image = None
+
+# ============================
+# COPIES LOCALES DES IMAGES ARCHIVÉES
+# ============================
+# Les URL du CDN de Discord expirent : chaque image archivée est téléchargée
+# une fois dans un stock adressé par contenu (data/images/ab/<sha256>.<ext>),
+# où deux messages qui partagent une image partagent le même fichier. Les
+# embeds sont ensuite servis depuis la copie locale.
+
+IMAGE_STORE_DIR = os.getenv("BOT_IMAGE_STORE_DIR", "data/images")
+IMAGE_MAX_BYTES = int(os.getenv("BOT_IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))             # par fichier
+IMAGE_STORE_MAX_BYTES = int(os.getenv("BOT_IMAGE_STORE_MAX_BYTES", str(2 * 1024 ** 3)))   # tout le stock
+# Au-delà, l'embed sert la miniature (limite d'envoi de fichiers de Discord)
+IMAGE_EMBED_MAX_BYTES = int(os.getenv("BOT_IMAGE_EMBED_MAX_BYTES", str(8 * 1024 * 1024)))
+IMAGE_WORKERS = int(os.getenv("BOT_IMAGE_WORKERS", "4"))          # téléchargements simultanés
+IMAGE_QUEUE_SIZE = int(os.getenv("BOT_IMAGE_QUEUE_SIZE", "64"))
+# Seuls ces hôtes sont téléchargés (le bot ne suit pas d'URL arbitraire)
+IMAGE_ALLOWED_HOSTS = frozenset(
+    host.strip() for host in
+    os.getenv("BOT_IMAGE_ALLOWED_HOSTS", "cdn.discordapp.com,media.discordapp.net").split(",") if host.strip()
+)
+IMAGE_POLL_INTERVAL = 60    # secondes entre deux relectures de la file en base
+IMAGE_MAX_ATTEMPTS = 5      # essais avant d'abandonner une image
+IMAGE_RETRY_DELAY = 300     # secondes avant de reprendre une image en échec passager
+MAX_REDIRECTS = 3          # redirections suivies (vers des hôtes autorisés)
+DOWNLOAD_TIMEOUT = 60       # secondes pour un téléchargement complet
+CHUNK_SIZE = 64 * 1024
+THUMB_SIZE = (512, 512)
+
+
+class ImageRejected(Exception):
+    """Échec définitif : l'image ne sera pas retentée (URL expirée, trop lourde, ...)."""
+
+
+def local_image(image_file):
+    """Chemin de la copie locale d'une image, ou None si elle n'est pas (ou plus) sur disque."""
+    if not image_file:
+        return None
+    path = os.path.join(IMAGE_STORE_DIR, image_file)
+    return path if os.path.isfile(path) else None
+
+
+def attachment_url(path) -> str:
+    return f"attachment://{os.path.basename(path)}"
+
+
+def make_thumbnail(source, target):
+    """Miniature JPEG de `source` (exécutée hors de la boucle). False sans Pillow."""
+    if Image is None:
+        return False
+    with Image.open(source) as image:
+        image.thumbnail(THUMB_SIZE)
+        image.convert("RGB").save(target, "JPEG", quality=85)
+    return True
+
+
+class ImageArchiver:
+    """Télécharge en tâche de fond les images des messages archivés.
+
+    La file est tenue en base (table archived_images, remplie par un trigger à
+    chaque archivage) : un redémarrage reprend là où on s'était arrêté. Une
+    boucle relit les images en attente dans une file bornée, vidée par
+    `workers` téléchargements qui partagent une même session HTTP.
+    """
+
+    def __init__(self, bot, workers=IMAGE_WORKERS, queue_size=IMAGE_QUEUE_SIZE,
+                 allowed_hosts=IMAGE_ALLOWED_HOSTS, max_bytes=IMAGE_MAX_BYTES,
+                 store_max_bytes=IMAGE_STORE_MAX_BYTES):
+        self.bot = bot
+        self.workers = workers
+        self.allowed_hosts = allowed_hosts
+        self.max_bytes = max_bytes
+        self.store_max_bytes = store_max_bytes
+        self.store_bytes = 0
+        self._overflowed = False   # une image n'a pas tenu dans le stock (jusqu'au prochain start())
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._queued = set()   # message_id en file ou en cours de téléchargement
+        self._wakeup = asyncio.Event()
+        self._session = None
+        self._tasks = []
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._feed())]
+            self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # File en mémoire abandonnée : relue en base au prochain start()
+        self._queue = asyncio.Queue(maxsize=self._queue.maxsize)
+        self._queued.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def wake(self):
+        """Signale qu'une nouvelle image attend (sinon relue toutes les IMAGE_POLL_INTERVAL s)."""
+        self._wakeup.set()
+
+    def store_full(self) -> bool:
+        return self._overflowed or self.store_bytes >= self.store_max_bytes
+
+    async def prune(self) -> int:
+        """Supprime du disque les fichiers qui ne servent plus (messages désarchivés)."""
+        removed = 0
+        for paths in await db.pop_unreferenced_images():
+            for path in paths:
+                if path:
+                    try:
+                        os.remove(os.path.join(IMAGE_STORE_DIR, path))
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    # --- Boucles ---
+    async def _feed(self):
+        os.makedirs(os.path.join(IMAGE_STORE_DIR, "tmp"), exist_ok=True)
+        removed = await self.prune()
+        if removed:
+            print(f"🖼️ {removed} image(s) orpheline(s) supprimée(s) du stock.")
+        self.store_bytes = await db.get_image_store_size()
+        self._overflowed = False
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.workers),
+            timeout=aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT)
+        )
+
+        while True:
+            self._wakeup.clear()
+            free = self._queue.maxsize - self._queue.qsize()
+            # Stock plein : les images restent en attente et les embeds gardent l'URL d'origine
+            if free > 0 and not self.store_full():
+                for message_id, server_id, url in await db.get_pending_images(
+                        free + len(self._queued), IMAGE_RETRY_DELAY):
+                    if self._queue.full():
+                        break
+                    # Avec plusieurs processus, chacun ne télécharge que les images de ses serveurs
+                    if message_id not in self._queued and owns_guild(self.bot, server_id):
+                        self._queued.add(message_id)
+                        self._queue.put_nowait((message_id, url))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=IMAGE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self):
+        while True:
+            message_id, url = await self._queue.get()
+            try:
+                await self._archive_image(message_id, url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[IMAGES] ⚠️ Image du message {message_id} non archivée : {e}")
+                try:
+                    await db.fail_image(message_id, str(e), False, IMAGE_MAX_ATTEMPTS)
+                except Exception:
+                    pass
+            finally:
+                self._queued.discard(message_id)
+                self._queue.task_done()
+                if self._queue.empty():
+                    self._wakeup.set()  # file vide : on la remplit sans attendre
+
+    # --- Une image ---
+    async def _archive_image(self, message_id, url):
+        try:
+            sha256, size, content_type, tmp_path = await self._download(url)
+        except ImageRejected as e:
+            metrics.IMAGE_DOWNLOADS.inc(1, "rejected")
+            await db.fail_image(message_id, str(e), True, IMAGE_MAX_ATTEMPTS)
+            return
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            metrics.IMAGE_DOWNLOADS.inc(1, "failed")
+            await db.fail_image(message_id, str(e) or type(e).__name__, False, IMAGE_MAX_ATTEMPTS)
+            return
+
+        loop = asyncio.get_running_loop()
+        reserved = 0
+        existing = await db.get_image_file(sha256)
+        if existing:
+            # Contenu déjà stocké (image partagée par plusieurs messages)
+            os.remove(tmp_path)
+            path, thumb_path = existing
+            metrics.IMAGE_DOWNLOADS.inc(1, "deduplicated")
+        else:
+            # Les images déjà en file ne doivent pas faire dépasser le plafond : celle-ci
+            # reste en attente, et la file n'est plus remplie jusqu'au prochain démarrage
+            if self.store_bytes + size > self.store_max_bytes:
+                os.remove(tmp_path)
+                self._overflowed = True
+                metrics.IMAGE_DOWNLOADS.inc(1, "store_full")
+                return
+            # Réservé tout de suite : les autres workers en tiennent compte
+            reserved = size
+            self.store_bytes += size
+            ext = mimetypes.guess_extension(content_type) or ".bin"
+            path = f"{sha256[:2]}/{sha256}{ext}"
+            full_path = os.path.join(IMAGE_STORE_DIR, path)
+            try:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(tmp_path, full_path)
+            except OSError:
+                self.store_bytes -= reserved
+                raise
+
+            thumb_path = f"{sha256[:2]}/{sha256}.thumb.jpg"
+            try:
+                made = await loop.run_in_executor(
+                    None, make_thumbnail, full_path, os.path.join(IMAGE_STORE_DIR, thumb_path)
+                )
+            except Exception as e:  # image illisible par Pillow : on garde l'original seul
+                print(f"[IMAGES] ⚠️ Miniature impossible pour {path} : {e}")
+                made = False
+            if not made:
+                thumb_path = None
+            metrics.IMAGE_DOWNLOADS.inc(1, "stored")
+
+        served = path if size <= IMAGE_EMBED_MAX_BYTES else thumb_path
+        # Deux téléchargements simultanés du même contenu écrivent le même fichier :
+        # seul le premier enregistré compte dans la taille du stock
+        if not await db.store_image(message_id, sha256, size, content_type, path, thumb_path, served):
+            self.store_bytes -= reserved
+        cache.invalidate_archived(message_id)
+
+    def _check_host(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or parts.hostname not in self.allowed_hosts:
+            raise ImageRejected(f"hôte non autorisé : {parts.hostname}")
+
+    async def _get(self, url):
+        """GET qui suit les redirections à la main : chaque étape doit viser un hôte autorisé."""
+        for _ in range(MAX_REDIRECTS + 1):
+            self._check_host(url)
+            response = await self._session.get(url, allow_redirects=False)
+            location = response.headers.get("Location")
+            if response.status not in (301, 302, 303, 307, 308) or not location:
+                return response
+            response.release()
+            url = urljoin(str(response.url), location)
+        raise ImageRejected("trop de redirections")
+
+    async def _download(self, url):
+        """Télécharge `url` dans un fichier temporaire en le hachant au fil de l'eau.
+
+        Retourne (sha256, taille, content_type, chemin temporaire).
+        """
+        loop = asyncio.get_running_loop()
+        async with await self._get(url) as response:
+            if response.status in (403, 404, 410):
+                raise ImageRejected(f"HTTP {response.status} (URL expirée ?)")
+            response.raise_for_status()
+            content_type = response.content_type
+            if not content_type.startswith("image/"):
+                raise ImageRejected(f"type inattendu : {content_type}")
+            if response.content_length is not None and response.content_length > self.max_bytes:
+                raise ImageRejected(f"image trop lourde ({response.content_length} octets)")
+
+            digest = hashlib.sha256()
+            size = 0
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.join(IMAGE_STORE_DIR, "tmp"))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise ImageRejected(f"image trop lourde (> {self.max_bytes} octets)")
+                        digest.update(chunk)
+                        await loop.run_in_executor(None, f.write, chunk)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        metrics.IMAGE_BYTES.inc(size)
+        return digest.hexdigest(), size, content_type, tmp_path
+
+
+def image_file_kwargs(embed, image_file):
+    """Arguments d'envoi qui joignent la copie locale de l'image à `embed`.
+
+    Vide si l'image n'a pas de copie locale : l'embed garde alors l'URL d'origine.
+    """
+    path = local_image(image_file)
+    if path is None or embed.image.url != attachment_url(path):
+        return {}
+    return {"file": discord.File(path, filename=os.path.basename(path))}
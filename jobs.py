@@ -0,0 +1,281 @@
+import asyncio
+import time
+
+import aiohttp
+import discord
+
+import db
+from cogs.archive import try_archive_message
+from shards import owns_guild
+
+# ============================
+# TÂCHES DE SCAN DE FOND
+# ============================
+
+SCAN_JOB_CONCURRENCY = 2    # tâches exécutées en même temps
+JOB_POLL_INTERVAL = 30      # secondes entre deux relectures de la file
+RETRY_DELAY = 10            # secondes avant de reprendre après une coupure
+PROGRESS_EVERY = 20000      # messages entre deux messages d'avancement
+
+
+def format_duration(seconds) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+class JobProgress:
+    """Avancement en direct d'une tâche de scan (remonte vers le début du salon)."""
+
+    def __init__(self, job_id, channel_id, cursor_id, start_cursor_id, scanned, archived):
+        self.job_id = job_id
+        self.channel_id = channel_id
+        self.cursor_id = cursor_id
+        self.start_cursor_id = start_cursor_id
+        self.scanned = scanned
+        self.archived = archived
+        self.cancelled = False
+        self._session_cursor = cursor_id
+        self._session_started = time.monotonic()
+
+    def advance(self, message_id):
+        if self._session_cursor is None:
+            self._session_cursor = message_id
+        if self.start_cursor_id is None:
+            self.start_cursor_id = message_id
+        self.cursor_id = message_id
+        self.scanned += 1
+
+    def percent(self):
+        """Part de l'historique déjà parcourue, d'après les snowflakes (≈ le temps)."""
+        if self.cursor_id is None or self.start_cursor_id is None:
+            return 0.0
+        span = self.start_cursor_id - self.channel_id
+        if span <= 0:
+            return 100.0
+        return min(100.0, 100.0 * (self.start_cursor_id - self.cursor_id) / span)
+
+    def eta(self):
+        """Secondes restantes estimées, ou None tant que la vitesse est inconnue."""
+        if self.cursor_id is None or self._session_cursor is None:
+            return None
+        covered = self._session_cursor - self.cursor_id
+        elapsed = time.monotonic() - self._session_started
+        if covered <= 0 or elapsed <= 0:
+            return None
+        return max(0, self.cursor_id - self.channel_id) * elapsed / covered
+
+
+class ScanJobManager:
+    """Exécute les tâches de /scan_full enregistrées en base, et les reprend au redémarrage.
+
+    Le curseur d'une tâche est écrit dans la même transaction que les messages
+    archivés (voir db.ScanWriter) : une tâche interrompue repart exactement du
+    dernier lot validé.
+    """
+
+    def __init__(self, bot, concurrency=SCAN_JOB_CONCURRENCY):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.live = {}  # job_id -> JobProgress
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, channel, notify_channel_id, requested_by):
+        """Enregistre une tâche de scan complet. Retourne (job_id, créée ?)."""
+        scan_range = await db.get_scan_range(channel.id)
+        cursor_id = scan_range[0] if scan_range else None
+        job_id, created = await db.create_scan_job(
+            channel.guild.id, channel.id, notify_channel_id, requested_by,
+            cursor_id, cursor_id or channel.last_message_id
+        )
+        self._wakeup.set()
+        return job_id, created
+
+    async def cancel(self, job_id, guild_id) -> bool:
+        """Annule une tâche de ce serveur (jamais celle d'un autre, même avec son numéro)."""
+        if guild_id is None:
+            return False
+        row = await db.get_scan_job(job_id, guild_id)
+        if not row or row[5] not in db.ACTIVE_JOB_STATUSES:
+            return False
+        # La tâche a pu se terminer entre la lecture et l'écriture
+        if not await db.set_scan_job_status(job_id, "cancelled"):
+            return False
+        # Tâche d'un autre processus : il verra le statut à son prochain lot
+        if job_id in self.live:
+            self.live[job_id].cancelled = True
+        return True
+
+    # --- Boucle principale ---
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        running = {}  # job_id -> asyncio.Task
+        try:
+            while True:
+                self._wakeup.clear()
+                for row in await db.get_active_scan_jobs():
+                    if len(running) >= self.concurrency:
+                        break
+                    # Avec plusieurs processus, chacun ne prend que les tâches de ses serveurs
+                    if row[0] not in running and owns_guild(self.bot, row[1]):
+                        running[row[0]] = asyncio.create_task(self._run_job(row))
+
+                # On se réveille à la fin d'une tâche, à une nouvelle demande, ou périodiquement
+                wakeup = asyncio.create_task(self._wakeup.wait())
+                await asyncio.wait({wakeup, *running.values()}, timeout=JOB_POLL_INTERVAL,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                wakeup.cancel()
+                for job_id, task in list(running.items()):
+                    if task.done():
+                        del running[job_id]
+        finally:
+            for task in running.values():
+                task.cancel()
+            await asyncio.gather(*running.values(), return_exceptions=True)
+
+    async def _run_job(self, row):
+        job_id, _, channel_id, notify_channel_id, _, _, cursor_id, start_cursor_id, scanned, archived, _ = row
+        notify = self.bot.get_channel(notify_channel_id) if notify_channel_id else None
+
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            await db.set_scan_job_status(job_id, "failed", "salon introuvable")
+            return
+
+        # Annulée entre la lecture de la file et ici : on ne la relance pas
+        if not await db.set_scan_job_status(job_id, "running"):
+            return
+
+        progress = JobProgress(job_id, channel_id, cursor_id, start_cursor_id, scanned, archived)
+        self.live[job_id] = progress
+        print(f"[SCAN] ▶️ Tâche #{job_id} : {channel} (curseur={cursor_id}, déjà {scanned} scannés)")
+
+        try:
+            while True:
+                try:
+                    await self._scan_full(channel, progress, notify)
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError, discord.HTTPException) as e:
+                    # Erreurs passagères (coupure, 5xx) : on reprend au dernier curseur validé
+                    if isinstance(e, discord.HTTPException) and e.status < 500:
+                        raise
+                    print(f"[SCAN] ⚠️ Tâche #{job_id} interrompue ({e}), reprise dans {RETRY_DELAY}s")
+                    await asyncio.sleep(RETRY_DELAY)
+                    await self.bot.wait_until_ready()
+
+            # Une annulation arrivée après le dernier lot l'emporte aussi sur "done"
+            if progress.cancelled or not await db.set_scan_job_status(job_id, "done"):
+                await self._notify(notify, f"🛑 Scan annulé dans {channel.mention} : "
+                                           f"{progress.scanned} messages scannés, {progress.archived} archivés.")
+                return
+            await self._notify(notify, f"✅ Scan terminé dans {channel.mention} : "
+                                       f"{progress.scanned} messages scannés, {progress.archived} archivés.")
+
+        except discord.Forbidden:
+            await db.set_scan_job_status(job_id, "failed", "accès refusé")
+            await self._notify(notify, f"❌ Je n'ai pas accès à {channel.mention}.")
+        except asyncio.CancelledError:
+            raise  # arrêt du bot : la tâche reste "running" et reprendra au démarrage
+        except Exception as e:
+            print(f"[ERROR] Exception during scan job #{job_id}: {e}")
+            await db.set_scan_job_status(job_id, "failed", str(e))
+            await self._notify(notify, f"⚠️ Erreur pendant le scan : {e}")
+        finally:
+            self.live.pop(job_id, None)
+
+    async def _scan_full(self, channel, progress, notify):
+        """Complète la plage scannée du salon : vers le début, puis jusqu'au présent.
+
+        On repart toujours de la plage validée en base, donc une reprise après
+        une coupure ne refait ni ne saute aucune page d'historique.
+        """
+        scan_range = await db.get_scan_range(channel.id)
+        low_id, high_id, reached_start = scan_range or (None, None, False)
+
+        async with db.ScanWriter(channel.id, guild_id=channel.guild.id, job_id=progress.job_id) as writer:
+            # 1. Vers le passé, sous le bas de la plage
+            before = discord.Object(id=low_id) if low_id else None
+            empty_batches = 0
+            while not reached_start and not progress.cancelled:
+                messages = [m async for m in channel.history(limit=100, before=before)]
+
+                await self._check_cancelled(progress)
+                if progress.cancelled:
+                    break
+                if not messages:
+                    empty_batches += 1
+                    if empty_batches >= 3:
+                        await writer.mark_start_reached()
+                        break
+                    await asyncio.sleep(5)
+                    continue
+                empty_batches = 0
+
+                if high_id is None:
+                    high_id = messages[0].id
+                for message in messages:
+                    progress.advance(message.id)
+                    await self._scan_message(channel, message, writer, progress, notify)
+
+                before = messages[-1]
+                if progress.scanned % 1000 == 0:
+                    await asyncio.sleep(3)
+
+            # 2. Vers le présent, au-dessus du haut de la plage
+            if high_id is None or progress.cancelled:
+                return
+            async for message in channel.history(limit=None, after=discord.Object(id=high_id), oldest_first=True):
+                if progress.scanned % 100 == 0:
+                    await self._check_cancelled(progress)
+                if progress.cancelled:
+                    return
+                progress.scanned += 1
+                await self._scan_message(channel, message, writer, progress, notify)
+
+    async def _check_cancelled(self, progress):
+        """Relit le statut en base : /scan_cancel a pu venir d'un autre processus."""
+        row = await db.get_scan_job(progress.job_id)
+        if row is None or row[5] not in db.ACTIVE_JOB_STATUSES:
+            progress.cancelled = True
+
+    async def _scan_message(self, channel, message, writer, progress, notify):
+        # Vérifie si une des réactions atteint le seuil
+        if any(r.count >= getattr(self.bot, "reaction_threshold", 4) for r in message.reactions):
+            if await try_archive_message(self.bot, message, writer=writer):
+                progress.archived += 1
+        await writer.checkpoint(message.id)
+
+        if progress.scanned % PROGRESS_EVERY == 0:
+            await self._notify(notify, f"🔍 Scan en cours dans {channel.mention} : "
+                                       f"{progress.scanned} messages scannés, {progress.archived} archivés.")
+
+    async def _notify(self, channel, text):
+        if channel is None:
+            return
+        try:
+            await channel.send(text)
+        except discord.HTTPException:
+            pass
@@ -0,0 +1,128 @@
+"""Lance le bot sur plusieurs processus, chacun possédant une plage de shards.
+
+    python launcher.py --workers 4 [--shards 16]
+
+Sans --shards (ni BOT_SHARD_COUNT), le nombre de shards recommandé par Discord
+est utilisé. Les migrations sont appliquées une fois avant de démarrer les
+processus, qui partagent ensuite la même base SQLite (mode WAL). Un processus
+qui s'arrête en erreur est relancé ; SIGINT / SIGTERM arrêtent proprement tous
+les processus.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+
+import aiohttp
+from dotenv import load_dotenv
+
+import db
+import shards
+
+load_dotenv()
+TOKEN = os.getenv("DISCORD_TOKEN")
+
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+IDENTIFY_DELAY = 5.5     # secondes entre deux IDENTIFY d'un même bucket (limite Discord : 5 s)
+RESTART_DELAY = 10       # secondes avant de relancer un processus tombé
+RESTART_DELAY_MAX = 300
+
+
+async def recommended_shards():
+    """Retourne (nombre de shards recommandé, IDENTIFY simultanés autorisés)."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_URL, headers={"Authorization": f"Bot {TOKEN}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"], data["session_start_limit"]["max_concurrency"]
+
+
+class Worker:
+    def __init__(self, worker_id, shard_ids, shard_count):
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+
+    def env(self):
+        env = dict(os.environ)
+        env.update({
+            "BOT_WORKER_ID": str(self.worker_id),
+            "BOT_SHARD_IDS": shards.format_shard_ids(self.shard_ids),
+            "BOT_SHARD_COUNT": str(self.shard_count),
+            "PYTHONUNBUFFERED": "1",
+        })
+        return env
+
+    async def run(self, stopping):
+        """Exécute le processus et le relance tant que le lanceur n'est pas arrêté."""
+        delay = RESTART_DELAY
+        while not stopping.is_set():
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py"),
+                env=self.env()
+            )
+            print(f"[LAUNCHER] ▶️ Processus {self.worker_id} (pid {self.process.pid}) : "
+                  f"shards {shards.format_shard_ids(self.shard_ids)} / {self.shard_count}")
+            code = await self.process.wait()
+            if stopping.is_set():
+                break
+            print(f"[LAUNCHER] ⚠️ Processus {self.worker_id} arrêté (code {code}), relance dans {delay}s")
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, RESTART_DELAY_MAX)
+
+    def terminate(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+
+
+async def main(workers, shard_count):
+    max_concurrency = 1
+    if shard_count is None:
+        shard_count, max_concurrency = await recommended_shards()
+        print(f"[LAUNCHER] 🌐 Discord recommande {shard_count} shard(s)")
+
+    # Migrations une seule fois, avant que les processus n'ouvrent la base
+    await db.init_db()
+    await db.close()
+
+    ranges = shards.split_shards(shard_count, workers)
+    pool = [Worker(i, shard_ids, shard_count) for i, shard_ids in enumerate(ranges)]
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:
+            pass  # Windows : Ctrl+C interrompt directement
+
+    tasks = []
+    for worker in pool:
+        tasks.append(asyncio.create_task(worker.run(stopping)))
+        # Les processus s'identifient chacun de leur côté : on les échelonne pour
+        # rester sous la limite d'IDENTIFY de Discord
+        identify_rounds = -(-len(worker.shard_ids) // max_concurrency)
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=identify_rounds * IDENTIFY_DELAY)
+            break
+        except asyncio.TimeoutError:
+            pass
+
+    await stopping.wait()
+    print("[LAUNCHER] 🛑 Arrêt des processus...")
+    for worker in pool:
+        worker.terminate()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lance le bot sur plusieurs processus.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="nombre de processus")
+    parser.add_argument("--shards", type=int, default=shards.SHARD_COUNT, help="nombre total de shards")
+    args = parser.parse_args()
+    asyncio.run(main(args.workers, args.shards))
@@ -0,0 +1,57 @@
+import math
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix64(x):
+    """Mélangeur splitmix64 : répartit uniformément des snowflakes très proches."""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+class IdFilter:
+    """Filtre de Bloom d'entiers (message_id).
+
+    `id in filtre` à False est une certitude ; à True, c'est seulement
+    probable (taux de faux positifs ~ `error_rate` tant que le nombre d'ids
+    ne dépasse pas `capacity`). La mémoire est fixée à la construction.
+    """
+
+    def __init__(self, capacity, error_rate=0.01, max_bytes=None):
+        capacity = max(1, capacity)
+        bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        if max_bytes is not None:
+            bits = min(bits, max_bytes * 8)
+        self.capacity = capacity
+        self.size = max(64, bits)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        h1 = _mix64(value)
+        h2 = _mix64(h1) | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        bits = self._bits
+        for pos in self._positions(value):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    @property
+    def memory_bytes(self):
+        return len(self._bits)
+
+    def error_rate(self):
+        """Taux de faux positifs estimé pour le nombre d'ids ajoutés."""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
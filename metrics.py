@@ -0,0 +1,199 @@
+import bisect
+import os
+import threading
+
+from aiohttp import web
+
+# ============================
+# MÉTRIQUES (FORMAT PROMETHEUS)
+# ============================
+
+# Exposées sur http://127.0.0.1:<port>/metrics ; chaque processus du lanceur
+# écoute sur BOT_METRICS_PORT + BOT_WORKER_ID. 0 désactive le serveur HTTP.
+METRICS_HOST = os.getenv("BOT_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "9108"))
+
+# Bornes en secondes, des requêtes SQLite (~0,1 ms) aux commandes lentes (~10 s)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value == value else "NaN"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        # Les requêtes SQL sont mesurées depuis le thread DB
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        lines = self._header()
+        for labels, value in self.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Valeur instantanée, posée avec set() ou lue à chaque export via `callback`.
+
+    `callback` retourne {tuple de labels: valeur}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def items(self):
+        if self.callback is not None:
+            return list(self.callback().items())
+        return super().items()
+
+
+class CallbackCounter(Gauge):
+    """Compteur tenu ailleurs (ex. hits du cache), lu à chaque export."""
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # [comptes par borne (+Inf en dernier), somme]
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def items(self):
+        """[(labels, nombre, somme, comptes par borne)]."""
+        with self._lock:
+            return [(labels, sum(counts), total, list(counts)) for labels, (counts, total) in self._values.items()]
+
+    def quantile(self, q, counts):
+        """Estime un quantile à partir des comptes par borne (interpolation linéaire)."""
+        count = sum(counts)
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def render(self):
+        lines = self._header()
+        for labels, count, total, counts in self.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, [('le', le)])} {cumulative}")
+            base = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{base} {_format_value(total)}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+def render():
+    """Toutes les métriques au format texte de Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============================
+# MÉTRIQUES DU BOT
+# ============================
+
+COMMAND_SECONDS = Histogram("bot_command_seconds", "Durée de traitement des commandes.", ("type", "command"))
+COMMAND_ERRORS = Counter("bot_command_errors_total", "Commandes terminées en erreur.", ("type", "command"))
+DB_SECONDS = Histogram("bot_db_seconds", "Durée des appels à la base, mesurée sur le thread DB.", ("function",))
+DB_ERRORS = Counter("bot_db_errors_total", "Appels à la base terminés par une exception.", ("function",))
+SCAN_MESSAGES = Counter("bot_scan_messages_total", "Messages parcourus par les scans.")
+SCAN_ARCHIVED = Counter("bot_scan_archived_total", "Messages archivés par les scans.")
+IMAGE_DOWNLOADS = Counter("bot_image_downloads_total", "Images archivées traitées, par résultat.", ("result",))
+IMAGE_BYTES = Counter("bot_image_bytes_total", "Octets d'images téléchargés.")
+LOOP_LAG = Histogram("bot_event_loop_lag_seconds", "Retard de la boucle d'événements sur un réveil programmé.")
+# Lues au moment de l'export (callbacks posés par cogs/metrics.py)
+GATEWAY_LATENCY = Gauge("bot_gateway_latency_seconds", "Latence du heartbeat de chaque shard.", ("shard",))
+CACHE_LOOKUPS = CallbackCounter("bot_archive_cache_lookups_total", "Lectures des caches de messages archivés.",
+                                ("cache", "result"))
+
+
+# ============================
+# SERVEUR HTTP
+# ============================
+
+async def _handle_metrics(request):
+    return web.Response(body=render().encode(),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def start_server(port, host=METRICS_HOST):
+    """Démarre l'endpoint /metrics et retourne le runner aiohttp (à passer à stop_server)."""
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError:
+        await runner.cleanup()
+        raise
+    return runner
+
+
+async def stop_server(runner):
+    await runner.cleanup()
@@ -0,0 +1,62 @@
+class ScoreRanking:
+    """Nombre de joueurs par score, dans un arbre de Fenwick.
+
+    Le rang d'un score (1 + nombre de joueurs strictement devant) se calcule en
+    O(log S), S étant le score maximal. Les ex æquo partagent le même rang.
+    Les scores négatifs sont comptés comme 0.
+    """
+
+    def __init__(self):
+        self._points = {}       # user_id -> points
+        self._tree = [0] * 65   # indices 1..64 : scores 0..63
+        self.players = 0
+
+    def __len__(self):
+        return self.players
+
+    def get(self, user_id):
+        return self._points.get(user_id)
+
+    def set(self, user_id, points):
+        while max(0, points) + 1 >= len(self._tree):
+            self._grow()
+        old = self._points.get(user_id)
+        if old is not None:
+            self._update(old, -1)
+        else:
+            self.players += 1
+        self._points[user_id] = points
+        self._update(points, +1)
+
+    def rank_of(self, points) -> int:
+        """Rang qu'aurait un joueur avec ce score."""
+        return 1 + self.players - self._prefix(points)
+
+    def rank(self, user_id):
+        points = self._points.get(user_id)
+        return None if points is None else self.rank_of(points)
+
+    # --- Arbre de Fenwick sur les scores ---
+    def _update(self, points, delta):
+        index = max(0, points) + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, points):
+        """Nombre de joueurs avec un score <= points."""
+        index = min(max(0, points) + 1, len(self._tree) - 1)
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _grow(self):
+        # On double la taille et on reconstruit à partir des scores connus
+        self._tree = [0] * (2 * (len(self._tree) - 1) + 1)
+        for points in self._points.values():
+            index = max(0, points) + 1
+            while index < len(self._tree):
+                self._tree[index] += 1
+                index += index & -index
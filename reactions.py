@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+REACTION_TRACKER_SIZE = 10_000  # messages suivis au maximum
+
+
+class ReactionTracker:
+    """Compteurs de réactions par message et par emoji, dans un LRU borné.
+
+    Alimenté par les événements bruts (on_raw_reaction_add/remove), il évite de
+    dépendre du cache de messages de discord.py. Les compteurs partent de zéro
+    quand un message apparaît : ce sont des minorants des vrais compteurs, qui
+    servent à savoir quand un message vaut la peine d'être récupéré.
+    """
+
+    def __init__(self, max_messages=REACTION_TRACKER_SIZE):
+        self.max_messages = max_messages
+        self._messages = OrderedDict()  # message_id -> {emoji: count}, ou None si traité
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __contains__(self, message_id):
+        return message_id in self._messages
+
+    def add(self, message_id, emoji) -> int:
+        """Compte une réaction et retourne le nouveau compteur de cet emoji (0 si traité)."""
+        counts = self._touch(message_id)
+        if counts is None:
+            return 0
+        counts[emoji] = counts.get(emoji, 0) + 1
+        return counts[emoji]
+
+    def remove(self, message_id, emoji):
+        counts = self._messages.get(message_id)
+        if counts and counts.get(emoji, 0) > 0:
+            counts[emoji] -= 1
+
+    def reset(self, message_id, counts):
+        """Remplace les compteurs d'un message par ses vrais compteurs (après un fetch)."""
+        self._touch(message_id)
+        self._messages[message_id] = dict(counts)
+
+    def mark_done(self, message_id):
+        """Le message a été traité : ses réactions suivantes sont ignorées."""
+        self._touch(message_id)
+        self._messages[message_id] = None
+
+    def is_done(self, message_id) -> bool:
+        return message_id in self._messages and self._messages[message_id] is None
+
+    def _touch(self, message_id):
+        if message_id in self._messages:
+            self._messages.move_to_end(message_id)
+            return self._messages[message_id]
+        counts = self._messages[message_id] = {}
+        if len(self._messages) > self.max_messages:
+            self._messages.popitem(last=False)
+        return counts
+
+
+class ReactionDeltas:
+    """Variations des réactions de messages archivés, en attente d'écriture.
+
+    Les ajouts et retraits d'un même emoji sur un même message se compensent en
+    mémoire : drain() rend une variation nette par (message, emoji).
+    """
+
+    def __init__(self):
+        self._deltas = {}  # message_id -> {emoji: variation}
+
+    def __len__(self):
+        return len(self._deltas)
+
+    def add(self, message_id, emoji, delta):
+        counts = self._deltas.setdefault(message_id, {})
+        counts[emoji] = counts.get(emoji, 0) + delta
+
+    def drain(self):
+        """Vide le tampon et retourne [(message_id, emoji, variation)] (variations non nulles)."""
+        deltas, self._deltas = self._deltas, {}
+        return [(message_id, emoji, delta)
+                for message_id, counts in deltas.items()
+                for emoji, delta in counts.items() if delta]
+
+    def merge(self, deltas):
+        """Remet en attente des variations dont l'écriture a échoué."""
+        for message_id, emoji, delta in deltas:
+            self.add(message_id, emoji, delta)
+
@@ -0,0 +1,110 @@
+import random
+
+
+class PollSampler:
+    """Messages archivés rangés par nombre de sondages (times_polled).
+
+    Chaque niveau est une liste de message_id ; la position de chaque message
+    est mémorisée, ce qui permet de le retirer en O(1) en l'échangeant avec le
+    dernier élément. Le tirage se fait uniformément dans le niveau le plus bas.
+    La liste des auteurs distincts sert à tirer les leurres des sondages.
+    """
+
+    def __init__(self):
+        self._buckets = {}          # times_polled -> [message_id, ...]
+        self._where = {}            # message_id -> [times_polled, index, auteur]
+        self._min = 0               # plus petit niveau non vide
+        self._author_counts = {}    # auteur -> nombre de messages archivés
+        self._authors = []          # auteurs distincts
+        self._author_pos = {}       # auteur -> index dans self._authors
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, message_id):
+        return message_id in self._where
+
+    # --- Messages ---
+    def add(self, message_id, times_polled, author):
+        if message_id in self._where:
+            return
+        self._push(message_id, times_polled, author)
+        if len(self._where) == 1 or times_polled < self._min:
+            self._min = times_polled
+        self._add_author(author)
+
+    def remove(self, message_id):
+        entry = self._where.get(message_id)
+        if entry is None:
+            return
+        self._pop(message_id)
+        self._remove_author(entry[2])
+        self._advance_min()
+
+    def bump(self, message_id):
+        """Passe un message au niveau supérieur (il vient d'être sondé)."""
+        entry = self._where.get(message_id)
+        if entry is None:
+            return
+        level, _, author = entry
+        self._pop(message_id)
+        self._push(message_id, level + 1, author)
+        self._advance_min()
+
+    def pick(self):
+        """Retourne un message_id au hasard parmi les moins sondés (None si vide)."""
+        if not self._where:
+            return None
+        return random.choice(self._buckets[self._min])
+
+    # --- Auteurs ---
+    def other_authors(self, true_author, limit=3):
+        """Tire jusqu'à `limit` auteurs distincts, différents de `true_author`."""
+        size = min(limit + 1, len(self._authors))
+        return [a for a in random.sample(self._authors, size) if a != true_author][:limit]
+
+    # --- Interne ---
+    def _push(self, message_id, level, author):
+        bucket = self._buckets.setdefault(level, [])
+        self._where[message_id] = [level, len(bucket), author]
+        bucket.append(message_id)
+
+    def _pop(self, message_id):
+        level, index, _ = self._where.pop(message_id)
+        bucket = self._buckets[level]
+        last = bucket.pop()
+        if last != message_id:
+            bucket[index] = last
+            self._where[last][1] = index
+        if not bucket:
+            del self._buckets[level]
+
+    def _advance_min(self):
+        if not self._where:
+            self._min = 0
+            return
+        while self._min not in self._buckets:
+            self._min += 1
+
+    def _add_author(self, author):
+        if author is None:
+            return
+        count = self._author_counts.get(author, 0)
+        self._author_counts[author] = count + 1
+        if count == 0:
+            self._author_pos[author] = len(self._authors)
+            self._authors.append(author)
+
+    def _remove_author(self, author):
+        if author is None:
+            return
+        count = self._author_counts[author] - 1
+        if count:
+            self._author_counts[author] = count
+            return
+        del self._author_counts[author]
+        index = self._author_pos.pop(author)
+        last = self._authors.pop()
+        if last != author:
+            self._authors[index] = last
+            self._author_pos[last] = index
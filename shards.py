@@ -0,0 +1,80 @@
+import os
+
+# ============================
+# CONFIGURATION DU SHARDING
+# ============================
+
+# Modes (variables d'environnement) :
+#  - par défaut : un seul commands.Bot, sans sharding ;
+#  - BOT_SHARDING=auto : un AutoShardedBot qui ouvre tous les shards dans ce
+#    processus (BOT_SHARD_COUNT, sinon le nombre recommandé par Discord) ;
+#  - BOT_SHARD_IDS=0-3 (posé par launcher.py) : ce processus n'ouvre que ces
+#    shards, sur BOT_SHARD_COUNT au total. BOT_WORKER_ID identifie le processus.
+SHARDING = os.getenv("BOT_SHARDING", "off")
+SHARD_COUNT = int(os.getenv("BOT_SHARD_COUNT", "0")) or None
+WORKER_ID = int(os.getenv("BOT_WORKER_ID", "0"))
+
+
+def parse_shard_ids(value):
+    """"0-3,8" -> [0, 1, 2, 3, 8] ; chaîne vide -> None (tous les shards)."""
+    if not value:
+        return None
+    shard_ids = []
+    for part in value.split(","):
+        start, _, end = part.strip().partition("-")
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(shard_ids))
+
+
+def format_shard_ids(shard_ids):
+    """[0, 1, 2, 3, 8] -> "0-3,8" (inverse de parse_shard_ids)."""
+    parts = []
+    for shard_id in sorted(shard_ids):
+        if parts and parts[-1][1] == shard_id - 1:
+            parts[-1][1] = shard_id
+        else:
+            parts.append([shard_id, shard_id])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in parts)
+
+
+SHARD_IDS = parse_shard_ids(os.getenv("BOT_SHARD_IDS", ""))
+
+
+def sharded():
+    return SHARDING == "auto" or SHARD_IDS is not None
+
+
+def shard_options():
+    """Arguments de commands.AutoShardedBot pour ce processus."""
+    if SHARD_IDS is not None and SHARD_COUNT is None:
+        raise RuntimeError("BOT_SHARD_IDS demande aussi BOT_SHARD_COUNT")
+    return {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS}
+
+
+def split_shards(shard_count, workers):
+    """Répartit 0..shard_count-1 en `workers` plages contiguës de tailles égales (à 1 près)."""
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for worker in range(workers):
+        end = start + size + (1 if worker < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def shard_for_guild(guild_id, shard_count):
+    """Shard qui reçoit les événements d'un serveur (règle de Discord)."""
+    return (guild_id >> 22) % shard_count
+
+
+def owns_guild(bot, guild_id) -> bool:
+    """Vrai si ce processus reçoit les événements de ce serveur.
+
+    Avec plusieurs processus, chaque serveur n'est écrit en base que par le
+    processus qui possède son shard.
+    """
+    shard_ids = getattr(bot, "shard_ids", None)
+    if guild_id is None or shard_ids is None or not bot.shard_count:
+        return True
+    return shard_for_guild(guild_id, bot.shard_count) in shard_ids